@@ -0,0 +1,137 @@
+"""Bring an existing ``moderation_results`` table up to the current schema.
+
+Tables are created by ``Base.metadata.create_all`` but never altered, so a
+database created before results were keyed by content hash is upgraded once
+with::
+
+    python -m db.migrate
+
+Missing columns are added and ``content_hash`` is backfilled in Python with
+the cache's own ``content_digest``, so keys match the ones the service
+computes. Rows whose texts now share a key are reduced to the newest, then
+the unique (content_hash, model) key the upserts rely on is created.
+Running it again on an upgraded table changes nothing.
+"""
+import argparse
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+
+from db.models import Base, ModerationResult
+from db.session import engine
+from utils.config import get_settings
+from utils.logging import logger
+
+settings = get_settings()
+
+TABLE = ModerationResult.__tablename__
+UNIQUE_KEY = "uq_moderation_results_content_hash_model"
+UNIQUE_COLUMNS = ["content_hash", "model"]
+LEGACY_TEXT_INDEX = "ix_moderation_results_text"
+
+
+def has_unique_key(engine: Engine) -> bool:
+    inspector = inspect(engine)
+    keys = inspector.get_unique_constraints(TABLE) + [
+        index for index in inspector.get_indexes(TABLE) if index.get("unique")
+    ]
+    return any(sorted(key["column_names"]) == sorted(UNIQUE_COLUMNS) for key in keys)
+
+
+def check_schema(engine: Engine):
+    """Refuse to start against a ``moderation_results`` table that predates the content-hash key.
+
+    Without the key every ``ON CONFLICT (content_hash, model)`` upsert fails,
+    so results would silently never be stored.
+    """
+    if inspect(engine).has_table(TABLE) and not has_unique_key(engine):
+        raise RuntimeError(
+            f"{TABLE} has no unique ({', '.join(UNIQUE_COLUMNS)}) key; "
+            "upgrade the database with `python -m db.migrate`"
+        )
+
+
+def _add_missing_columns(engine: Engine):
+    existing = {column["name"] for column in inspect(engine).get_columns(TABLE)}
+    # SQLite cannot add a column with a non-constant default; the backfill sets it there
+    postgres = engine.dialect.name == "postgresql"
+    missing = {
+        "content_hash": "VARCHAR(64)",
+        "model": "VARCHAR(64)",
+        "updated_at": "TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP" if postgres else "TIMESTAMP"
+    }
+    with engine.begin() as conn:
+        for name, definition in missing.items():
+            if name not in existing:
+                logger.info(f"Adding {TABLE}.{name}")
+                conn.execute(text(f"ALTER TABLE {TABLE} ADD COLUMN {name} {definition}"))
+        if postgres:
+            conn.execute(text(f"ALTER TABLE {TABLE} ALTER COLUMN text TYPE TEXT, ALTER COLUMN result TYPE TEXT"))
+        conn.execute(text(f"DROP INDEX IF EXISTS {LEGACY_TEXT_INDEX}"))
+
+
+def _backfill(engine: Engine, model: str, batch_size: int) -> int:
+    # services imports db, so it is only pulled in when a backfill runs
+    from services.cache import content_digest
+
+    backfilled = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                text(f"SELECT id, text FROM {TABLE} WHERE content_hash IS NULL ORDER BY id LIMIT :limit"),
+                {"limit": batch_size}
+            ).all()
+            if not rows:
+                return backfilled
+            conn.execute(
+                text(
+                    f"UPDATE {TABLE} SET content_hash = :content_hash, model = COALESCE(model, :model), "
+                    "updated_at = COALESCE(updated_at, CURRENT_TIMESTAMP) WHERE id = :id"
+                ),
+                [{"id": row.id, "content_hash": content_digest(row.text or ""), "model": model} for row in rows]
+            )
+        backfilled += len(rows)
+        logger.info(f"Backfilled content_hash for {backfilled} rows")
+
+
+def _add_unique_key(engine: Engine):
+    with engine.begin() as conn:
+        # Texts that differed only by normalization now share a key; keep the newest row
+        removed = conn.execute(text(
+            f"DELETE FROM {TABLE} WHERE id NOT IN "
+            f"(SELECT MAX(id) FROM {TABLE} GROUP BY {', '.join(UNIQUE_COLUMNS)})"
+        )).rowcount
+        if removed:
+            logger.info(f"Removed {removed} rows duplicating a newer result for the same content")
+        if engine.dialect.name == "postgresql":
+            conn.execute(text(
+                f"ALTER TABLE {TABLE} ALTER COLUMN content_hash SET NOT NULL, ALTER COLUMN model SET NOT NULL"
+            ))
+        conn.execute(text(f"CREATE UNIQUE INDEX {UNIQUE_KEY} ON {TABLE} ({', '.join(UNIQUE_COLUMNS)})"))
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_{TABLE}_updated_at ON {TABLE} (updated_at)"))
+
+
+def migrate(engine: Engine, model: str, batch_size: int = 1000):
+    if not inspect(engine).has_table(TABLE):
+        Base.metadata.create_all(bind=engine)
+        logger.info(f"Created {TABLE}")
+        return
+    if has_unique_key(engine):
+        logger.info(f"{TABLE} is up to date")
+        return
+    _add_missing_columns(engine)
+    _backfill(engine, model, batch_size)
+    _add_unique_key(engine)
+    logger.info(f"Upgraded {TABLE}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default=settings.OPENAI_MODERATION_MODEL, help="model recorded for existing rows")
+    parser.add_argument("--batch-size", type=int, default=1000, help="rows backfilled per transaction")
+    args = parser.parse_args()
+    migrate(engine, args.model, args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
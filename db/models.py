@@ -1,10 +1,17 @@
-from sqlalchemy import Column, Integer, String
+from sqlalchemy import Column, DateTime, Integer, String, Text, UniqueConstraint, func
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
 
 class ModerationResult(Base):
     __tablename__ = "moderation_results"
+    __table_args__ = (
+        UniqueConstraint("content_hash", "model", name="uq_moderation_results_content_hash_model"),
+    )
     id = Column(Integer, primary_key=True, index=True)
-    text = Column(String, unique=True, index=True)
-    result = Column(String)
\ No newline at end of file
+    # sha256 of the normalized content, shared with the Redis cache key
+    content_hash = Column(String(64), nullable=False)
+    model = Column(String(64), nullable=False)
+    text = Column(Text)
+    result = Column(Text)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), index=True)
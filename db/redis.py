@@ -0,0 +1,53 @@
+import redis
+import redis.asyncio
+from utils.config import get_settings
+
+settings = get_settings()
+
+# Blocking client for Celery workers and code running in the sync executor.
+# Threads wait up to REDIS_POOL_TIMEOUT for a free connection instead of failing
+# when a threaded worker briefly needs more than REDIS_MAX_CONNECTIONS.
+redis_client = redis.Redis(
+    connection_pool=redis.BlockingConnectionPool.from_url(
+        settings.REDIS_URL,
+        decode_responses=True,
+        max_connections=settings.REDIS_MAX_CONNECTIONS,
+        timeout=settings.REDIS_POOL_TIMEOUT
+    )
+)
+
+# Shared asyncio client for FastAPI routes; never call the blocking one from the event loop
+async_redis_client = redis.asyncio.Redis.from_url(
+    settings.REDIS_URL,
+    decode_responses=True,
+    max_connections=settings.REDIS_MAX_CONNECTIONS
+)
+
+# Pub/sub client for services.notifications: one subscriber connection per API
+# process, kept out of the shared pool so waiting clients cannot exhaust it
+async_redis_pubsub_client = redis.asyncio.Redis.from_url(
+    settings.REDIS_URL,
+    decode_responses=True,
+    max_connections=1
+)
+
+# Byte-level clients for binary payloads (the blob store); decode_responses is
+# a connection setting, so they have pools of their own, opened on first use
+redis_bytes_client = redis.Redis(
+    connection_pool=redis.BlockingConnectionPool.from_url(
+        settings.REDIS_URL,
+        max_connections=settings.REDIS_MAX_CONNECTIONS,
+        timeout=settings.REDIS_POOL_TIMEOUT
+    )
+)
+async_redis_bytes_client = redis.asyncio.Redis.from_url(
+    settings.REDIS_URL,
+    max_connections=settings.REDIS_MAX_CONNECTIONS
+)
+
+# Broker connection used to read queue depths; only available for Redis brokers
+async_broker_client = (
+    redis.asyncio.Redis.from_url(settings.CELERY_BROKER_URL, decode_responses=True)
+    if settings.CELERY_BROKER_URL.startswith(("redis://", "rediss://"))
+    else None
+)
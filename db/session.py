@@ -1,13 +1,43 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import sessionmaker
 from utils.config import get_settings
 from utils.logging import logger
 
 settings = get_settings()
 
-engine = create_engine(settings.DATABASE_URL, echo=settings.DEBUG)
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+def async_database_url(url: str) -> str:
+    """Map a sync DATABASE_URL onto the matching asyncio driver."""
+    scheme, sep, rest = url.partition("://")
+    base = scheme.split("+", 1)[0]
+    return f"{ASYNC_DRIVERS.get(base, scheme)}{sep}{rest}"
+
+# Shared by every thread of a threaded Celery worker, so it is sized like the async pool
+engine = create_engine(
+    settings.DATABASE_URL,
+    echo=settings.DEBUG,
+    pool_size=settings.DATABASE_POOL_SIZE,
+    max_overflow=settings.DATABASE_MAX_OVERFLOW,
+    pool_pre_ping=True
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Used by the FastAPI process so database I/O never blocks the event loop
+async_engine = create_async_engine(
+    async_database_url(settings.DATABASE_URL),
+    echo=settings.DEBUG,
+    pool_size=settings.DATABASE_POOL_SIZE,
+    max_overflow=settings.DATABASE_MAX_OVERFLOW,
+    pool_pre_ping=True
+)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 def get_db():
     db = SessionLocal()
     try:
@@ -21,4 +51,13 @@ def test_db_connection():
             logger.info("Successfully connected to the database")
     except Exception as e:
         logger.error(f"Database connection failed: {e}")
-        raise
\ No newline at end of file
+        raise
+
+async def test_async_db_connection():
+    try:
+        async with async_engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+            logger.info("Successfully connected to the database")
+    except Exception as e:
+        logger.error(f"Database connection failed: {e}")
+        raise
@@ -0,0 +1,11 @@
+#!/bin/sh
+set -e
+
+# Processes name their metrics files <type>_<hostname>-<pid>.db in the shared
+# directory; drop the ones a previous run of this container left behind
+if [ -n "$PROMETHEUS_MULTIPROC_DIR" ]; then
+    mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+    rm -f "$PROMETHEUS_MULTIPROC_DIR"/*_"$(hostname | tr _ -)"-*.db
+fi
+
+exec "$@"
@@ -1,19 +1,28 @@
+import asyncio
 from fastapi import FastAPI
-import redis
 
+from db.migrate import check_schema
 from db.models import Base
-from db.session import engine, test_db_connection
+from db.session import engine, async_engine, test_async_db_connection
+from db.redis import async_redis_client
 from routes import health, metrics, moderation,stats
 from utils.config import get_settings
 from utils.logging import logger
 from services.celery import celery
+from services.executor import sync_executor
+from services.metrics import event_loop_lag, mark_process_dead
+from services.health import health_prober
+from services.persistence import result_writer
+from services.notifications import result_subscriber
+from services.prefilter import prefilter
 
 settings = get_settings()
 
 app = FastAPI(title="Content Moderation Service")
 
-# Create database tables
+# Create database tables; an existing table from before the content-hash key must be migrated first
 Base.metadata.create_all(bind=engine)
+check_schema(engine)
 
 # Include routers
 app.include_router(health.router, tags=["health"])
@@ -21,19 +30,43 @@ app.include_router(stats.router, prefix="/api/v1", tags=["stats"])
 app.include_router(metrics.router, prefix="/api/v1", tags=["metrics"])
 app.include_router(moderation.router, prefix="/api/v1/moderate", tags=["moderation"])
 
-# Configure Redis
-redis_client = redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+LOOP_LAG_INTERVAL = 0.5
+
+async def monitor_event_loop_lag():
+    """Record how late the loop wakes up; blocking calls in handlers show up here."""
+    loop = asyncio.get_running_loop()
+    while True:
+        scheduled = loop.time() + LOOP_LAG_INTERVAL
+        await asyncio.sleep(LOOP_LAG_INTERVAL)
+        event_loop_lag.set(max(loop.time() - scheduled, 0.0))
 
 @app.on_event("startup")
 async def startup_event():
-    test_db_connection()
+    await test_async_db_connection()
     try:
-        redis_client.ping()
+        await async_redis_client.ping()
         logger.info("Successfully connected to Redis")
     except Exception as e:
         logger.error(f"Redis connection failed: {e}")
         raise
+    app.state.loop_lag_monitor = asyncio.create_task(monitor_event_loop_lag())
+    health_prober.start()
+    # Build the pre-filter automaton in the background before traffic needs it
+    prefilter.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    app.state.loop_lag_monitor.cancel()
+    await health_prober.stop()
+    await moderation.async_moderation_service.close()
+    await result_subscriber.close()
+    await async_redis_client.aclose()
+    await async_engine.dispose()
+    sync_executor.shutdown(wait=False)
+    # Sync-mode verdicts are persisted write-behind from the API process too
+    result_writer.close()
+    mark_process_dead()
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -4,12 +4,14 @@ from typing import Optional
 class ComponentHealth(BaseModel):
     status: str
     details: Optional[str] = None
+    latency_ms: Optional[float] = None
 
     class Config:
         json_schema_extra = {
             "example": {
                 "status": "healthy",
-                "details": "Connection successful"
+                "details": "Connection successful",
+                "latency_ms": 1.2
             }
         }
 
@@ -1,8 +1,26 @@
-from pydantic import BaseModel
-from typing import Optional, List
+from pydantic import BaseModel, field_validator
+from typing import Optional, List, Dict, Literal
 
-class ModerationRequest(BaseModel):
+from utils.http import check_public_url
+
+# Lane hint: "interactive" for latency-sensitive callers, "bulk" for backfills
+Priority = Literal["interactive", "bulk"]
+
+class CallbackMixin(BaseModel):
+    # Results are POSTed here as {"results": [{"id", "status", "result"}, ...]}
+    callback_url: Optional[str] = None
+
+    @field_validator("callback_url")
+    @classmethod
+    def validate_callback_url(cls, value):
+        # Literal addresses only here; hostnames are resolved by the routes and again on delivery
+        if value is not None:
+            check_public_url(value, resolve=False)
+        return value
+
+class ModerationRequest(CallbackMixin):
     text: str
+    priority: Optional[Priority] = None
 
     class Config:
         json_schema_extra = {
@@ -11,7 +29,7 @@ class ModerationRequest(BaseModel):
             }
         }
 
-class ImageModerationRequest(BaseModel):
+class ImageModerationRequest(CallbackMixin):
     text: Optional[str] = None
     image_url: Optional[str] = None
 
@@ -19,7 +37,8 @@ class ImageModerationRequest(BaseModel):
         json_schema_extra = {
             "example": {
                 "text": "This is a sample text to moderate",
-                "image_url": "https://example.com/image.jpg"
+                "image_url": "https://example.com/image.jpg",
+                "callback_url": "https://example.com/moderation-callback"
             }
         }
 
@@ -49,16 +68,43 @@ class ContentItem(BaseModel):
     def dict(self, *args, **kwargs):
         return super().dict(exclude_none=True, *args, **kwargs)
 
+class BatchModerationRequest(BaseModel):
+    items: List[ContentItem]
+    priority: Optional[Priority] = None
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "items": [
+                    {"type": "text", "text": "First text to moderate"},
+                    {"type": "text", "text": "Second text to moderate"},
+                    {"type": "image_url", "image_url": "https://example.com/image.jpg"}
+                ]
+            }
+        }
+
+class LatencyPercentiles(BaseModel):
+    count: int
+    p50: Optional[float] = None
+    p95: Optional[float] = None
+    p99: Optional[float] = None
+
 class ModerationStats(BaseModel):
     total_requests: int
     cached_requests: int
     average_response_time: float
+    latency_percentiles: Dict[str, LatencyPercentiles] = {}
 
     class Config:
         json_schema_extra = {
             "example": {
                 "total_requests": 100,
                 "cached_requests": 25,
-                "average_response_time": 0.45
+                "average_response_time": 0.45,
+                "latency_percentiles": {
+                    "1m": {"count": 12, "p50": 0.31, "p95": 0.82, "p99": 0.97},
+                    "5m": {"count": 40, "p50": 0.35, "p95": 0.90, "p99": 1.21},
+                    "60m": {"count": 75, "p50": 0.38, "p95": 0.95, "p99": 1.40}
+                }
             }
         }
\ No newline at end of file
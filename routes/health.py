@@ -1,13 +1,7 @@
 from fastapi import APIRouter, HTTPException
 from models.health import HealthCheckResponse
-from services.health import (
-    check_database_health,
-    check_redis_health,
-    check_celery_health,
-    check_api_health
-)
+from services.health import health_prober
 from services.metrics import health_check_requests, health_check_failures
-import datetime
 
 router = APIRouter()
 
@@ -19,26 +13,15 @@ async def health_check():
 
 @router.get("/health/ready", response_model=HealthCheckResponse)
 async def readiness_check():
-    """Detailed health check for all components"""
+    """Detailed health check for all components, served from the background prober's snapshot"""
     health_check_requests.inc()
-    
-    db_health = await check_database_health()
-    redis_health = await check_redis_health()
-    celery_health = await check_celery_health()
-    api_health = await check_api_health()
-    
-    # Determine overall status
-    components = [db_health, redis_health, celery_health, api_health]
-    overall_status = "healthy" if all(c.status == "healthy" for c in components) else "unhealthy"
-    
-    if overall_status == "unhealthy":
+
+    snapshot = health_prober.snapshot
+    if snapshot is None:
+        # First request before the prober has completed a round
+        snapshot = await health_prober.probe()
+
+    if snapshot.status == "unhealthy":
         health_check_failures.inc()
-    
-    return HealthCheckResponse(
-        status=overall_status,
-        database=db_health,
-        redis=redis_health,
-        celery=celery_health,
-        api=api_health,
-        last_checked=datetime.datetime.now().isoformat()
-    )
\ No newline at end of file
+
+    return snapshot
@@ -1,10 +1,26 @@
 from fastapi import APIRouter
-from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client import CollectorRegistry, REGISTRY, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client import multiprocess
 from fastapi.responses import Response
+from services.health import health_prober
+from services.lanes import monitored_queues
+from services.tracing import sample_queue_depths
+from utils.config import get_settings
 
 router = APIRouter()
+settings = get_settings()
+
+def metrics_registry():
+    if not settings.PROMETHEUS_MULTIPROC_DIR:
+        return REGISTRY
+    # Aggregate the samples written by every API and Celery process on this host
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
 
 @router.get("/metrics")
 async def metrics():
     """Endpoint to expose Prometheus metrics"""
-    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
\ No newline at end of file
+    health_prober.update_age_metric()
+    await sample_queue_depths(monitored_queues())
+    return Response(generate_latest(metrics_registry()), media_type=CONTENT_TYPE_LATEST)
@@ -1,44 +1,364 @@
-from fastapi import APIRouter, HTTPException
-from models.moderation import ModerationRequest, ImageModerationRequest, ContentItem
-from services.tasks import moderate_text_task, moderate_content_task
+import asyncio
+import json
+import uuid
+from typing import List, Optional
+from fastapi import APIRouter, BackgroundTasks, Header, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from models.moderation import ModerationRequest, ImageModerationRequest, ContentItem, BatchModerationRequest
+from services.tasks import moderate_text_task, moderate_content_task, moderate_batch_task, store_text_result, document_moderator
+from services.moderation import AsyncModerationService
 from services.celery import celery
-from services.metrics import moderation_requests
+from services.cache import aget_cached_result, aget_cached_results
+from services.similarity import afind_near_duplicate
+from services.prefilter import check_text
+from services.image_cache import aget_cached_image
+from services.blobs import BlobTooLarge, blob_store, offload_data_uri, should_offload
+from services.executor import run_sync
+from services.lanes import BULK, IMAGES, INTERACTIVE, LANE_QUEUES, LaneFull, admit
+from services.jobs import create_job, record_job_results, get_job, get_job_state
+from services.notifications import stream_results, wait_for_task_result
+from services.metrics import moderation_requests, cached_requests
+from services.stats import arecord_requests, arecord_latency
+from services.tracing import Trace, trace_context
+from services.webhooks import enqueue_webhook, result_status
+from utils.config import get_settings
+from utils.http import UnsafeURL, check_public_url
+from utils.logging import logger
 
 router = APIRouter()
+settings = get_settings()
+async_moderation_service = AsyncModerationService()
+
+def validate_image_url(image_url: str):
+    if not image_url.startswith(('http://', 'https://', 'data:image/')):
+        raise HTTPException(
+            status_code=400,
+            detail="Invalid image URL format"
+        )
+
+async def _admit(lane: str, count: int = 1):
+    try:
+        await admit(lane, count)
+    except LaneFull as e:
+        raise HTTPException(
+            status_code=429,
+            detail=str(e),
+            headers={"Retry-After": str(settings.QUEUE_FULL_RETRY_AFTER)}
+        )
+
+async def _check_callback_url(callback_url: Optional[str]):
+    """Refuse callbacks to loopback, private and link-local hosts (resolving off the event loop)."""
+    if callback_url is None:
+        return
+    try:
+        await run_sync(check_public_url, callback_url)
+    except UnsafeURL as e:
+        raise HTTPException(status_code=400, detail=f"Invalid callback_url: {e}")
+
+async def _completed(result, callback_url: Optional[str] = None):
+    """Response for a result produced inline; it is also sent to ``callback_url`` if one was given."""
+    response = {"status": "completed", "result": result}
+    if callback_url:
+        response["id"] = str(uuid.uuid4())
+        await run_sync(enqueue_webhook, callback_url, {"id": response["id"], **response})
+    return response
 
 @router.post("/text")
-async def moderate_text(request: ModerationRequest):
+async def moderate_text(
+    request: ModerationRequest,
+    background_tasks: BackgroundTasks,
+    wait: bool = False,
+    timeout_ms: Optional[int] = Query(None, gt=0),
+    x_debug_trace: Optional[str] = Header(None)
+):
+    """Moderate a text.
+
+    With ``wait=true`` the text is moderated inline and the verdict returned
+    directly, unless ``timeout_ms`` expires first, in which case the request
+    falls back to the queued flow and returns a task id. Texts long enough
+    for document mode are always queued. Sending an
+    ``X-Debug-Trace`` header attaches per-stage timings to the result.
+    With a ``callback_url`` the result is also POSTed there, under the
+    returned id, once it is available. Queued texts go to the lane named by
+    ``priority`` (interactive by default); a full lane answers 429.
+    """
+    await _check_callback_url(request.callback_url)
+    loop = asyncio.get_running_loop()
+    started_at = loop.time()
+    trace = Trace({"debug": bool(x_debug_trace)})
+    moderation_requests.inc()
+
+    # Blocklisted and allowlisted texts are decided locally in microseconds
+    with trace.span("prefilter"):
+        local_result = check_text(request.text)
+    if local_result is not None:
+        await arecord_requests()
+        return await _completed(trace.attach(local_result), request.callback_url)
+
+    # Repeat texts, and near duplicates of moderated ones, are answered inline without touching the queue
+    with trace.span("cache_lookup"):
+        cached_result = await aget_cached_result(request.text) or await afind_near_duplicate(request.text)
+    await arecord_requests(cached=int(cached_result is not None))
+    if cached_result is not None:
+        cached_requests.inc()
+        return await _completed(trace.attach(cached_result), request.callback_url)
+
+    # Long documents are chunked by the worker rather than sent whole inline
+    if wait and not document_moderator.applies(request.text):
+        timeout = min(
+            timeout_ms or settings.SYNC_MODERATION_TIMEOUT_MS,
+            settings.SYNC_MODERATION_MAX_TIMEOUT_MS
+        ) / 1000.0
+        remaining = timeout - (loop.time() - started_at)
+        try:
+            with trace.span("upstream"):
+                result = await asyncio.wait_for(
+                    async_moderation_service.moderate_content(request.text), max(remaining, 0)
+                )
+        except asyncio.TimeoutError:
+            logger.info("Synchronous moderation deadline expired, falling back to queue")
+        except Exception as e:
+            logger.error(f"Synchronous moderation failed, falling back to queue: {e}")
+        else:
+            await arecord_latency(loop.time() - started_at)
+            background_tasks.add_task(store_text_result, request.text, result)
+            return await _completed(trace.attach(result), request.callback_url)
+
+    lane = request.priority or INTERACTIVE
+    await _admit(lane)
+    with trace.span("enqueue"):
+        task = await run_sync(
+            moderate_text_task.apply_async,
+            args=[request.text, trace_context(trace.debug)],
+            kwargs={"callback_url": request.callback_url},
+            queue=LANE_QUEUES[lane]
+        )
+    return {"id": task.id, "status": "processing"}
+
+async def _offload(image_url: str) -> str:
+    """Move a large ``data:`` URI into the blob store, so only its handle is queued."""
+    if not should_offload(image_url):
+        return image_url
+    try:
+        return await run_sync(offload_data_uri, image_url)
+    except BlobTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid data URI")
+
+async def _moderate_image(image_url: str, callback_url: Optional[str], x_debug_trace: Optional[str]):
+    content_item = ContentItem(
+        type="image_url",
+        image_url=image_url
+    ).dict()
+
     moderation_requests.inc()
-    task = moderate_text_task.delay(request.text)
+    trace = Trace({"debug": bool(x_debug_trace)})
+
+    # Images seen before under the same URL or bytes are answered inline
+    with trace.span("cache_lookup"):
+        cached_result = await aget_cached_image(image_url)
+    if cached_result is not None:
+        await arecord_requests(cached=1)
+        cached_requests.inc()
+        return await _completed(trace.attach(cached_result), callback_url)
+
+    await _admit(IMAGES)
+    await arecord_requests()
+    with trace.span("enqueue"):
+        task = await run_sync(
+            moderate_content_task.delay, [content_item], trace_context(bool(x_debug_trace)),
+            callback_url=callback_url
+        )
     return {"id": task.id, "status": "processing"}
 
 @router.post("/image")
-async def moderate_image(request: ImageModerationRequest):
+async def moderate_image(request: ImageModerationRequest, x_debug_trace: Optional[str] = Header(None)):
     if not (request.image_url):
         raise HTTPException(
             status_code=400,
             detail="image_url must be provided"
         )
-    
+
     image_url = request.image_url
-    if not image_url.startswith(('http://', 'https://', 'data:image/')):
+    validate_image_url(image_url)
+    await _check_callback_url(request.callback_url)
+    image_url = await _offload(image_url)
+    return await _moderate_image(image_url, request.callback_url, x_debug_trace)
+
+@router.post("/image/upload")
+async def upload_image(
+    request: Request,
+    callback_url: Optional[str] = Query(None),
+    content_type: Optional[str] = Header(None),
+    content_length: Optional[int] = Header(None),
+    x_debug_trace: Optional[str] = Header(None)
+):
+    """Moderate an image sent as the raw request body, e.g. ``curl --data-binary @cat.png``.
+
+    The body is streamed into the blob store chunk by chunk and the task
+    carries only its handle, so neither API memory nor the broker message
+    grows with the image.
+    """
+    if not content_type or not content_type.startswith("image/"):
+        raise HTTPException(status_code=415, detail="Content-Type must be an image/* type")
+    await _check_callback_url(callback_url)
+    if content_length is not None and content_length > settings.BLOB_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=f"Payload exceeds {settings.BLOB_MAX_BYTES} bytes")
+
+    try:
+        handle, size = await blob_store.aput_stream(request.stream(), content_type.split(";", 1)[0].strip())
+    except BlobTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    if not size:
+        raise HTTPException(status_code=400, detail="Request body is empty")
+    return await _moderate_image(handle, callback_url, x_debug_trace)
+
+@router.post("/batch")
+async def moderate_batch(request: BatchModerationRequest, x_debug_trace: Optional[str] = Header(None)):
+    if not request.items:
+        raise HTTPException(status_code=400, detail="items must not be empty")
+    if len(request.items) > settings.MODERATION_JOB_MAX_ITEMS:
         raise HTTPException(
             status_code=400,
-            detail="Invalid image URL format"
+            detail=f"At most {settings.MODERATION_JOB_MAX_ITEMS} items per batch"
         )
-    
-    content_item = ContentItem(
-        type="image_url",
-        image_url=image_url
-    ).dict()
-    
-    moderation_requests.inc()
-    task = moderate_content_task.delay([content_item])
-    return {"id": task.id, "status": "processing"}
 
-@router.get("/{task_id}")
-async def get_moderation_result(task_id: str):
+    # Deduplicate identical items so each is moderated once
+    unique_items = []
+    slots = {}
+    item_slots = []
+    for item in request.items:
+        if item.type == "text" and item.text:
+            key = ("text", item.text)
+        elif item.type == "image_url" and item.image_url:
+            validate_image_url(item.image_url)
+            key = ("image_url", await _offload(item.image_url))
+        else:
+            raise HTTPException(status_code=400, detail=f"Invalid content item: {item.type}")
+        if key not in slots:
+            slots[key] = len(unique_items)
+            unique_items.append({**item.dict(), "image_url": key[1]} if key[0] == "image_url" else item.dict())
+        item_slots.append(slots[key])
+
+    lane = request.priority or BULK
+    chunk_size = settings.MODERATION_BATCH_MAX_SIZE
+    await _admit(lane, -(-len(unique_items) // chunk_size))
+
+    moderation_requests.inc(len(request.items))
+    job_id = await run_sync(create_job, item_slots, len(unique_items))
+
+    # Serve local decisions and cache hits immediately, only misses go upstream
+    text_slots = [slot for slot, item in enumerate(unique_items) if item["type"] == "text"]
+    local = {}
+    for slot in text_slots:
+        local_result = check_text(unique_items[slot]["text"])
+        if local_result is not None:
+            local[slot] = local_result
+    text_slots = [slot for slot in text_slots if slot not in local]
+    cached = await aget_cached_results([unique_items[slot]["text"] for slot in text_slots])
+    hits = {slot: result for slot, result in zip(text_slots, cached) if result is not None}
+    for slot, item in enumerate(unique_items):
+        if item["type"] == "image_url":
+            result = await aget_cached_image(item["image_url"])
+            if result is not None:
+                hits[slot] = result
+    await arecord_requests(len(request.items), cached=len(hits))
+    if hits:
+        cached_requests.inc(len(hits))
+    if hits or local:
+        await run_sync(record_job_results, job_id, {**local, **hits})
+
+    misses = [[slot, item] for slot, item in enumerate(unique_items) if slot not in hits and slot not in local]
+    trace = Trace()
+    for start in range(0, len(misses), chunk_size):
+        with trace.span("enqueue"):
+            await run_sync(
+                moderate_batch_task.apply_async,
+                args=[job_id, misses[start:start + chunk_size], trace_context(bool(x_debug_trace))],
+                queue=LANE_QUEUES[lane]
+            )
+
+    return {
+        "id": job_id,
+        "status": "processing" if misses else "completed",
+        "total": len(item_slots),
+        "unique": len(unique_items),
+        "cached": len(hits),
+        "local": len(local)
+    }
+
+@router.get("/batch/{job_id}")
+async def get_batch_result(job_id: str):
+    job = await run_sync(get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Batch job not found")
+    return job
+
+async def _fetch_task_result(task_id: str):
     result = celery.AsyncResult(task_id)
-    if result.ready():
-        return {"status": "completed", "result": result.get()}
-    return {"status": "processing"}
\ No newline at end of file
+    if not await run_sync(result.ready):
+        return None
+    return await run_sync(result.get)
+
+async def _fetch_job_results(job_id: str):
+    state = await run_sync(get_job_state, job_id)
+    return state[1] if state else {}
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@router.get("/stream")
+async def stream_moderation_results(
+    task_ids: List[str] = Query([]),
+    job_ids: List[str] = Query([]),
+    timeout: float = Query(settings.STREAM_TIMEOUT_SECONDS, gt=0, le=settings.STREAM_TIMEOUT_SECONDS)
+):
+    """Stream results as server-sent events while the workers finish them.
+
+    Emits a ``result`` event per task id, an ``item`` event per batch job
+    item, then ``done`` (or ``timeout`` with the task ids still pending).
+    """
+    if not task_ids and not job_ids:
+        raise HTTPException(status_code=400, detail="task_ids or job_ids must be provided")
+    if len(task_ids) + len(job_ids) > settings.STREAM_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {settings.STREAM_MAX_IDS} ids per stream")
+
+    jobs = {}
+    for job_id in dict.fromkeys(job_ids):
+        state = await run_sync(get_job_state, job_id)
+        if state is None:
+            raise HTTPException(status_code=404, detail=f"Batch job not found: {job_id}")
+        jobs[job_id] = state[0]
+
+    async def events():
+        async for event in stream_results(
+            list(dict.fromkeys(task_ids)), jobs, timeout, _fetch_task_result, _fetch_job_results
+        ):
+            if event["event"] == "keepalive":
+                yield ": keepalive\n\n"
+            else:
+                yield _sse(event["event"], event["data"])
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/{task_id}")
+async def get_moderation_result(
+    task_id: str,
+    wait: float = Query(0, ge=0, le=settings.LONG_POLL_MAX_SECONDS),
+    x_debug_trace: Optional[str] = Header(None)
+):
+    """Fetch a task result; ``wait`` long-polls up to that many seconds for it to finish."""
+    trace = Trace({"debug": bool(x_debug_trace)})
+    with trace.span("result_fetch"):
+        if wait:
+            value = await wait_for_task_result(task_id, wait, lambda: _fetch_task_result(task_id))
+        else:
+            value = await _fetch_task_result(task_id)
+    if value is not None:
+        return {"status": result_status(value), "result": trace.attach(value)}
+    return {"status": "processing"}
@@ -0,0 +1,116 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from services.metrics import moderation_batch_size, moderation_batch_wait
+from services.moderation import ModerationService
+from utils.logging import logger
+
+
+class _PendingText:
+    __slots__ = ("text", "future", "enqueued_at")
+
+    def __init__(self, text: str):
+        self.text = text
+        self.future: Future = Future()
+        self.enqueued_at = time.monotonic()
+
+
+class ModerationBatcher:
+    """Coalesces concurrent text moderations into list-input upstream calls.
+
+    Texts submitted within ``window`` seconds of the first pending text (or
+    until ``max_batch_size`` texts are pending) are sent to OpenAI as a single
+    ``moderations.create`` request, and each caller receives its own slice of
+    the ``results`` array. Up to ``max_in_flight`` batches are sent
+    concurrently, so a threaded worker keeps collecting while earlier batches
+    wait on the network.
+    """
+
+    def __init__(self, service: ModerationService, window: float, max_batch_size: int, max_in_flight: int = 1):
+        self.service = service
+        self.window = window
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_in_flight = max(1, max_in_flight)
+        self._queue: "queue.Queue[_PendingText]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._in_flight: Optional[threading.BoundedSemaphore] = None
+        self._pid: Optional[int] = None
+
+    def submit(self, text: str) -> Future:
+        self._ensure_started()
+        pending = _PendingText(text)
+        self._queue.put(pending)
+        return pending.future
+
+    def moderate(self, text: str, timeout: Optional[float] = None) -> Dict:
+        return self.submit(text).result(timeout=timeout)
+
+    def _ensure_started(self):
+        # Started lazily so that the dispatcher thread lives in the forked
+        # worker process rather than in the parent that imported this module.
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            if self._pid != os.getpid():
+                self._queue = queue.Queue()
+                self._executor = ThreadPoolExecutor(self.max_in_flight, thread_name_prefix="moderation-dispatch")
+                self._in_flight = threading.BoundedSemaphore(self.max_in_flight)
+            self._pid = os.getpid()
+            self._thread = threading.Thread(
+                target=self._run, name="moderation-batcher", daemon=True
+            )
+            self._thread.start()
+
+    def _collect(self) -> List[_PendingText]:
+        batch = [self._queue.get()]
+        deadline = batch[0].enqueued_at + self.window
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            # Wait for a free dispatch slot first so texts keep coalescing meanwhile
+            self._in_flight.acquire()
+            batch = self._collect()
+            self._executor.submit(self._dispatch_and_release, batch)
+
+    def _dispatch_and_release(self, batch: List[_PendingText]):
+        try:
+            self._dispatch(batch)
+        except Exception as e:
+            logger.error(f"Moderation batcher dispatch failed: {e}")
+        finally:
+            self._in_flight.release()
+
+    def _dispatch(self, batch: List[_PendingText]):
+        sent_at = time.monotonic()
+        moderation_batch_size.observe(len(batch))
+        for pending in batch:
+            moderation_batch_wait.observe(sent_at - pending.enqueued_at)
+
+        try:
+            results = self.service.moderate_batch([pending.text for pending in batch])
+        except Exception as e:
+            for pending in batch:
+                pending.future.set_exception(e)
+            return
+
+        for pending, result in zip(batch, results):
+            pending.future.set_result(result)
+
@@ -0,0 +1,167 @@
+import base64
+import hashlib
+import uuid
+from typing import AsyncIterator, Dict, List, Optional, Tuple, Union
+
+from redis import Redis
+from redis.asyncio import Redis as AsyncRedis
+
+from db.redis import redis_bytes_client, async_redis_bytes_client
+from services.metrics import blob_bytes_stored
+from utils.config import get_settings
+
+settings = get_settings()
+
+# Content-addressed handle that stands in for an image's bytes in task
+# messages, job state and database rows: "blob:<sha256 of the bytes>"
+HANDLE_PREFIX = "blob:"
+DEFAULT_CONTENT_TYPE = "application/octet-stream"
+
+
+class BlobTooLarge(Exception):
+    def __init__(self, max_bytes: int):
+        super().__init__(f"Payload exceeds {max_bytes} bytes")
+        self.max_bytes = max_bytes
+
+
+class BlobNotFound(Exception):
+    def __init__(self, handle: str):
+        super().__init__(f"{handle} has expired or was never stored")
+        self.handle = handle
+
+
+def is_handle(value: Optional[str]) -> bool:
+    return bool(value) and value.startswith(HANDLE_PREFIX)
+
+
+def handle_digest(handle: str) -> str:
+    return handle[len(HANDLE_PREFIX):]
+
+
+def split_data_uri(data_uri: str) -> Tuple[str, bytes]:
+    """(content type, bytes) of a base64 ``data:`` URI; raises ValueError if malformed."""
+    header, separator, payload = data_uri.partition(",")
+    if not separator or not header.startswith("data:") or not header.endswith(";base64"):
+        raise ValueError("Expected a base64 data: URI")
+    content_type = header[len("data:"):-len(";base64")].split(";", 1)[0] or DEFAULT_CONTENT_TYPE
+    return content_type, base64.b64decode(payload)
+
+
+class BlobStore:
+    """Write-once payload store in Redis, so large images travel by handle.
+
+    Blobs are keyed by the SHA-256 of their bytes (identical uploads are
+    stored once) and expire after ``ttl`` seconds, which must outlast the
+    longest queue wait and requeue cycle. Uploads are streamed into a
+    temporary key chunk by chunk, so the API never holds a whole payload.
+    """
+
+    def __init__(self, redis: Redis, async_redis: AsyncRedis, ttl: int, max_bytes: int):
+        self.redis = redis
+        self.async_redis = async_redis
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+
+    def _data_key(self, digest: str) -> str:
+        return f"moderation:blob:{digest}"
+
+    def _type_key(self, digest: str) -> str:
+        return f"moderation:blob:{digest}:type"
+
+    def put(self, data: bytes, content_type: str) -> str:
+        if len(data) > self.max_bytes:
+            raise BlobTooLarge(self.max_bytes)
+        digest = hashlib.sha256(data).hexdigest()
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.set(self._data_key(digest), data, ex=self.ttl)
+        pipe.set(self._type_key(digest), content_type, ex=self.ttl)
+        pipe.execute()
+        blob_bytes_stored.inc(len(data))
+        return HANDLE_PREFIX + digest
+
+    async def aput_stream(self, chunks: AsyncIterator[bytes], content_type: str) -> Tuple[str, int]:
+        """Store a streamed payload; returns its handle and size.
+
+        Raises ``BlobTooLarge`` as soon as more than ``max_bytes`` arrived.
+        """
+        upload_key = f"moderation:blob:upload:{uuid.uuid4().hex}"
+        hasher = hashlib.sha256()
+        size = 0
+        try:
+            async for chunk in chunks:
+                if not chunk:
+                    continue
+                size += len(chunk)
+                if size > self.max_bytes:
+                    raise BlobTooLarge(self.max_bytes)
+                hasher.update(chunk)
+                pipe = self.async_redis.pipeline(transaction=False)
+                pipe.append(upload_key, chunk)
+                pipe.expire(upload_key, self.ttl)
+                await pipe.execute()
+
+            digest = hasher.hexdigest()
+            pipe = self.async_redis.pipeline(transaction=False)
+            if size:
+                pipe.rename(upload_key, self._data_key(digest))
+            else:
+                pipe.set(self._data_key(digest), b"")
+            pipe.expire(self._data_key(digest), self.ttl)
+            pipe.set(self._type_key(digest), content_type, ex=self.ttl)
+            await pipe.execute()
+        except BaseException:
+            await self.async_redis.delete(upload_key)
+            raise
+        blob_bytes_stored.inc(size)
+        return HANDLE_PREFIX + digest, size
+
+    def get(self, handle: str) -> Tuple[str, bytes]:
+        """(content type, bytes) of a stored blob; raises ``BlobNotFound`` once it expired."""
+        digest = handle_digest(handle)
+        data, content_type = self.redis.mget([self._data_key(digest), self._type_key(digest)])
+        if data is None:
+            raise BlobNotFound(handle)
+        if isinstance(content_type, bytes):
+            content_type = content_type.decode()
+        return content_type or DEFAULT_CONTENT_TYPE, data
+
+
+blob_store = BlobStore(
+    redis_bytes_client,
+    async_redis_bytes_client,
+    ttl=settings.BLOB_TTL,
+    max_bytes=settings.BLOB_MAX_BYTES
+)
+
+
+def should_offload(image_url: str) -> bool:
+    return image_url.startswith("data:") and len(image_url) > settings.BLOB_INLINE_MAX_BYTES
+
+
+def offload_data_uri(image_url: str) -> str:
+    """Swap a ``data:`` URI above ``BLOB_INLINE_MAX_BYTES`` for a blob handle."""
+    if not should_offload(image_url):
+        return image_url
+    content_type, data = split_data_uri(image_url)
+    return blob_store.put(data, content_type)
+
+
+def read_blob(handle: str) -> bytes:
+    return blob_store.get(handle)[1]
+
+
+def resolve_image_url(image_url: str) -> str:
+    """The URL to send upstream: blob handles become base64 ``data:`` URIs again."""
+    if not is_handle(image_url):
+        return image_url
+    content_type, data = blob_store.get(image_url)
+    return f"data:{content_type};base64,{base64.b64encode(data).decode('ascii')}"
+
+
+def resolve_blobs(content: Union[str, List[Dict]]) -> Union[str, List[Dict]]:
+    if isinstance(content, str) or not any(is_handle(item.get("image_url")) for item in content):
+        return content
+    return [
+        {**item, "image_url": resolve_image_url(item["image_url"])} if is_handle(item.get("image_url")) else item
+        for item in content
+    ]
@@ -0,0 +1,443 @@
+"""Moderate a JSONL or CSV corpus offline, straight through ModerationService.
+
+The input is streamed with bounded memory and results are written as they
+complete; after a crash the same command resumes from its checkpoint::
+
+    python -m services.bulk records.jsonl --output verdicts.jsonl --concurrency 8
+    python -m services.bulk records.csv --text-field body --id-field id --to-db
+"""
+import argparse
+import csv
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from services.cache import content_digest, get_cached_results
+from services.persistence import result_writer
+from services.ratelimit import RateLimited
+from services.tasks import moderate_items
+from utils.config import get_settings
+from utils.logging import logger
+
+settings = get_settings()
+
+CHECKPOINT_VERSION = 2
+
+
+class Record:
+    __slots__ = ("index", "record_id", "item", "offset")
+
+    def __init__(self, index: int, record_id, item: Optional[Dict], offset: int):
+        self.index = index
+        self.record_id = record_id
+        # None when the record has nothing to moderate
+        self.item = item
+        # Input bytes consumed once this record has been read
+        self.offset = offset
+
+
+def _lines(f: io.BufferedReader, counter: List[int]) -> Iterator[str]:
+    for line in f:
+        counter[0] += len(line)
+        yield line.decode("utf-8")
+
+
+def read_records(
+    path: str,
+    input_format: str,
+    text_field: str,
+    id_field: Optional[str],
+    image_field: Optional[str],
+    start_index: int = 0,
+    start_offset: int = 0
+) -> Iterator[Record]:
+    """Stream records from a JSONL or CSV file, starting at byte ``start_offset``.
+
+    ``start_offset`` must be a record boundary (a ``Record.offset``), and
+    ``start_index`` the index of the record found there. CSV files still
+    have their header line read first.
+    """
+    with open(path, "rb") as f:
+        consumed = [0]
+        fieldnames = None
+        if input_format == "csv":
+            fieldnames = next(csv.reader(_lines(f, consumed)), None)
+        if start_offset > consumed[0]:
+            f.seek(start_offset)
+            consumed[0] = start_offset
+        lines = _lines(f, consumed)
+        if input_format == "csv":
+            rows: Iterable = csv.DictReader(lines, fieldnames=fieldnames)
+        else:
+            rows = (json.loads(line) for line in lines if line.strip())
+        for index, row in enumerate(rows, start_index):
+            text = row.get(text_field)
+            image_url = row.get(image_field) if image_field else None
+            if text:
+                item = {"type": "text", "text": text}
+            elif image_url:
+                item = {"type": "image_url", "image_url": image_url}
+            else:
+                item = None
+            yield Record(index, row.get(id_field, index) if id_field else index, item, consumed[0])
+
+
+def batched(records: Iterator[Record], size: int) -> Iterator[List[Record]]:
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class Checkpoint:
+    """Progress marker written atomically next to the output.
+
+    ``records`` inputs, ending at byte ``input_bytes`` of the input, are
+    fully written to every sink, and the JSONL output ends at
+    ``output_bytes``; anything after that was written by a crashed run and is
+    truncated before resuming.
+    """
+
+    def __init__(self, path: str, input_path: str):
+        self.path = path
+        self.input_path = os.path.abspath(input_path)
+
+    def load(self) -> Dict:
+        if not os.path.exists(self.path):
+            return {"records": 0, "input_bytes": 0, "output_bytes": 0}
+        with open(self.path) as f:
+            state = json.load(f)
+        if state.get("input") != self.input_path:
+            raise SystemExit(f"Checkpoint {self.path} belongs to {state.get('input')}, not {self.input_path}")
+        if state.get("version") != CHECKPOINT_VERSION:
+            raise SystemExit(f"Checkpoint {self.path} was written by an older version, rerun with --restart")
+        return state
+
+    def save(self, records: int, input_bytes: int, output_bytes: int):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({
+                "version": CHECKPOINT_VERSION,
+                "input": self.input_path,
+                "records": records,
+                "input_bytes": input_bytes,
+                "output_bytes": output_bytes,
+                "updated_at": time.time()
+            }, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class JsonlSink:
+    """Appends one ``{"id", "index", "result"|"error"}`` line per record."""
+
+    def __init__(self, path: str, resume_at: int):
+        self.file = open(path, "ab" if resume_at else "wb")
+        if resume_at:
+            # Drop lines written after the last checkpoint; appends continue from there
+            self.file.truncate(resume_at)
+
+    def write(self, records: List[Record], results: List[Dict]):
+        for record, result in zip(records, results):
+            line = {"id": record.record_id, "index": record.index}
+            if "error" in result:
+                line["error"] = result["error"]
+            else:
+                line["result"] = result
+            self.file.write(json.dumps(line).encode("utf-8") + b"\n")
+
+    def sync(self) -> int:
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        return self.file.tell()
+
+    def close(self):
+        self.file.close()
+
+
+class DatabaseSink:
+    """Upserts verdicts into ``moderation_results`` synchronously, batch by batch."""
+
+    def write(self, records: List[Record], results: List[Dict]):
+        result_writer.write([
+            (record.item.get("text") or record.item.get("image_url"), result)
+            for record, result in zip(records, results)
+            if record.item is not None and "error" not in result
+        ])
+
+    def sync(self) -> int:
+        return 0
+
+    def close(self):
+        pass
+
+
+class Progress:
+    """Logs records/s and an ETA from the share of the input file consumed."""
+
+    def __init__(self, total_bytes: int, start_records: int, interval: float):
+        self.total_bytes = total_bytes
+        self.interval = interval
+        self.started_at = time.monotonic()
+        self.reported_at = self.started_at
+        self.records = start_records
+        self.new_records = 0
+        self.offset = 0
+        # Offset and time of the first completed batch; resumed runs skip input unmoderated
+        self._baseline: Optional[Tuple[int, float]] = None
+        self.upstream = 0
+        self.reused = 0
+        self.errors = 0
+
+    def update(self, records: int, offset: int, upstream: int, reused: int, errors: int):
+        if self._baseline is None:
+            self._baseline = (offset, time.monotonic())
+        self.records += records
+        self.new_records += records
+        self.offset = offset
+        self.upstream += upstream
+        self.reused += reused
+        self.errors += errors
+        if time.monotonic() - self.reported_at >= self.interval:
+            self.report()
+
+    def eta(self) -> float:
+        if self._baseline is None:
+            return float("inf")
+        baseline_offset, baseline_time = self._baseline
+        byte_rate = (self.offset - baseline_offset) / max(time.monotonic() - baseline_time, 1e-9)
+        return (self.total_bytes - self.offset) / byte_rate if byte_rate > 0 else float("inf")
+
+    def report(self, final: bool = False):
+        self.reported_at = time.monotonic()
+        rate = self.new_records / max(self.reported_at - self.started_at, 1e-9)
+        done = self.offset / self.total_bytes if self.total_bytes else 1.0
+        logger.info(
+            f"{'Finished' if final else 'Progress'}: {self.records} records ({done:.1%} of input), "
+            f"{rate:.1f} records/s, {self.upstream} moderated upstream, {self.reused} reused, "
+            f"{self.errors} errors" + ("" if final else f", ETA {_duration(self.eta())}")
+        )
+
+
+def _duration(seconds: float) -> str:
+    if seconds == float("inf"):
+        return "unknown"
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h{minutes:02d}m{seconds:02d}s" if hours else f"{minutes}m{seconds:02d}s"
+
+
+class BulkJob:
+    """Moderates batches of records with ``concurrency`` upstream calls in flight.
+
+    Batches are completed in input order, so the checkpoint is simply the
+    number of records written and where they end in the input. Texts are deduplicated within a batch,
+    against a bounded LRU of this run's verdicts and, optionally, against the
+    result cache. Throttled batches wait out ``Retry-After`` and try again;
+    other failures are retried ``max_retries`` times before their records
+    are written as errors.
+    """
+
+    def __init__(
+        self,
+        sinks: List,
+        checkpoint: Checkpoint,
+        batch_size: int,
+        concurrency: int,
+        dedupe_size: int,
+        use_cache: bool,
+        max_retries: int,
+        checkpoint_interval: float
+    ):
+        self.sinks = sinks
+        self.checkpoint = checkpoint
+        self.batch_size = max(1, batch_size)
+        self.concurrency = max(1, concurrency)
+        self.dedupe_size = dedupe_size
+        self.use_cache = use_cache
+        self.max_retries = max_retries
+        self.checkpoint_interval = checkpoint_interval
+        self._seen: "OrderedDict[str, Dict]" = OrderedDict()
+        self._seen_lock = threading.Lock()
+        self._checkpointed_at = time.monotonic()
+
+    def _remember(self, key: str, result: Dict):
+        if self.dedupe_size <= 0:
+            return
+        with self._seen_lock:
+            self._seen[key] = result
+            self._seen.move_to_end(key)
+            while len(self._seen) > self.dedupe_size:
+                self._seen.popitem(last=False)
+
+    def _recall(self, key: str) -> Optional[Dict]:
+        with self._seen_lock:
+            result = self._seen.get(key)
+            if result is not None:
+                self._seen.move_to_end(key)
+            return result
+
+    @staticmethod
+    def _key(item: Dict) -> str:
+        if item["type"] == "text":
+            return content_digest(item["text"])
+        return "image:" + hashlib.sha256(item["image_url"].encode("utf-8")).hexdigest()
+
+    def _call_upstream(self, items: List[Dict]) -> List[Dict]:
+        attempt = 0
+        while True:
+            try:
+                return moderate_items(items)
+            except RateLimited as e:
+                time.sleep(e.retry_after)
+            except Exception as e:
+                attempt += 1
+                if attempt > self.max_retries:
+                    logger.error(f"Giving up on a batch of {len(items)} items: {e}")
+                    return [{"error": str(e)} for _ in items]
+                time.sleep(min(2 ** attempt, 60))
+
+    def moderate(self, records: List[Record]) -> Tuple[List[Dict], int, int]:
+        """Results for ``records`` in order, plus counts of upstream and reused verdicts."""
+        unique: "OrderedDict[str, Dict]" = OrderedDict()
+        for record in records:
+            if record.item is not None:
+                unique.setdefault(self._key(record.item), record.item)
+
+        verdicts: Dict[str, Dict] = {}
+        for key in unique:
+            result = self._recall(key)
+            if result is not None:
+                verdicts[key] = result
+        texts = [(key, item["text"]) for key, item in unique.items() if key not in verdicts and item["type"] == "text"]
+        if self.use_cache and texts:
+            for (key, _), result in zip(texts, get_cached_results([text for _, text in texts])):
+                if result is not None:
+                    verdicts[key] = result
+        reused = len(verdicts)
+
+        missing = [(key, item) for key, item in unique.items() if key not in verdicts]
+        if missing:
+            for (key, _), result in zip(missing, self._call_upstream([item for _, item in missing])):
+                verdicts[key] = result
+                if "error" not in result:
+                    self._remember(key, result)
+
+        results = [
+            verdicts[self._key(record.item)] if record.item is not None else {"error": "record has no content to moderate"}
+            for record in records
+        ]
+        return results, len(missing), reused
+
+    def _complete(self, batch: List[Record], future: "Future", progress: Progress):
+        results, upstream, reused = future.result()
+        for sink in self.sinks:
+            sink.write(batch, results)
+        progress.update(len(batch), batch[-1].offset, upstream, reused, sum("error" in result for result in results))
+        if time.monotonic() - self._checkpointed_at >= self.checkpoint_interval:
+            self.save_checkpoint(batch[-1])
+
+    def save_checkpoint(self, last: Record):
+        output_bytes = 0
+        for sink in self.sinks:
+            output_bytes = sink.sync() or output_bytes
+        self.checkpoint.save(last.index + 1, last.offset, output_bytes)
+        self._checkpointed_at = time.monotonic()
+
+    def run(self, records: Iterator[Record], progress: Progress) -> int:
+        window: "deque[Tuple[List[Record], Future]]" = deque()
+        last: Optional[Record] = None
+        with ThreadPoolExecutor(self.concurrency, thread_name_prefix="bulk-moderation") as executor:
+            try:
+                for batch in batched(records, self.batch_size):
+                    window.append((batch, executor.submit(self.moderate, batch)))
+                    last = batch[-1]
+                    # Bounded read-ahead: at most `concurrency` batches held in memory
+                    if len(window) >= self.concurrency:
+                        self._complete(*window.popleft(), progress)
+                while window:
+                    self._complete(*window.popleft(), progress)
+            finally:
+                for _, future in window:
+                    future.cancel()
+        if last is not None:
+            self.save_checkpoint(last)
+        return progress.new_records
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("input", help="JSONL or CSV file of records")
+    parser.add_argument("--format", choices=["jsonl", "csv"], help="input format (default: from the file extension)")
+    parser.add_argument("--text-field", default="text", help="field holding the text to moderate")
+    parser.add_argument("--image-field", help="field holding an image URL, used when the text field is empty")
+    parser.add_argument("--id-field", help="field copied to the output as the record id (default: record index)")
+    parser.add_argument("--output", help="JSONL file to write results to")
+    parser.add_argument("--to-db", action="store_true", help="upsert results into moderation_results")
+    parser.add_argument("--checkpoint", help="checkpoint file (default: <output or input>.checkpoint)")
+    parser.add_argument("--restart", action="store_true", help="ignore an existing checkpoint and start over")
+    parser.add_argument("--batch-size", type=int, default=settings.MODERATION_BATCH_MAX_SIZE, help="inputs per upstream call")
+    parser.add_argument("--concurrency", type=int, default=8, help="upstream calls in flight")
+    parser.add_argument("--dedupe-size", type=int, default=10000, help="verdicts remembered for repeated texts")
+    parser.add_argument("--no-cache", action="store_true", help="do not reuse verdicts from the result cache")
+    parser.add_argument("--max-retries", type=int, default=5, help="retries of a failed batch before writing errors")
+    parser.add_argument("--checkpoint-interval", type=float, default=10, help="seconds between checkpoints")
+    parser.add_argument("--report-interval", type=float, default=10, help="seconds between progress reports")
+    args = parser.parse_args()
+
+    if not args.output and not args.to_db:
+        parser.error("give --output, --to-db or both")
+    input_format = args.format or ("csv" if args.input.lower().endswith(".csv") else "jsonl")
+    checkpoint = Checkpoint(args.checkpoint or f"{args.output or args.input}.checkpoint", args.input)
+    if args.restart:
+        checkpoint.clear()
+    state = checkpoint.load()
+    if state["records"]:
+        logger.info(f"Resuming after {state['records']} records from {checkpoint.path}")
+
+    sinks = []
+    if args.output:
+        sinks.append(JsonlSink(args.output, state["output_bytes"]))
+    if args.to_db:
+        sinks.append(DatabaseSink())
+
+    records = read_records(
+        args.input, input_format, args.text_field, args.id_field, args.image_field,
+        start_index=state["records"], start_offset=state["input_bytes"]
+    )
+    job = BulkJob(
+        sinks,
+        checkpoint,
+        batch_size=args.batch_size,
+        concurrency=args.concurrency,
+        dedupe_size=args.dedupe_size,
+        use_cache=not args.no_cache,
+        max_retries=args.max_retries,
+        checkpoint_interval=args.checkpoint_interval
+    )
+    progress = Progress(os.path.getsize(args.input), state["records"], args.report_interval)
+    try:
+        job.run(records, progress)
+    finally:
+        for sink in sinks:
+            sink.close()
+    progress.report(final=True)
+
+
+if __name__ == "__main__":
+    main()
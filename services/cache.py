@@ -0,0 +1,245 @@
+import hashlib
+import json
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from redis import Redis
+from redis.asyncio import Redis as AsyncRedis
+from sqlalchemy import select
+from sqlalchemy.engine import Engine
+
+from db.models import ModerationResult
+from db.redis import redis_client, async_redis_client
+from db.session import engine
+from services.metrics import cache_events
+from utils.config import get_settings
+from utils.logging import logger
+
+settings = get_settings()
+
+# Bump when the cached payload or key layout changes
+CACHE_KEY_VERSION = "v1"
+
+
+def normalize_text(text: str) -> str:
+    """Normalization applied before hashing; only folds encodings of the same text."""
+    return unicodedata.normalize("NFC", text).strip()
+
+
+def content_digest(text: str) -> str:
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+def cache_key_for_digest(digest: str, model: Optional[str] = None) -> str:
+    return f"moderation:{CACHE_KEY_VERSION}:{model or settings.OPENAI_MODERATION_MODEL}:{digest}"
+
+
+def cache_key(text: str, model: Optional[str] = None) -> str:
+    return cache_key_for_digest(content_digest(text), model)
+
+
+class LocalCache:
+    """Bounded, thread-safe LRU cache whose entries expire after ``ttl`` seconds."""
+
+    def __init__(self, max_entries: int, ttl: float, tier: str = "local"):
+        self.tier = tier
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, Dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= time.monotonic():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                cache_events.labels(self.tier, "miss").inc()
+                return None
+            self._entries.move_to_end(key)
+        cache_events.labels(self.tier, "hit").inc()
+        return entry[1]
+
+    def set(self, key: str, value: Dict):
+        if self.max_entries <= 0:
+            return
+        evicted = 0
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                evicted += 1
+        if evicted:
+            cache_events.labels(self.tier, "eviction").inc(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DatabaseTier:
+    """Read-only lookup of persisted verdicts by content hash, used after a Redis miss."""
+
+    tier = "database"
+
+    def __init__(self, engine: Engine, model: str):
+        self.engine = engine
+        self.model = model
+
+    def get_many(self, digests: List[str]) -> Dict[str, Dict]:
+        statement = select(ModerationResult.content_hash, ModerationResult.result).where(
+            ModerationResult.model == self.model,
+            ModerationResult.content_hash.in_(set(digests))
+        )
+        with self.engine.connect() as conn:
+            found = {digest: json.loads(result) for digest, result in conn.execute(statement)}
+        for digest in digests:
+            cache_events.labels(self.tier, "hit" if digest in found else "miss").inc()
+        return found
+
+
+class ModerationCache:
+    """Two-tier result cache: per-process ``LocalCache`` backed by shared Redis.
+
+    Workers use the blocking methods, which fall back to ``database`` on a
+    Redis miss and re-populate Redis from it. API routes use the
+    ``a``-prefixed coroutines, which only go through the asyncio Redis client.
+    """
+
+    def __init__(
+        self,
+        redis: Redis,
+        async_redis: AsyncRedis,
+        local: LocalCache,
+        ttl: int,
+        database: Optional[DatabaseTier] = None
+    ):
+        self.redis = redis
+        self.async_redis = async_redis
+        self.local = local
+        self.ttl = ttl
+        self.database = database
+
+    def get(self, text: str, use_database: bool = True) -> Optional[Dict]:
+        return self.get_many([text], use_database)[0]
+
+    def get_many(self, texts: List[str], use_database: bool = True) -> List[Optional[Dict]]:
+        """Look texts up in both tiers, preserving order; Redis is hit once for all local misses.
+
+        With ``use_database=False`` a Redis miss is final, for re-checks right
+        after a full lookup already missed the database.
+        """
+        keys = [cache_key(text) for text in texts]
+        results = [self.local.get(key) for key in keys]
+        missing = [i for i, result in enumerate(results) if result is None]
+        if not missing:
+            return results
+
+        stored = self.redis.mget([keys[i] for i in missing])
+        results = self._fill(keys, results, missing, stored)
+        if use_database and self.database is not None:
+            results = self._fill_from_database(texts, keys, results)
+        return results
+
+    def _fill_from_database(self, texts, keys, results) -> List[Optional[Dict]]:
+        missing = [i for i, result in enumerate(results) if result is None]
+        if not missing:
+            return results
+        try:
+            digests = {i: content_digest(texts[i]) for i in missing}
+            found = self.database.get_many(list(digests.values()))
+        except Exception as e:
+            logger.error(f"Database cache lookup failed: {e}")
+            return results
+
+        if found:
+            pipe = self.redis.pipeline(transaction=False)
+            for i in missing:
+                result = found.get(digests[i])
+                if result is not None:
+                    results[i] = result
+                    self.local.set(keys[i], result)
+                    pipe.setex(keys[i], self.ttl, json.dumps(result))
+            pipe.execute()
+        return results
+
+    async def aget(self, text: str) -> Optional[Dict]:
+        return (await self.aget_many([text]))[0]
+
+    async def aget_many(self, texts: List[str]) -> List[Optional[Dict]]:
+        keys = [cache_key(text) for text in texts]
+        results = [self.local.get(key) for key in keys]
+        missing = [i for i, result in enumerate(results) if result is None]
+        if not missing:
+            return results
+
+        stored = await self.async_redis.mget([keys[i] for i in missing])
+        return self._fill(keys, results, missing, stored)
+
+    def _fill(self, keys, results, missing, stored) -> List[Optional[Dict]]:
+        for i, value in zip(missing, stored):
+            if value:
+                cache_events.labels("redis", "hit").inc()
+                results[i] = json.loads(value)
+                self.local.set(keys[i], results[i])
+            else:
+                cache_events.labels("redis", "miss").inc()
+        return results
+
+    def set(self, text: str, result: Dict):
+        self.set_many({text: result})
+
+    def set_many(self, results: Dict[str, Dict]):
+        if not results:
+            return
+        pipe = self.redis.pipeline(transaction=False)
+        for text, result in results.items():
+            key = cache_key(text)
+            self.local.set(key, result)
+            pipe.setex(key, self.ttl, json.dumps(result))
+        pipe.execute()
+
+
+moderation_cache = ModerationCache(
+    redis_client,
+    async_redis_client,
+    LocalCache(settings.LOCAL_CACHE_MAX_ENTRIES, settings.LOCAL_CACHE_TTL),
+    ttl=settings.CACHE_TTL,
+    database=DatabaseTier(engine, settings.OPENAI_MODERATION_MODEL)
+)
+
+
+def get_cached_result(text: str, use_database: bool = True) -> Optional[Dict]:
+    return moderation_cache.get(text, use_database)
+
+
+def get_cached_results(texts: List[str]) -> List[Optional[Dict]]:
+    if not texts:
+        return []
+    return moderation_cache.get_many(texts)
+
+
+def set_cached_result(text: str, result: Dict):
+    moderation_cache.set(text, result)
+
+
+def set_cached_results(results: Dict[str, Dict]):
+    moderation_cache.set_many(results)
+
+
+async def aget_cached_result(text: str) -> Optional[Dict]:
+    return await moderation_cache.aget(text)
+
+
+async def aget_cached_results(texts: List[str]) -> List[Optional[Dict]]:
+    if not texts:
+        return []
+    return await moderation_cache.aget_many(texts)
@@ -1,4 +1,6 @@
 from celery import Celery
+from celery.signals import worker_process_shutdown, worker_shutdown
+from services.metrics import mark_process_dead
 from utils.config import get_settings
 
 settings = get_settings()
@@ -17,9 +19,34 @@ celery.conf.update(
     result_serializer='json',
     timezone='UTC',
     enable_utc=True,
-    worker_pool_restarts=True
+    worker_pool_restarts=True,
+    # Priority lanes: chat texts never wait behind bulk jobs or slow images.
+    # Webhook deliveries wait on third-party receivers, keep them off the moderation workers.
+    task_default_queue=settings.QUEUE_INTERACTIVE,
+    task_routes={
+        "services.tasks.moderate_text_task": {"queue": settings.QUEUE_INTERACTIVE},
+        "services.tasks.moderate_batch_task": {"queue": settings.QUEUE_BULK},
+        "services.tasks.moderate_content_task": {"queue": settings.QUEUE_IMAGES},
+        "services.webhooks.deliver_webhooks_task": {"queue": settings.WEBHOOK_QUEUE}
+    },
+    # Reserve one task at a time so a long task does not hold others back in its prefetch buffer
+    worker_prefetch_multiplier=1,
+    # Moderation is I/O-bound: threads share one process's HTTP, Redis and DB pools.
+    # --pool / --concurrency on the command line still take precedence.
+    worker_pool=settings.CELERY_WORKER_POOL,
+    worker_concurrency=settings.CELERY_WORKER_CONCURRENCY
 )
 
+@worker_process_shutdown.connect
+def mark_metrics_process_dead(pid=None, **kwargs):
+    # Prefork children; drop the exiting process's live gauges from the shared metrics directory
+    mark_process_dead(pid)
+
+@worker_shutdown.connect
+def mark_metrics_worker_dead(**kwargs):
+    # The main process, which is the only one with the threads and solo pools
+    mark_process_dead()
+
 # Import tasks module to ensure tasks are registered
 celery.autodiscover_tasks(['services'])
 
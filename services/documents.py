@@ -0,0 +1,168 @@
+import hashlib
+import re
+from typing import Dict, List, Tuple
+
+from services.batching import ModerationBatcher
+from services.cache import get_cached_results, set_cached_results
+from services.metrics import document_chunks
+
+# A sentence ends at terminal punctuation followed by whitespace, or at a blank line
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?。！？…])\s+|\n\s*\n")
+
+Span = Tuple[int, int]
+
+
+def _split_long(text: str, start: int, end: int, max_chars: int) -> List[Span]:
+    """Split a sentence longer than ``max_chars`` at the last whitespace before the limit."""
+    spans = []
+    while end - start > max_chars:
+        cut = text.rfind(" ", start + 1, start + max_chars)
+        if cut <= start:
+            cut = start + max_chars
+        spans.append((start, cut))
+        start = cut
+    spans.append((start, end))
+    return spans
+
+
+def split_sentences(text: str, max_chars: int) -> List[Span]:
+    """Character spans of the sentences of ``text``, none longer than ``max_chars``."""
+    spans = []
+    start = 0
+    for match in SENTENCE_BOUNDARY.finditer(text):
+        if match.start() > start:
+            spans.extend(_split_long(text, start, match.start(), max_chars))
+        start = match.end()
+    if start < len(text):
+        spans.extend(_split_long(text, start, len(text), max_chars))
+    return spans
+
+
+def _is_cut_point(sentence: str, target_chars: int) -> bool:
+    # Each sentence ends a chunk with probability len(sentence) / target_chars,
+    # decided by its own hash, so boundaries depend only on nearby content
+    value = int.from_bytes(hashlib.blake2b(sentence.encode("utf-8"), digest_size=8).digest(), "big")
+    return value % target_chars < len(sentence)
+
+
+def chunk_document(text: str, target_chars: int, max_chars: int, overlap_chars: int) -> List[Span]:
+    """Overlapping, sentence-aligned chunk spans of ``text``.
+
+    Chunks end where a sentence's hash says so (about every ``target_chars``
+    characters), or before growing past ``max_chars``. Because cut points are
+    content-defined rather than counted from the start, an edit only changes
+    the chunks around it, and the rest keep their cached verdicts. Every
+    chunk after the first also repeats up to ``overlap_chars`` of the
+    preceding sentences, so content straddling a boundary is seen whole.
+    """
+    overlap_chars = min(overlap_chars, max_chars // 2)
+    body_chars = max_chars - overlap_chars
+    min_chars = target_chars // 4
+    sentences = split_sentences(text, body_chars)
+    if not sentences:
+        return []
+
+    groups = []
+    first = 0
+    for i, (start, end) in enumerate(sentences):
+        if i > first and end - sentences[first][0] > body_chars:
+            groups.append((first, i - 1))
+            first = i
+        if end - sentences[first][0] >= min_chars and _is_cut_point(text[start:end], target_chars):
+            groups.append((first, i))
+            first = i + 1
+    if first < len(sentences):
+        groups.append((first, len(sentences) - 1))
+
+    spans = []
+    for first, last in groups:
+        start = sentences[first][0]
+        previous = first - 1
+        while previous >= 0 and start - sentences[previous][0] <= overlap_chars:
+            previous -= 1
+        if previous + 1 < first:
+            start = sentences[previous + 1][0]
+        spans.append((start, sentences[last][1]))
+    return spans
+
+
+def merge_chunk_results(chunk_results: List[Dict], spans: List[Span], cached_chunks: int) -> Dict:
+    """One document verdict: per-category max score, flagged if any chunk is.
+
+    ``document.triggers`` names, for every flagged category, the chunk (index
+    and character span) with the highest score among the chunks flagging it.
+    """
+    categories: Dict[str, bool] = {}
+    category_scores: Dict[str, float] = {}
+    triggers: Dict[str, Dict] = {}
+    flagged_chunks = []
+    for index, (result, (start, end)) in enumerate(zip(chunk_results, spans)):
+        verdict = result["results"][0]
+        scores = verdict.get("category_scores") or {}
+        if verdict.get("flagged"):
+            flagged_chunks.append(index)
+        for category, score in scores.items():
+            if score is not None and score > category_scores.get(category, -1.0):
+                category_scores[category] = score
+        for category, flagged in (verdict.get("categories") or {}).items():
+            categories[category] = bool(categories.get(category) or flagged)
+            score = scores.get(category) or 0.0
+            if flagged and score >= triggers.get(category, {}).get("score", -1.0):
+                triggers[category] = {"chunk": index, "start": start, "end": end, "score": score}
+
+    return {
+        "id": chunk_results[0].get("id"),
+        "model": chunk_results[0].get("model"),
+        "results": [{
+            "flagged": bool(flagged_chunks),
+            "categories": categories,
+            "category_scores": category_scores
+        }],
+        "document": {
+            "chunks": len(spans),
+            "cached_chunks": cached_chunks,
+            "flagged_chunks": flagged_chunks,
+            "triggers": triggers
+        }
+    }
+
+
+class DocumentModerator:
+    """Moderates long texts as overlapping chunks fanned out through the batcher.
+
+    Chunks are looked up in the result cache first, so only new or edited
+    chunks go upstream. The rest are submitted together and the batcher
+    packs them into list-input calls, several in flight at once.
+    """
+
+    def __init__(self, batcher: ModerationBatcher, min_chars: int, target_chars: int, max_chars: int, overlap_chars: int):
+        self.batcher = batcher
+        self.min_chars = min_chars
+        self.target_chars = target_chars
+        self.max_chars = max_chars
+        self.overlap_chars = overlap_chars
+
+    def applies(self, text: str) -> bool:
+        return self.min_chars > 0 and len(text) > self.min_chars
+
+    def moderate(self, text: str) -> Dict:
+        spans = chunk_document(text, self.target_chars, self.max_chars, self.overlap_chars)
+        if not spans:
+            # Nothing but sentence breaks (e.g. only newlines): moderate it as one ordinary input
+            return self.batcher.moderate(text)
+        chunks = [text[start:end] for start, end in spans]
+        results = get_cached_results(chunks)
+        cached_chunks = sum(result is not None for result in results)
+        document_chunks.labels("cached").inc(cached_chunks)
+        document_chunks.labels("moderated").inc(len(chunks) - cached_chunks)
+
+        pending = {i: self.batcher.submit(chunk) for i, (chunk, result) in enumerate(zip(chunks, results)) if result is None}
+        fresh = {}
+        try:
+            for i, future in pending.items():
+                results[i] = future.result()
+                fresh[chunks[i]] = results[i]
+        finally:
+            # Chunks finished before a failure are kept, so a retry only redoes the rest
+            set_cached_results(fresh)
+        return merge_chunk_results(results, spans, cached_chunks)
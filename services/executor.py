@@ -0,0 +1,18 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from utils.config import get_settings
+
+settings = get_settings()
+
+# Bounded pool for the blocking calls that remain on the API side (Celery
+# publishes and result-backend reads), so they never run on the event loop
+# and cannot grow an unbounded number of threads under load.
+sync_executor = ThreadPoolExecutor(
+    max_workers=settings.API_SYNC_WORKERS,
+    thread_name_prefix="api-sync"
+)
+
+async def run_sync(func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(sync_executor, functools.partial(func, *args, **kwargs))
@@ -1,33 +1,43 @@
-from models.health import ComponentHealth
-from db.session import engine
+import asyncio
+import datetime
+import time
+from typing import Awaitable, Callable, Dict, Optional
+from models.health import ComponentHealth, HealthCheckResponse
+from db.session import async_engine
+from db.redis import async_redis_client
+from services.executor import run_sync
+from services.metrics import health_check_latency, health_component_up, health_snapshot_age
+from utils.logging import logger
 from utils.config import get_settings
 from sqlalchemy import text
 from celery.app.control import Control
 from utils.celeryconfig import celery_app
-import redis
 
 settings = get_settings()
-redis_client = redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
 
 async def check_database_health() -> ComponentHealth:
     try:
-        with engine.connect() as conn:
-            conn.execute(text("SELECT 1"))
+        async with async_engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
         return ComponentHealth(status="healthy")
     except Exception as e:
         return ComponentHealth(status="unhealthy", details=str(e))
 
 async def check_redis_health() -> ComponentHealth:
     try:
-        redis_client.ping()
+        await async_redis_client.ping()
         return ComponentHealth(status="healthy")
     except Exception as e:
         return ComponentHealth(status="unhealthy", details=str(e))
 
 async def check_celery_health() -> ComponentHealth:
     try:
-        i = celery_app.control.inspect()
-        if not i.active():
+        # ping with limit=1 returns on the first reply instead of waiting out
+        # the broadcast timeout like inspect().active() does
+        replies = await run_sync(
+            celery_app.control.ping, timeout=settings.HEALTH_CHECK_TIMEOUT, limit=1
+        )
+        if not replies:
             return ComponentHealth(status="unhealthy", details="No active Celery workers")
         return ComponentHealth(status="healthy")
     except Exception as e:
@@ -39,4 +49,89 @@ async def check_api_health() -> ComponentHealth:
             return ComponentHealth(status="unhealthy", details="OpenAI API key not configured")
         return ComponentHealth(status="healthy")
     except Exception as e:
-        return ComponentHealth(status="unhealthy", details=str(e))
\ No newline at end of file
+        return ComponentHealth(status="unhealthy", details=str(e))
+
+
+class HealthProber:
+    """Runs all component checks concurrently on an interval and keeps the latest snapshot.
+
+    ``/health/ready`` serves ``snapshot`` directly, so probes from the
+    orchestrator never touch the database, Redis or the Celery broker.
+    """
+
+    def __init__(
+        self,
+        checks: Dict[str, Callable[[], Awaitable[ComponentHealth]]],
+        interval: float,
+        timeout: float
+    ):
+        self.checks = checks
+        self.interval = interval
+        self.timeout = timeout
+        self.snapshot: Optional[HealthCheckResponse] = None
+        self.checked_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def age(self) -> float:
+        return time.time() - self.checked_at if self.checked_at else float("inf")
+
+    def update_age_metric(self):
+        # Set explicitly (not via set_function) so it also works in multiprocess mode
+        health_snapshot_age.set(self.age())
+
+    async def _run_check(self, name: str, check: Callable[[], Awaitable[ComponentHealth]]) -> ComponentHealth:
+        start = time.monotonic()
+        try:
+            result = await asyncio.wait_for(check(), self.timeout)
+        except asyncio.TimeoutError:
+            result = ComponentHealth(status="unhealthy", details=f"Check timed out after {self.timeout}s")
+        except Exception as e:
+            result = ComponentHealth(status="unhealthy", details=str(e))
+        elapsed = time.monotonic() - start
+        result.latency_ms = round(elapsed * 1000, 3)
+        health_check_latency.labels(name).set(elapsed)
+        health_component_up.labels(name).set(1 if result.status == "healthy" else 0)
+        return result
+
+    async def probe(self) -> HealthCheckResponse:
+        names = list(self.checks)
+        results = await asyncio.gather(*(self._run_check(name, self.checks[name]) for name in names))
+        components = dict(zip(names, results))
+        overall_status = "healthy" if all(c.status == "healthy" for c in results) else "unhealthy"
+
+        self.checked_at = time.time()
+        self.snapshot = HealthCheckResponse(
+            status=overall_status,
+            last_checked=datetime.datetime.fromtimestamp(self.checked_at).isoformat(),
+            **components
+        )
+        self.update_age_metric()
+        return self.snapshot
+
+    async def _run(self):
+        while True:
+            try:
+                await self.probe()
+            except Exception as e:
+                logger.error(f"Health probe failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+health_prober = HealthProber(
+    {
+        "database": check_database_health,
+        "redis": check_redis_health,
+        "celery": check_celery_health,
+        "api": check_api_health
+    },
+    interval=settings.HEALTH_CHECK_INTERVAL,
+    timeout=settings.HEALTH_CHECK_TIMEOUT
+)
@@ -0,0 +1,345 @@
+import base64
+import binascii
+import hashlib
+import io
+import json
+import time
+import urllib.parse
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+from redis import Redis
+from redis.asyncio import Redis as AsyncRedis
+
+from db.redis import redis_client, async_redis_client
+from services.blobs import handle_digest, is_handle, read_blob
+from services.cache import CACHE_KEY_VERSION, LocalCache
+from services.executor import run_sync
+from services.metrics import image_cache_evictions, image_cache_lookups
+from utils.config import get_settings
+from utils.http import ForkSafeClient, UnsafeURL, check_public_url
+from utils.logging import logger
+
+try:
+    from PIL import Image  # Pillow (in requirements.txt), only needed for perceptual hashing
+except ImportError:
+    Image = None
+
+settings = get_settings()
+
+# Key types, in lookup order: cheapest and most exact first
+URL = "url"
+DIGEST = "digest"
+PERCEPTUAL = "perceptual"
+KEY_TYPES = (URL, DIGEST, PERCEPTUAL)
+
+DHASH_SIZE = 8
+# Low-detail images (flat colours, smooth gradients) all hash to nearly the
+# same bits, so a hash is only used when at least this many of its 64
+# comparisons are set, at least this many are clear, and at least this many
+# compare pixels differing by DHASH_MIN_CONTRAST grey levels or more
+DHASH_MIN_BITS = 8
+DHASH_MIN_CONTRAST = 4
+
+# KEYS[1] is the LRU index (sorted set of cache keys by last use), KEYS[2..]
+# the candidate keys in preference order. Returns {position, verdict} of the
+# first key holding a verdict and marks it as recently used.
+LOOKUP_SCRIPT = """
+for i = 2, #KEYS do
+    local value = redis.call("GET", KEYS[i])
+    if value then
+        redis.call("ZADD", KEYS[1], "XX", ARGV[1], KEYS[i])
+        return {i - 1, value}
+    end
+end
+return false
+"""
+
+# KEYS[1] is the LRU index, KEYS[2..] the keys to store the verdict under.
+# ARGV: now, ttl, max_entries, verdict. Least recently used keys beyond
+# max_entries are deleted; returns how many were evicted.
+STORE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local ttl = tonumber(ARGV[2])
+for i = 2, #KEYS do
+    redis.call("SET", KEYS[i], ARGV[4], "EX", ttl)
+    redis.call("ZADD", KEYS[1], now, KEYS[i])
+end
+redis.call("ZREMRANGEBYSCORE", KEYS[1], "-inf", now - ttl)
+local evicted = 0
+local overflow = redis.call("ZCARD", KEYS[1]) - tonumber(ARGV[3])
+if overflow > 0 then
+    local oldest = redis.call("ZRANGE", KEYS[1], 0, overflow - 1)
+    redis.call("ZREMRANGEBYRANK", KEYS[1], 0, overflow - 1)
+    for _, key in ipairs(oldest) do
+        redis.call("DEL", key)
+    end
+    evicted = #oldest
+end
+redis.call("EXPIRE", KEYS[1], ttl)
+return evicted
+"""
+
+
+def decode_data_uri(image_url: str) -> Optional[bytes]:
+    """Bytes of a ``data:`` URI, or None if it is not one or is malformed."""
+    if not image_url.startswith("data:"):
+        return None
+    header, separator, payload = image_url.partition(",")
+    if not separator:
+        return None
+    try:
+        if header.endswith(";base64"):
+            return base64.b64decode(payload)
+        return urllib.parse.unquote_to_bytes(payload)
+    except (binascii.Error, ValueError):
+        return None
+
+
+def perceptual_hash(data: bytes) -> Optional[str]:
+    """64-bit difference hash (dHash) of an image, as 16 hex digits.
+
+    Each bit compares two horizontally adjacent pixels of a 9x8 grayscale
+    thumbnail, so re-encoding, resizing and mild recompression keep the hash.
+    Returns None without Pillow, for data it cannot decode and for images
+    with too little detail to tell apart (see ``DHASH_MIN_BITS``).
+    """
+    if Image is None:
+        return None
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            # Lets JPEG decode at a reduced scale instead of full resolution
+            image.draft("L", (DHASH_SIZE * 8, DHASH_SIZE * 8))
+            pixels = list(image.convert("L").resize((DHASH_SIZE + 1, DHASH_SIZE), Image.BILINEAR).getdata())
+    except Exception as e:
+        logger.warning(f"Could not compute perceptual hash: {e}")
+        return None
+    value = 0
+    contrasting = 0
+    for row in range(DHASH_SIZE):
+        for col in range(DHASH_SIZE):
+            left = pixels[row * (DHASH_SIZE + 1) + col]
+            right = pixels[row * (DHASH_SIZE + 1) + col + 1]
+            value = value << 1 | (left > right)
+            contrasting += abs(left - right) >= DHASH_MIN_CONTRAST
+    ones = bin(value).count("1")
+    if min(ones, DHASH_SIZE * DHASH_SIZE - ones, contrasting) < DHASH_MIN_BITS:
+        return None
+    return f"{value:016x}"
+
+
+http_client = ForkSafeClient(lambda: httpx.Client(timeout=settings.IMAGE_CACHE_FETCH_TIMEOUT))
+
+
+def fetch_image(image_url: str, max_bytes: int) -> Optional[bytes]:
+    """Download a remote image, giving up on errors and bodies over ``max_bytes``.
+
+    Redirects are followed by hand so every hop is checked with
+    ``check_public_url`` before it is requested.
+    """
+    url = image_url
+    try:
+        for _ in range(settings.IMAGE_CACHE_FETCH_MAX_REDIRECTS + 1):
+            check_public_url(url)
+            with http_client().stream("GET", url) as response:
+                if response.is_redirect:
+                    url = str(response.next_request.url)
+                    continue
+                if response.status_code != 200:
+                    return None
+                body = bytearray()
+                for chunk in response.iter_bytes():
+                    body.extend(chunk)
+                    if len(body) > max_bytes:
+                        return None
+                return bytes(body)
+        logger.warning(f"Too many redirects fetching {image_url} for the image cache")
+        return None
+    except UnsafeURL as e:
+        logger.warning(f"Refusing to fetch image for the image cache: {e}")
+        return None
+    except httpx.HTTPError as e:
+        logger.warning(f"Could not fetch image for the image cache: {e}")
+        return None
+
+
+class ImageCache:
+    """Verdict cache for images, keyed three ways.
+
+    * ``url``: the exact ``http(s)`` URL, so repeat URLs never touch the image.
+    * ``digest``: SHA-256 of the image bytes, so the same file under another
+      URL or re-sent as a ``data:`` URI hits.
+    * ``perceptual``: a dHash of the pixels (``perceptual=True``, needs
+      Pillow), so resized or re-encoded copies hit too.
+
+    Bytes are available for ``data:`` URIs and blob handles, and for remote
+    URLs when ``fetch_remote`` is set (the worker downloads them after a URL
+    miss).
+    Verdicts live in Redis under every key of the image, with a TTL, and an
+    LRU index caps the total number of keys at ``max_entries``; a small
+    per-process ``LocalCache`` sits in front.
+    """
+
+    def __init__(
+        self,
+        redis: Redis,
+        async_redis: AsyncRedis,
+        local: LocalCache,
+        model: str,
+        ttl: int,
+        max_entries: int,
+        perceptual: bool,
+        fetch_remote: bool,
+        fetch_max_bytes: int
+    ):
+        self.redis = redis
+        self.async_redis = async_redis
+        self.local = local
+        self.model = model
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.perceptual = perceptual and Image is not None
+        self.fetch_remote = fetch_remote
+        self.fetch_max_bytes = fetch_max_bytes
+        self.index_key = f"moderation:image:{CACHE_KEY_VERSION}:{model}:lru"
+        self._lookup = redis.register_script(LOOKUP_SCRIPT)
+        self._alookup = async_redis.register_script(LOOKUP_SCRIPT)
+        self._store = redis.register_script(STORE_SCRIPT)
+        if perceptual and Image is None:
+            logger.warning("IMAGE_CACHE_PERCEPTUAL is set but Pillow is not installed; perceptual keys are disabled")
+
+    def key(self, key_type: str, fingerprint: str) -> str:
+        return f"moderation:image:{CACHE_KEY_VERSION}:{self.model}:{key_type}:{fingerprint}"
+
+    def url_fingerprints(self, image_url: str) -> Dict[str, str]:
+        if image_url.startswith(("http://", "https://")):
+            return {URL: hashlib.sha256(image_url.encode("utf-8")).hexdigest()}
+        if is_handle(image_url):
+            # Blob handles already name the digest of their bytes
+            return {DIGEST: handle_digest(image_url)}
+        return {}
+
+    def content_fingerprints(self, data: bytes) -> Dict[str, str]:
+        fingerprints = {DIGEST: hashlib.sha256(data).hexdigest()}
+        if self.perceptual:
+            phash = perceptual_hash(data)
+            if phash is not None:
+                fingerprints[PERCEPTUAL] = phash
+        return fingerprints
+
+    def fingerprints(self, image_url: str) -> Dict[str, str]:
+        """All keys of an image that can be computed without downloading it."""
+        fingerprints = self.url_fingerprints(image_url)
+        data = decode_data_uri(image_url)
+        if data is None and self.perceptual and is_handle(image_url):
+            data = read_blob(image_url)
+        if data is not None:
+            fingerprints.update(self.content_fingerprints(data))
+        return fingerprints
+
+    def _candidates(self, fingerprints: Dict[str, str]) -> List[Tuple[str, str]]:
+        return [(key_type, self.key(key_type, fingerprints[key_type])) for key_type in KEY_TYPES if key_type in fingerprints]
+
+    def _local_get(self, candidates: List[Tuple[str, str]]) -> Optional[Dict]:
+        for key_type, key in candidates:
+            result = self.local.get(key)
+            if result is not None:
+                image_cache_lookups.labels(key_type, "hit").inc()
+                return result
+        return None
+
+    def _found(self, candidates: List[Tuple[str, str]], found) -> Optional[Dict]:
+        position = int(found[0]) if found else len(candidates) + 1
+        for key_type, _ in candidates[:position - 1]:
+            image_cache_lookups.labels(key_type, "miss").inc()
+        if not found:
+            return None
+        key_type, key = candidates[position - 1]
+        image_cache_lookups.labels(key_type, "hit").inc()
+        result = json.loads(found[1])
+        self.local.set(key, result)
+        return result
+
+    def get(self, fingerprints: Dict[str, str]) -> Optional[Dict]:
+        candidates = self._candidates(fingerprints)
+        if not candidates:
+            return None
+        result = self._local_get(candidates)
+        if result is not None:
+            return result
+        return self._found(candidates, self._lookup(keys=[self.index_key] + [key for _, key in candidates], args=[time.time()]))
+
+    async def aget(self, fingerprints: Dict[str, str]) -> Optional[Dict]:
+        candidates = self._candidates(fingerprints)
+        if not candidates:
+            return None
+        result = self._local_get(candidates)
+        if result is not None:
+            return result
+        found = await self._alookup(keys=[self.index_key] + [key for _, key in candidates], args=[time.time()])
+        return self._found(candidates, found)
+
+    def lookup(self, image_url: str) -> Tuple[Optional[Dict], Dict[str, str]]:
+        """Cached verdict for ``image_url`` and the fingerprints to store a fresh one under.
+
+        A remote image is only downloaded (with ``fetch_remote``) after its URL missed.
+        """
+        fingerprints = self.fingerprints(image_url)
+        result = self.get(fingerprints)
+        if result is not None or URL not in fingerprints or not self.fetch_remote:
+            return result, fingerprints
+        data = fetch_image(image_url, self.fetch_max_bytes)
+        if data is None:
+            return None, fingerprints
+        content = self.content_fingerprints(data)
+        fingerprints.update(content)
+        return self.get(content), fingerprints
+
+    def set(self, fingerprints: Dict[str, str], result: Dict):
+        candidates = self._candidates(fingerprints)
+        if not candidates:
+            return
+        for _, key in candidates:
+            self.local.set(key, result)
+        evicted = self._store(
+            keys=[self.index_key] + [key for _, key in candidates],
+            args=[time.time(), self.ttl, self.max_entries, json.dumps(result)]
+        )
+        if evicted:
+            image_cache_evictions.inc(int(evicted))
+
+
+image_cache = ImageCache(
+    redis_client,
+    async_redis_client,
+    LocalCache(settings.IMAGE_CACHE_LOCAL_MAX_ENTRIES, settings.LOCAL_CACHE_TTL, tier="image_local"),
+    model=settings.OPENAI_MODERATION_MODEL,
+    ttl=settings.IMAGE_CACHE_TTL,
+    max_entries=settings.IMAGE_CACHE_MAX_ENTRIES,
+    perceptual=settings.IMAGE_CACHE_PERCEPTUAL,
+    fetch_remote=settings.IMAGE_CACHE_FETCH_REMOTE,
+    fetch_max_bytes=settings.IMAGE_CACHE_FETCH_MAX_BYTES
+)
+
+
+def lookup_image(image_url: str) -> Tuple[Optional[Dict], Dict[str, str]]:
+    if not settings.IMAGE_CACHE_ENABLED:
+        return None, {}
+    return image_cache.lookup(image_url)
+
+
+def store_image_result(fingerprints: Dict[str, str], result: Dict):
+    if settings.IMAGE_CACHE_ENABLED and fingerprints:
+        image_cache.set(fingerprints, result)
+
+
+async def aget_cached_image(image_url: str) -> Optional[Dict]:
+    """API-side lookup by URL and, for ``data:`` URIs, by content; never downloads."""
+    if not settings.IMAGE_CACHE_ENABLED:
+        return None
+    if image_url.startswith("data:"):
+        # Decoding and hashing a large URI must not block the event loop
+        fingerprints = await run_sync(image_cache.fingerprints, image_url)
+    else:
+        fingerprints = image_cache.url_fingerprints(image_url)
+    return await image_cache.aget(fingerprints)
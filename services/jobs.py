@@ -0,0 +1,87 @@
+import json
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+from db.redis import redis_client
+from services.notifications import job_channel
+from services.webhooks import result_status
+from utils.config import get_settings
+
+settings = get_settings()
+
+
+def _meta_key(job_id: str) -> str:
+    return f"moderation_job:{job_id}"
+
+
+def _results_key(job_id: str) -> str:
+    return f"moderation_job:{job_id}:results"
+
+
+def create_job(item_slots: List[int], unique_count: int) -> str:
+    """Register a batch job.
+
+    ``item_slots`` maps every submitted item to the index of its deduplicated
+    entry, so identical items share a single moderation result.
+    """
+    job_id = str(uuid.uuid4())
+    redis_client.setex(
+        _meta_key(job_id),
+        settings.MODERATION_JOB_TTL,
+        json.dumps({"items": item_slots, "unique": unique_count})
+    )
+    return job_id
+
+
+def record_job_results(job_id: str, results: Dict[int, Dict]):
+    if not results:
+        return
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.hset(
+        _results_key(job_id),
+        mapping={str(slot): json.dumps(result) for slot, result in results.items()}
+    )
+    pipe.expire(_results_key(job_id), settings.MODERATION_JOB_TTL)
+    # Streaming subscribers get the same results pushed as they land
+    pipe.publish(job_channel(job_id), json.dumps({str(slot): result for slot, result in results.items()}))
+    pipe.execute()
+
+
+def get_job_state(job_id: str) -> Optional[Tuple[List[int], Dict[int, Dict]]]:
+    """Return the job's item slots and the results recorded so far, or None if unknown."""
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.get(_meta_key(job_id))
+    pipe.hgetall(_results_key(job_id))
+    meta, stored = pipe.execute()
+    if not meta:
+        return None
+    return json.loads(meta)["items"], {int(slot): json.loads(value) for slot, value in stored.items()}
+
+
+def get_job(job_id: str) -> Optional[Dict]:
+    state = get_job_state(job_id)
+    if state is None:
+        return None
+
+    item_slots, results = state
+    items = []
+    for index, slot in enumerate(item_slots):
+        if slot in results:
+            items.append({"index": index, "status": result_status(results[slot]), "result": results[slot]})
+        else:
+            items.append({"index": index, "status": "processing"})
+
+    completed = sum(1 for item in items if item["status"] == "completed")
+    failed = sum(1 for item in items if item["status"] == "failed")
+    if completed + failed < len(items):
+        status = "processing"
+    else:
+        status = "failed" if failed else "completed"
+    return {
+        "id": job_id,
+        "status": status,
+        "total": len(items),
+        "completed": completed,
+        "failed": failed,
+        "items": items
+    }
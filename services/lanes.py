@@ -0,0 +1,64 @@
+from typing import Dict, Optional
+
+from db.redis import async_broker_client
+from services.metrics import celery_queue_depth, lane_rejections
+from utils.config import get_settings
+from utils.logging import logger
+
+settings = get_settings()
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+IMAGES = "images"
+
+# Lane -> Celery queue. Each queue can be consumed by its own worker pool
+# (``celery worker -Q <queue>``) so slow lanes never sit in front of fast ones.
+LANE_QUEUES: Dict[str, str] = {
+    INTERACTIVE: settings.QUEUE_INTERACTIVE,
+    BULK: settings.QUEUE_BULK,
+    IMAGES: settings.QUEUE_IMAGES,
+}
+
+LANE_MAX_DEPTH: Dict[str, int] = {
+    INTERACTIVE: settings.QUEUE_INTERACTIVE_MAX_DEPTH,
+    BULK: settings.QUEUE_BULK_MAX_DEPTH,
+    IMAGES: settings.QUEUE_IMAGES_MAX_DEPTH,
+}
+
+
+class LaneFull(Exception):
+    def __init__(self, lane: str, depth: int):
+        super().__init__(f"The {lane} queue is full ({depth} waiting)")
+        self.lane = lane
+        self.depth = depth
+
+
+def monitored_queues():
+    return list(LANE_QUEUES.values()) + [settings.WEBHOOK_QUEUE]
+
+
+async def queue_depth(queue: str) -> Optional[int]:
+    """Messages waiting in ``queue`` (a Redis list on the broker), or None if unknown."""
+    if async_broker_client is None:
+        return None
+    try:
+        depth = await async_broker_client.llen(queue)
+    except Exception as e:
+        logger.error(f"Failed to read depth of queue {queue}: {e}")
+        return None
+    celery_queue_depth.labels(queue).set(depth)
+    return depth
+
+
+async def admit(lane: str, count: int = 1):
+    """Raise ``LaneFull`` if ``count`` more tasks would push the lane past its depth limit.
+
+    Admission fails open when the broker depth cannot be read.
+    """
+    max_depth = LANE_MAX_DEPTH[lane]
+    if max_depth <= 0:
+        return
+    depth = await queue_depth(LANE_QUEUES[lane])
+    if depth is not None and depth + count > max_depth:
+        lane_rejections.labels(lane).inc()
+        raise LaneFull(lane, depth)
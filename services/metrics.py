@@ -1,16 +1,159 @@
-from prometheus_client import Counter, Histogram
-from redis import Redis
+import os
+import socket
+from typing import Optional
+from prometheus_client import Counter, Gauge, Histogram, multiprocess, values
 from utils.config import get_settings
 
 settings = get_settings()
-redis_client = Redis.from_url(settings.REDIS_URL, decode_responses=True)
+
+# In multiprocess mode every uvicorn and Celery process writes its samples to
+# mmap files in this shared directory and /api/v1/metrics aggregates them.
+# prometheus_client reads PROMETHEUS_MULTIPROC_DIR itself, so it must be set in
+# the environment of every process before it starts.
+def process_identifier(pid: Optional[int] = None) -> str:
+    """Hostname plus PID; names this process's files in the shared metrics directory.
+
+    Containers sharing the directory all start their processes at the same low
+    PIDs, so the PID alone would make them write into each other's files.
+    "_" separates the fields of the file names, so it cannot appear here.
+    """
+    return f"{socket.gethostname().replace('_', '-')}-{pid or os.getpid()}"
+
+
+def mark_process_dead(pid: Optional[int] = None):
+    """Drop the live gauges of an exiting process from the shared metrics directory."""
+    if settings.PROMETHEUS_MULTIPROC_DIR:
+        multiprocess.mark_process_dead(process_identifier(pid), settings.PROMETHEUS_MULTIPROC_DIR)
+
+
+if settings.PROMETHEUS_MULTIPROC_DIR:
+    os.makedirs(settings.PROMETHEUS_MULTIPROC_DIR, exist_ok=True)
+    # Must run before any metric below is created
+    values.ValueClass = values.MultiProcessValue(process_identifier)
 
 # Health check metrics
 health_check_requests = Counter("health_check_requests", "Number of health check requests")
 health_check_failures = Counter("health_check_failures", "Number of failed health checks")
+health_check_latency = Gauge(
+    "health_check_latency_seconds", "Duration of the last background check per component", ["component"],
+    multiprocess_mode="livemax"
+)
+health_component_up = Gauge(
+    "health_component_up", "1 if the component passed its last background check", ["component"],
+    multiprocess_mode="livemin"
+)
+health_snapshot_age = Gauge(
+    "health_snapshot_age_seconds", "Seconds since the readiness snapshot was refreshed",
+    multiprocess_mode="livemin"
+)
 
 # Moderation metrics
 moderation_requests = Counter("moderation_requests", "Number of moderation requests")
 moderation_failures = Counter("moderation_failures", "Number of failed moderation requests")
 moderation_latency = Histogram("moderation_latency_seconds", "Time spent processing moderation requests")
-cached_requests = Counter("cached_requests", "Number of cached moderation requests")
\ No newline at end of file
+cached_requests = Counter("cached_requests", "Number of cached moderation requests")
+
+# API process health
+event_loop_lag = Gauge(
+    "event_loop_lag_seconds", "How late the API event loop woke up for its last scheduled tick",
+    multiprocess_mode="livemax"
+)
+
+# Batching metrics
+moderation_batch_size = Histogram(
+    "moderation_batch_size",
+    "Number of texts sent in a single upstream moderation call",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128)
+)
+moderation_batch_wait = Histogram(
+    "moderation_batch_wait_seconds",
+    "Time a text waited in the coalescer before its batch was sent",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25)
+)
+
+# Cache metrics, labelled by tier ("local", "image_local", "redis" or "database") and event ("hit", "miss", "eviction")
+cache_events = Counter("moderation_cache_events", "Result cache lookups and evictions", ["tier", "event"])
+
+# Single-flight roles: "leader", "follower", "takeover" after a failed leader, "timeout"
+singleflight_events = Counter("moderation_singleflight_events", "Single-flight outcomes for identical in-flight texts", ["role"])
+
+# Write-behind persistence metrics
+persistence_flush_size = Histogram(
+    "moderation_persistence_flush_size",
+    "Rows written per bulk upsert of moderation results",
+    buckets=(1, 10, 50, 100, 250, 500, 1000, 5000)
+)
+persistence_flush_lag = Histogram(
+    "moderation_persistence_flush_lag_seconds",
+    "Age of the oldest buffered result when its flush completed",
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+persistence_flush_failures = Counter("moderation_persistence_flush_failures", "Failed bulk upserts of moderation results")
+persistence_buffered = Gauge(
+    "moderation_persistence_buffered", "Moderation results waiting to be flushed",
+    multiprocess_mode="livesum"
+)
+
+# Per-stage request tracing: "enqueue", "queue_wait", "cache_lookup", "upstream", "persist", "result_fetch"
+stage_latency = Histogram(
+    "moderation_stage_seconds",
+    "Time spent in each stage of the moderation request lifecycle",
+    ["stage"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+celery_queue_depth = Gauge(
+    "celery_queue_depth", "Messages waiting in each Celery queue", ["queue"],
+    multiprocess_mode="livemax"
+)
+celery_tasks_in_flight = Gauge(
+    "celery_tasks_in_flight", "Tasks currently executing, by the queue they were consumed from", ["queue"],
+    multiprocess_mode="livesum"
+)
+
+# Webhook callbacks; outcome is "delivered", "retried", "rejected" (4xx) or "dropped" (retries exhausted)
+webhook_deliveries = Counter("webhook_deliveries", "Webhook delivery attempts by outcome", ["outcome"])
+webhook_batch_size = Histogram(
+    "webhook_batch_size",
+    "Results delivered in a single webhook POST",
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250)
+)
+
+# Upstream rate limiting; reason is "bucket", "concurrency" or "upstream_429"
+upstream_throttle_events = Counter("moderation_upstream_throttled", "Upstream calls deferred by rate limiting", ["reason"])
+upstream_throttle_wait = Histogram(
+    "moderation_upstream_throttle_wait_seconds",
+    "Time spent waiting for rate limit tokens before an upstream call",
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+)
+upstream_concurrency_limit = Gauge(
+    "moderation_upstream_concurrency_limit", "Adaptive limit on concurrent upstream calls",
+    multiprocess_mode="livesum"
+)
+
+# Requests turned away because their lane's queue was over its depth limit
+lane_rejections = Counter("moderation_lane_rejections", "Requests rejected by queue-depth admission", ["lane"])
+
+# Near-duplicate verdict reuse; outcome is "hit", "miss" or "skipped" (text too short or long to fingerprint)
+near_duplicate_lookups = Counter("moderation_near_duplicate_lookups", "Near-duplicate index lookups", ["outcome"])
+near_duplicate_distance = Histogram(
+    "moderation_near_duplicate_distance_bits",
+    "SimHash Hamming distance of reused near-duplicate verdicts",
+    buckets=(0, 1, 2, 3, 4, 6, 8)
+)
+
+# Local pre-filter; decision is "block", "allow" or "pass" (sent upstream)
+prefilter_decisions = Counter("moderation_prefilter_decisions", "Texts checked by the local pre-filter", ["decision"])
+prefilter_patterns = Gauge(
+    "moderation_prefilter_patterns", "Entries loaded into the local pre-filter lists", ["list"],
+    multiprocess_mode="livemax"
+)
+
+# Image verdict cache; key_type is "url", "digest" (image bytes) or "perceptual" (dHash)
+image_cache_lookups = Counter("moderation_image_cache_lookups", "Image cache lookups by key type", ["key_type", "outcome"])
+image_cache_evictions = Counter("moderation_image_cache_evictions", "Image cache keys evicted by the LRU size cap")
+
+# Payload bytes written to the blob store (large images passed by handle)
+blob_bytes_stored = Counter("moderation_blob_bytes_stored", "Bytes written to the blob store")
+
+# Chunks of long documents; source is "cached" (reused verdict) or "moderated" (sent upstream)
+document_chunks = Counter("moderation_document_chunks", "Chunks of documents moderated in document mode", ["source"])
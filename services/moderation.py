@@ -1,32 +1,108 @@
-from openai import OpenAI
+import importlib.util
+import httpx
+from openai import OpenAI, AsyncOpenAI, RateLimitError
 from typing import Union, List, Dict
-from models.moderation import ContentItem  
+from models.moderation import ContentItem
+from services.blobs import resolve_blobs
+from services.ratelimit import upstream_limiter
 from utils.config import get_settings
 from utils.logging import logger
 
 settings = get_settings()
 
+def build_input(content: Union[str, List[Dict]]) -> Union[str, List[str]]:
+    if isinstance(content, str):
+        return content
+    input_data = []
+    for item in content:
+        if item.get('type') == "text":
+            input_data.append(item.get('text'))
+        elif item.get('type') == "image_url":
+            input_data.append(item.get('image_url'))
+    return input_data
+
+def http2_enabled() -> bool:
+    if not settings.OPENAI_HTTP2:
+        return False
+    if importlib.util.find_spec("h2") is None:
+        logger.warning("OPENAI_HTTP2 is set but the h2 package is not installed, using HTTP/1.1")
+        return False
+    return True
+
+def connection_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=settings.OPENAI_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.OPENAI_MAX_CONNECTIONS
+    )
+
 class ModerationService:
+    """Blocking moderation client; safe to share between the threads of a worker."""
+
     def __init__(self):
-        self.client = OpenAI(api_key=settings.OPENAI_API_KEY)
+        self.http_client = httpx.Client(limits=connection_limits(), http2=http2_enabled())
+        # Retries are left to the rate limiter, so 429s are not retried blindly by every worker
+        self.client = OpenAI(api_key=settings.OPENAI_API_KEY, http_client=self.http_client, max_retries=0)
 
     def moderate_content(self, content: Union[str, List[Dict]]):
+        """Moderate ``content``; raises ``RateLimited`` when upstream capacity is exhausted."""
         try:
-            if isinstance(content, str):
-                input_data = content
-            else:
-                input_data = []
-                for item in content:
-                    if item.get('type') == "text":
-                        input_data.append(item.get('text'))
-                    elif item.get('type') == "image_url":
-                        input_data.append(item.get('image_url'))
-
-            response = self.client.moderations.create(
-                model="text-moderation-latest",
-                input=input_data
-            )
+            content = resolve_blobs(content)
+            with upstream_limiter.limit(content):
+                try:
+                    response = self.client.moderations.create(
+                        model=settings.OPENAI_MODERATION_MODEL,
+                        input=build_input(content)
+                    )
+                except RateLimitError as e:
+                    raise upstream_limiter.throttled(e.response.headers) from e
             return response.model_dump()
         except Exception as e:
             logger.error(f"OpenAI API call failed: {e}")
-            raise
\ No newline at end of file
+            raise
+
+    def moderate_items(self, items: List[Dict]) -> List[Dict]:
+        """Moderate several content items in one upstream call.
+
+        Returns one result per item, each shaped like a single-input
+        ``moderate_content`` response so callers can cache them individually.
+        """
+        response = self.moderate_content(items)
+        results = response.get("results") or []
+        if len(results) != len(items):
+            raise ValueError(f"Expected {len(items)} moderation results, got {len(results)}")
+        return [
+            {"id": response.get("id"), "model": response.get("model"), "results": [result]}
+            for result in results
+        ]
+
+    def moderate_batch(self, texts: List[str]) -> List[Dict]:
+        return self.moderate_items([{"type": "text", "text": text} for text in texts])
+
+class AsyncModerationService:
+    """Event-loop friendly counterpart of ``ModerationService`` for use inside routes.
+
+    All requests share one pooled ``httpx.AsyncClient`` so synchronous
+    moderations reuse keep-alive connections to the API.
+    """
+
+    def __init__(self):
+        self.http_client = httpx.AsyncClient(limits=connection_limits(), http2=http2_enabled())
+        self.client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY, http_client=self.http_client, max_retries=0)
+
+    async def moderate_content(self, content: Union[str, List[Dict]]):
+        try:
+            async with upstream_limiter.alimit(content):
+                try:
+                    response = await self.client.moderations.create(
+                        model=settings.OPENAI_MODERATION_MODEL,
+                        input=build_input(content)
+                    )
+                except RateLimitError as e:
+                    raise await upstream_limiter.athrottled(e.response.headers) from e
+            return response.model_dump()
+        except Exception as e:
+            logger.error(f"OpenAI API call failed: {e}")
+            raise
+
+    async def close(self):
+        await self.client.close()
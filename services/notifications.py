@@ -0,0 +1,232 @@
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from celery.signals import task_postrun
+from redis.asyncio import Redis as AsyncRedis
+
+from db.redis import redis_client, async_redis_pubsub_client
+from services.webhooks import result_status
+from utils.logging import logger
+
+TASK_CHANNEL_PREFIX = "moderation:result:"
+JOB_CHANNEL_PREFIX = "moderation:job:"
+
+
+def task_channel(task_id: str) -> str:
+    return f"{TASK_CHANNEL_PREFIX}{task_id}"
+
+
+def job_channel(job_id: str) -> str:
+    return f"{JOB_CHANNEL_PREFIX}{job_id}"
+
+
+def publish_task_result(task_id: str, result):
+    redis_client.publish(task_channel(task_id), json.dumps(result))
+
+
+@task_postrun.connect
+def _publish_on_completion(task_id=None, task=None, retval=None, state=None, **kwargs):
+    # Batch chunks report per item through record_job_results instead
+    if state != "SUCCESS" or task is None or not task.name.endswith(("moderate_text_task", "moderate_content_task")):
+        return
+    try:
+        publish_task_result(task_id, retval)
+    except Exception as e:
+        logger.error(f"Failed to publish result for task {task_id}: {e}")
+
+
+class ResultSubscriber:
+    """One pub/sub connection per process, shared by every long-poll and stream.
+
+    Waiters register a queue for the channels they follow and a single
+    reader task fans messages out to them. A channel stays subscribed while
+    it has at least one waiter, so the number of pending long-polls never
+    costs more than this one Redis connection.
+    """
+
+    def __init__(self, redis: AsyncRedis):
+        self.redis = redis
+        self._pubsub = None
+        self._reader: Optional[asyncio.Task] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._active: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._waiters: Dict[str, Set[asyncio.Queue]] = {}
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # First use, or a new event loop (tests); state of the old one is unusable
+            self._loop = loop
+            self._pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+            self._lock = asyncio.Lock()
+            self._active = asyncio.Event()
+            self._waiters = {}
+            self._reader = None
+        if self._reader is None or self._reader.done():
+            self._reader = loop.create_task(self._read())
+
+    async def _read(self):
+        while True:
+            if not self._pubsub.subscribed:
+                # Reading an unsubscribed connection fails; idle until a waiter subscribes
+                self._active.clear()
+                await self._active.wait()
+                continue
+            try:
+                message = await self._pubsub.get_message(timeout=1.0)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # The connection is re-established and resubscribed on the next read
+                logger.error(f"Result subscriber read failed: {e}")
+                await asyncio.sleep(1.0)
+                continue
+            if message is None or message["type"] != "message":
+                continue
+            for queue in list(self._waiters.get(message["channel"], ())):
+                queue.put_nowait((message["channel"], message["data"]))
+
+    @asynccontextmanager
+    async def subscribe(self, channels: List[str]) -> AsyncIterator["asyncio.Queue[Tuple[str, str]]"]:
+        """Queue of ``(channel, data)`` for messages on ``channels`` while the block runs."""
+        self._ensure_started()
+        queue: asyncio.Queue = asyncio.Queue()
+        async with self._lock:
+            new_channels = [channel for channel in channels if channel not in self._waiters]
+            for channel in channels:
+                self._waiters.setdefault(channel, set()).add(queue)
+            if new_channels:
+                await self._pubsub.subscribe(*new_channels)
+                self._active.set()
+        try:
+            yield queue
+        finally:
+            async with self._lock:
+                idle_channels = []
+                for channel in channels:
+                    waiters = self._waiters.get(channel)
+                    if waiters is not None:
+                        waiters.discard(queue)
+                        if not waiters:
+                            del self._waiters[channel]
+                            idle_channels.append(channel)
+                if idle_channels:
+                    try:
+                        await self._pubsub.unsubscribe(*idle_channels)
+                    except Exception as e:
+                        logger.error(f"Failed to unsubscribe from {len(idle_channels)} result channels: {e}")
+
+    async def close(self):
+        if self._reader is not None:
+            self._reader.cancel()
+            self._reader = None
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+            self._pubsub = None
+        self._loop = None
+
+
+result_subscriber = ResultSubscriber(async_redis_pubsub_client)
+
+
+async def _next_message(queue: asyncio.Queue, timeout: float) -> Optional[Tuple[str, str]]:
+    try:
+        return await asyncio.wait_for(queue.get(), timeout)
+    except asyncio.TimeoutError:
+        return None
+
+
+async def wait_for_task_result(
+    task_id: str,
+    timeout: float,
+    fetch: Callable[[], Awaitable[Optional[Dict]]]
+) -> Optional[Dict]:
+    """Long-poll for a task result; ``fetch`` reads the result backend once after subscribing."""
+    async with result_subscriber.subscribe([task_channel(task_id)]) as queue:
+        # Checked after subscribing so a result published in between is not missed
+        result = await fetch()
+        if result is not None:
+            return result
+
+        message = await _next_message(queue, timeout)
+        return json.loads(message[1]) if message is not None else None
+
+
+async def stream_results(
+    task_ids: List[str],
+    jobs: Dict[str, List[int]],
+    timeout: float,
+    fetch_task: Callable[[str], Awaitable[Optional[Dict]]],
+    fetch_job: Callable[[str], Awaitable[Dict[int, Dict]]],
+    keepalive: float = 15.0
+) -> AsyncIterator[Dict]:
+    """Yield events for tasks and job items as they complete.
+
+    ``jobs`` maps each job id to its item slots (item index -> deduplicated
+    slot), so one upstream result fans out to every identical item. Yields
+    ``{"event": ..., "data": ...}`` dicts, ``{"event": "keepalive"}`` during
+    quiet periods, and ends once everything has completed or ``timeout``
+    expires.
+    """
+    pending_tasks = set(task_ids)
+    pending_items = {
+        job_id: {index: slot for index, slot in enumerate(slots)}
+        for job_id, slots in jobs.items()
+    }
+
+    def job_events(job_id: str, results: Dict[int, Dict]):
+        items = pending_items.get(job_id, {})
+        for index, slot in list(items.items()):
+            if slot in results:
+                del items[index]
+                yield {"event": "item", "data": {
+                    "job_id": job_id, "index": index, "status": result_status(results[slot]), "result": results[slot]
+                }}
+
+    def done() -> bool:
+        return not pending_tasks and not any(pending_items.values())
+
+    channels = [task_channel(task_id) for task_id in task_ids] + [job_channel(job_id) for job_id in jobs]
+    async with result_subscriber.subscribe(channels) as queue:
+        # Emit whatever already finished before we subscribed
+        for task_id in task_ids:
+            result = await fetch_task(task_id)
+            if result is not None:
+                pending_tasks.discard(task_id)
+                yield {"event": "result", "data": {"id": task_id, "status": result_status(result), "result": result}}
+        for job_id in jobs:
+            for event in job_events(job_id, await fetch_job(job_id)):
+                yield event
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        last_event = loop.time()
+        while not done():
+            now = loop.time()
+            if now >= deadline:
+                yield {"event": "timeout", "data": {"pending": sorted(pending_tasks)}}
+                return
+            if now - last_event >= keepalive:
+                last_event = now
+                yield {"event": "keepalive"}
+            message = await _next_message(queue, min(deadline - now, keepalive))
+            if message is None:
+                continue
+            last_event = loop.time()
+
+            channel, data = message
+            payload = json.loads(data)
+            if channel.startswith(TASK_CHANNEL_PREFIX):
+                task_id = channel[len(TASK_CHANNEL_PREFIX):]
+                if task_id in pending_tasks:
+                    pending_tasks.discard(task_id)
+                    yield {"event": "result", "data": {"id": task_id, "status": result_status(payload), "result": payload}}
+            else:
+                job_id = channel[len(JOB_CHANNEL_PREFIX):]
+                for event in job_events(job_id, {int(slot): result for slot, result in payload.items()}):
+                    yield event
+
+        yield {"event": "done", "data": {}}
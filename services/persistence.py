@@ -0,0 +1,161 @@
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Engine
+
+from db.models import ModerationResult
+from db.session import engine
+from services.cache import content_digest
+from services.metrics import (
+    persistence_buffered,
+    persistence_flush_failures,
+    persistence_flush_lag,
+    persistence_flush_size
+)
+from utils.config import get_settings
+from utils.logging import logger
+
+settings = get_settings()
+
+UPSERT_DIALECTS = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert,
+}
+
+
+class ResultWriter:
+    """Write-behind buffer for ``ModerationResult`` rows.
+
+    Results are buffered in memory and flushed as a single multi-row
+    ``INSERT ... ON CONFLICT DO UPDATE`` keyed on (content_hash, model) once
+    ``max_batch`` rows are pending or the oldest row is ``flush_interval``
+    seconds old. A repeat text therefore updates its row instead of failing
+    the task.
+    """
+
+    def __init__(self, engine: Engine, model: str, max_batch: int, flush_interval: float, max_buffer: int):
+        self.engine = engine
+        self.model = model
+        self.max_batch = max(1, max_batch)
+        self.flush_interval = flush_interval
+        self.max_buffer = max(max_buffer, self.max_batch)
+        self._buffer: List[Tuple[str, str, float]] = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+
+    def add(self, text: str, result: Dict):
+        self._ensure_started()
+        with self._lock:
+            self._buffer.append((text, json.dumps(result), time.monotonic()))
+            size = len(self._buffer)
+        persistence_buffered.set(size)
+        if size >= self.max_batch:
+            self._wakeup.set()
+
+    def _ensure_started(self):
+        # Like the batcher, the flusher thread must live in the forked worker process
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            if self._pid is not None and self._pid != os.getpid():
+                self._buffer = []
+            self._pid = os.getpid()
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name="result-writer", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self) -> int:
+        """Write everything buffered so far; returns the number of rows written."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._buffer = self._buffer, []
+            if not pending:
+                return 0
+
+            # Postgres rejects an upsert that touches the same row twice, so keep the newest per content hash
+            rows: Dict[str, Tuple[str, str]] = {}
+            for text, result, _ in pending:
+                rows[content_digest(text)] = (text, result)
+            oldest = min(enqueued_at for _, _, enqueued_at in pending)
+
+            try:
+                self._upsert(rows)
+            except Exception as e:
+                logger.error(f"Failed to flush {len(rows)} moderation results: {e}")
+                persistence_flush_failures.inc()
+                self._requeue(pending)
+                return 0
+
+            persistence_flush_size.observe(len(rows))
+            persistence_flush_lag.observe(time.monotonic() - oldest)
+            with self._lock:
+                persistence_buffered.set(len(self._buffer))
+            return len(rows)
+
+    def write(self, results: List[Tuple[str, Dict]]) -> int:
+        """Upsert ``(text, result)`` pairs right away, bypassing the buffer.
+
+        Raises on failure; used by offline jobs that must know a row is
+        stored before they checkpoint past it.
+        """
+        rows = {content_digest(text): (text, json.dumps(result)) for text, result in results}
+        if rows:
+            self._upsert(rows)
+            persistence_flush_size.observe(len(rows))
+        return len(rows)
+
+    def _upsert(self, rows: Dict[str, Tuple[str, str]]):
+        insert = UPSERT_DIALECTS[self.engine.dialect.name]
+        statement = insert(ModerationResult).values([
+            {"content_hash": digest, "model": self.model, "text": text, "result": result}
+            for digest, (text, result) in rows.items()
+        ])
+        statement = statement.on_conflict_do_update(
+            index_elements=[ModerationResult.content_hash, ModerationResult.model],
+            set_={"text": statement.excluded.text, "result": statement.excluded.result, "updated_at": func.now()}
+        )
+        with self.engine.begin() as conn:
+            conn.execute(statement)
+
+    def _requeue(self, pending: List[Tuple[str, str, float]]):
+        with self._lock:
+            self._buffer = pending + self._buffer
+            overflow = len(self._buffer) - self.max_buffer
+            if overflow > 0:
+                logger.error(f"Result writer buffer full, dropping {overflow} oldest rows")
+                del self._buffer[:overflow]
+            persistence_buffered.set(len(self._buffer))
+
+    def close(self):
+        """Stop the flusher thread and write out whatever is still buffered."""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None and self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join(timeout=self.flush_interval + 5)
+        self.flush()
+
+
+result_writer = ResultWriter(
+    engine,
+    model=settings.OPENAI_MODERATION_MODEL,
+    max_batch=settings.PERSISTENCE_BATCH_SIZE,
+    flush_interval=settings.PERSISTENCE_FLUSH_INTERVAL,
+    max_buffer=settings.PERSISTENCE_MAX_BUFFER
+)
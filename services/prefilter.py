@@ -0,0 +1,305 @@
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, FrozenSet, Iterator, List, Optional, Tuple
+
+from services.metrics import prefilter_decisions, prefilter_patterns
+from utils.config import get_settings
+from utils.logging import logger
+from utils.text import fold_text
+
+try:
+    import ahocorasick  # pyahocorasick, a C automaton; the pure-Python one below is the fallback
+except ImportError:
+    ahocorasick = None
+
+settings = get_settings()
+
+LOCAL_MODEL = "local-prefilter"
+BLOCK = "block"
+ALLOW = "allow"
+PASS = "pass"
+MAX_REPORTED_TERMS = 5
+MIN_POLL_INTERVAL = 0.1
+
+# Category keys of OpenAI moderation results, so local verdicts share their schema
+CATEGORIES = (
+    "harassment", "harassment_threatening", "hate", "hate_threatening", "illicit", "illicit_violent",
+    "self_harm", "self_harm_instructions", "self_harm_intent", "sexual", "sexual_minors",
+    "violence", "violence_graphic"
+)
+
+
+class _PurePythonAutomaton:
+    """Aho-Corasick automaton with the ``iter`` interface of ``ahocorasick.Automaton``."""
+
+    def __init__(self, words: Dict[str, object]):
+        goto: List[Dict[str, int]] = [{}]
+        outputs: List[List[object]] = [[]]
+        for word, value in words.items():
+            state = 0
+            for char in word:
+                next_state = goto[state].get(char)
+                if next_state is None:
+                    next_state = len(goto)
+                    goto[state][char] = next_state
+                    goto.append({})
+                    outputs.append([])
+                state = next_state
+            outputs[state].append(value)
+
+        # Breadth-first, so a state's failure link is finished before its children's
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in goto[state].items():
+                queue.append(next_state)
+                link = fail[state]
+                while link and char not in goto[link]:
+                    link = fail[link]
+                fail[next_state] = goto[link].get(char, 0)
+                if outputs[fail[next_state]]:
+                    outputs[next_state] = outputs[next_state] + outputs[fail[next_state]]
+
+        self._goto = goto
+        self._fail = fail
+        self._outputs = outputs
+
+    def iter(self, text: str) -> Iterator[Tuple[int, object]]:
+        goto, fail, outputs = self._goto, self._fail, self._outputs
+        state = 0
+        for end, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if outputs[state]:
+                for value in outputs[state]:
+                    yield end, value
+
+
+def build_automaton(words: Dict[str, object]):
+    if ahocorasick is None:
+        return _PurePythonAutomaton(words)
+    automaton = ahocorasick.Automaton()
+    for word, value in words.items():
+        automaton.add_word(word, value)
+    automaton.make_automaton()
+    return automaton
+
+
+def _is_word_char(char: str) -> bool:
+    return char.isalnum() or char == "_"
+
+
+class TermMatcher:
+    """Finds whole-word occurrences of many terms in one pass over a text."""
+
+    def __init__(self, terms: Dict[str, str]):
+        # term -> category; terms and texts are both folded with utils.text.fold_text
+        self.size = len(terms)
+        self._automaton = build_automaton({term: (term, category) for term, category in terms.items()}) if terms else None
+
+    def find(self, folded: str, limit: int = MAX_REPORTED_TERMS) -> List[Tuple[str, str]]:
+        matches: List[Tuple[str, str]] = []
+        if self._automaton is None:
+            return matches
+        last = len(folded) - 1
+        for end, (term, category) in self._automaton.iter(folded):
+            start = end - len(term) + 1
+            # "ass" must not match inside "class", while "spam.example/" may end mid-URL
+            if _is_word_char(term[0]) and start > 0 and _is_word_char(folded[start - 1]):
+                continue
+            if _is_word_char(term[-1]) and end < last and _is_word_char(folded[end + 1]):
+                continue
+            if (term, category) not in matches:
+                matches.append((term, category))
+                if len(matches) >= limit:
+                    break
+        return matches
+
+
+class _Lists:
+    __slots__ = ("blocklist", "allowlist", "mtimes")
+
+    def __init__(self, blocklist: TermMatcher, allowlist: FrozenSet[str], mtimes: Tuple[Optional[float], ...]):
+        self.blocklist = blocklist
+        self.allowlist = allowlist
+        self.mtimes = mtimes
+
+
+def _mtime(path: Optional[str]) -> Optional[float]:
+    if not path:
+        return None
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+def _read_lines(path: Optional[str]) -> List[str]:
+    """Non-empty, non-comment lines of a list file; a missing file is an empty list."""
+    if not path:
+        return []
+    try:
+        with open(path, encoding="utf-8") as f:
+            return [line.rstrip("\n") for line in f if line.strip() and not line.lstrip().startswith("#")]
+    except OSError as e:
+        logger.error(f"Failed to read pre-filter list {path}: {e}")
+        return []
+
+
+def load_blocklist(path: Optional[str], default_category: str) -> Dict[str, str]:
+    """Parse ``term`` or ``term<TAB>category`` lines into folded term -> category."""
+    terms: Dict[str, str] = {}
+    for line in _read_lines(path):
+        term, _, category = line.partition("\t")
+        category = category.strip() or default_category
+        if category not in CATEGORIES:
+            logger.warning(f"Unknown category {category!r} for blocklist term {term!r}, using {default_category}")
+            category = default_category
+        term = fold_text(term)
+        if term:
+            terms[term] = category
+    return terms
+
+
+def load_allowlist(path: Optional[str]) -> FrozenSet[str]:
+    """Whole messages (e.g. system notices) that are always safe, folded."""
+    return frozenset(filter(None, (fold_text(line) for line in _read_lines(path))))
+
+
+def local_result(flagged: bool, categories: FrozenSet[str] = frozenset(), matched_terms: Optional[List[str]] = None) -> Dict:
+    """A moderation response in the OpenAI schema, marked as decided locally."""
+    result = {
+        "id": "modr-local",
+        "model": LOCAL_MODEL,
+        "results": [{
+            "flagged": flagged,
+            "categories": {category: category in categories for category in CATEGORIES},
+            "category_scores": {category: 1.0 if category in categories else 0.0 for category in CATEGORIES}
+        }],
+        "local_decision": BLOCK if flagged else ALLOW
+    }
+    if matched_terms:
+        result["matched_terms"] = matched_terms
+    return result
+
+
+class Prefilter:
+    """Local verdicts for texts that need no upstream call.
+
+    Texts equal to an allowlist entry are safe; texts containing a blocklist
+    term as a whole word are flagged under that term's category. Both sides
+    are folded (NFKC, invisible characters, case, whitespace) before matching.
+    Texts matching neither return ``None`` and go to OpenAI as usual.
+
+    The lists are loaded, and their files polled by modification time every
+    ``reload_interval`` seconds, by a background thread, so building the
+    automaton never blocks a caller (the API calls ``check`` on its event
+    loop). Lookups keep using the previous lists until the new ones are
+    swapped in, and pass every text upstream until the first load finished.
+    """
+
+    def __init__(
+        self,
+        blocklist_path: Optional[str],
+        allowlist_path: Optional[str],
+        reload_interval: float,
+        default_category: str
+    ):
+        self.blocklist_path = blocklist_path
+        self.allowlist_path = allowlist_path
+        self.reload_interval = reload_interval
+        self.default_category = default_category
+        self._lists: Optional[_Lists] = None
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._start_lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.blocklist_path or self.allowlist_path)
+
+    def _current_mtimes(self) -> Tuple[Optional[float], ...]:
+        return (_mtime(self.blocklist_path), _mtime(self.allowlist_path))
+
+    def reload(self):
+        mtimes = self._current_mtimes()
+        started_at = time.monotonic()
+        blocklist = TermMatcher(load_blocklist(self.blocklist_path, self.default_category))
+        allowlist = load_allowlist(self.allowlist_path)
+        self._lists = _Lists(blocklist, allowlist, mtimes)
+        prefilter_patterns.labels("blocklist").set(blocklist.size)
+        prefilter_patterns.labels("allowlist").set(len(allowlist))
+        logger.info(
+            f"Loaded pre-filter lists: {blocklist.size} blocklist terms, {len(allowlist)} allowlist entries "
+            f"in {time.monotonic() - started_at:.3f}s ({'pyahocorasick' if ahocorasick else 'pure Python'})"
+        )
+
+    def reload_if_changed(self) -> bool:
+        """Rebuild the lists if a file changed since they were loaded; returns whether it did."""
+        if self._lists is None or self._lists.mtimes != self._current_mtimes():
+            self.reload()
+            return True
+        return False
+
+    def start(self):
+        """Start the loader thread; ``check`` does so on first use."""
+        if self.enabled:
+            self._ensure_started()
+
+    def _ensure_started(self):
+        # The thread must live in the process doing the lookups, not the parent of a forked worker
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="prefilter-loader", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.reload_if_changed()
+            except Exception as e:
+                logger.error(f"Failed to load pre-filter lists: {e}")
+            time.sleep(max(self.reload_interval, MIN_POLL_INTERVAL))
+
+    def check(self, text: str) -> Optional[Dict]:
+        if not self.enabled:
+            return None
+        self._ensure_started()
+        lists = self._lists
+        if lists is None:
+            return None
+        folded = fold_text(text)
+        if folded in lists.allowlist:
+            prefilter_decisions.labels(ALLOW).inc()
+            return local_result(False)
+        matches = lists.blocklist.find(folded)
+        if matches:
+            prefilter_decisions.labels(BLOCK).inc()
+            return local_result(
+                True,
+                frozenset(category for _, category in matches),
+                [term for term, _ in matches]
+            )
+        prefilter_decisions.labels(PASS).inc()
+        return None
+
+
+prefilter = Prefilter(
+    settings.PREFILTER_BLOCKLIST_PATH,
+    settings.PREFILTER_ALLOWLIST_PATH,
+    reload_interval=settings.PREFILTER_RELOAD_INTERVAL,
+    default_category=settings.PREFILTER_DEFAULT_CATEGORY
+)
+
+
+def check_text(text: str) -> Optional[Dict]:
+    """Local verdict for ``text``, or None if it has to be moderated upstream."""
+    return prefilter.check(text)
@@ -0,0 +1,326 @@
+import email.utils
+import math
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict, List, Mapping, Optional, Union
+
+from redis import Redis
+from redis.asyncio import Redis as AsyncRedis
+
+from db.redis import redis_client, async_redis_client
+from services.metrics import (
+    upstream_concurrency_limit,
+    upstream_throttle_events,
+    upstream_throttle_wait
+)
+from utils.config import get_settings
+
+settings = get_settings()
+
+BUCKET_KEY = "ratelimit:openai:bucket"
+PAUSE_KEY = "ratelimit:openai:paused_until"
+
+# Refill both buckets (requests and input tokens) from Redis' clock, then take
+# the cost from both or from neither. Returns {granted, wait_ms}. A rate of 0
+# disables that bucket; a pause set after an upstream 429 blocks everyone.
+ACQUIRE_SCRIPT = """
+local now_parts = redis.call("TIME")
+local now = tonumber(now_parts[1]) * 1000 + math.floor(tonumber(now_parts[2]) / 1000)
+local paused_until = tonumber(redis.call("GET", KEYS[2]) or "0")
+if paused_until > now then
+    return {0, paused_until - now}
+end
+
+local request_rate, request_burst = tonumber(ARGV[1]), tonumber(ARGV[2])
+local token_rate, token_burst = tonumber(ARGV[3]), tonumber(ARGV[4])
+local request_cost, token_cost = tonumber(ARGV[5]), math.min(tonumber(ARGV[6]), tonumber(ARGV[4]))
+
+local state = redis.call("HMGET", KEYS[1], "requests", "tokens", "ts")
+local elapsed = math.max(now - (tonumber(state[3]) or now), 0) / 1000
+local requests = math.min(request_burst, (tonumber(state[1]) or request_burst) + elapsed * request_rate)
+local tokens = math.min(token_burst, (tonumber(state[2]) or token_burst) + elapsed * token_rate)
+
+local wait = 0
+if request_rate > 0 and requests < request_cost then
+    wait = math.max(wait, (request_cost - requests) / request_rate * 1000)
+end
+if token_rate > 0 and tokens < token_cost then
+    wait = math.max(wait, (token_cost - tokens) / token_rate * 1000)
+end
+if wait == 0 then
+    requests = requests - request_cost
+    tokens = tokens - token_cost
+end
+
+redis.call("HSET", KEYS[1], "requests", requests, "tokens", tokens, "ts", now)
+redis.call("PEXPIRE", KEYS[1], ARGV[7])
+if wait == 0 then
+    return {1, 0}
+end
+return {0, math.ceil(wait)}
+"""
+
+# Extend (never shorten) the cluster-wide pause after an upstream 429
+PAUSE_SCRIPT = """
+local now_parts = redis.call("TIME")
+local now = tonumber(now_parts[1]) * 1000 + math.floor(tonumber(now_parts[2]) / 1000)
+local paused_until = now + tonumber(ARGV[1])
+if paused_until > tonumber(redis.call("GET", KEYS[1]) or "0") then
+    redis.call("SET", KEYS[1], paused_until, "PX", ARGV[1])
+end
+return 1
+"""
+
+# Rough OpenAI-style token estimate; images are billed at a flat rate
+CHARS_PER_TOKEN = 4
+IMAGE_TOKENS = 85
+
+
+class RateLimited(Exception):
+    """Upstream capacity is exhausted; try again after ``retry_after`` seconds."""
+
+    def __init__(self, retry_after: float, reason: str):
+        super().__init__(f"Rate limited ({reason}), retry after {retry_after:.2f}s")
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+def estimate_tokens(content: Union[str, List[Dict]]) -> int:
+    if isinstance(content, str):
+        return len(content) // CHARS_PER_TOKEN + 1
+    tokens = 0
+    for item in content:
+        if item.get("type") == "image_url":
+            tokens += IMAGE_TOKENS
+        else:
+            tokens += len(item.get("text") or "") // CHARS_PER_TOKEN + 1
+    return tokens
+
+
+def parse_retry_after(headers: Optional[Mapping[str, str]], default: float) -> float:
+    """Seconds to back off, from ``retry-after-ms`` or ``retry-after`` (seconds or HTTP date)."""
+    if not headers:
+        return default
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return max(float(value) / 1000.0, 0.0)
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if value:
+        try:
+            return max(float(value), 0.0)
+        except ValueError:
+            try:
+                return max(email.utils.parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+            except (TypeError, ValueError):
+                pass
+    return default
+
+
+class TokenBucket:
+    """Cluster-wide request and input-token buckets shared by every worker through Redis."""
+
+    def __init__(
+        self,
+        redis: Redis,
+        async_redis: AsyncRedis,
+        requests_per_minute: float,
+        tokens_per_minute: float,
+        burst_seconds: float
+    ):
+        self.request_rate = requests_per_minute / 60.0
+        self.token_rate = tokens_per_minute / 60.0
+        self.burst_seconds = burst_seconds
+        self._acquire = redis.register_script(ACQUIRE_SCRIPT)
+        self._aacquire = async_redis.register_script(ACQUIRE_SCRIPT)
+        self._pause = redis.register_script(PAUSE_SCRIPT)
+        self._apause = async_redis.register_script(PAUSE_SCRIPT)
+
+    @property
+    def enabled(self) -> bool:
+        return self.request_rate > 0 or self.token_rate > 0
+
+    def _params(self, tokens: int):
+        # Burst must hold at least one request and the largest single input
+        request_burst = max(self.request_rate * self.burst_seconds, 1)
+        token_burst = max(self.token_rate * self.burst_seconds, 1)
+        ttl_ms = int((self.burst_seconds + 60) * 1000)
+        return {
+            "keys": [BUCKET_KEY, PAUSE_KEY],
+            "args": [self.request_rate, request_burst, self.token_rate, token_burst, 1, tokens, ttl_ms]
+        }
+
+    def try_acquire(self, tokens: int) -> float:
+        """Take one request and ``tokens`` input tokens; returns 0 or the seconds to wait."""
+        if not self.enabled:
+            return 0.0
+        granted, wait_ms = self._acquire(**self._params(tokens))
+        return 0.0 if granted else wait_ms / 1000.0
+
+    async def atry_acquire(self, tokens: int) -> float:
+        if not self.enabled:
+            return 0.0
+        granted, wait_ms = await self._aacquire(**self._params(tokens))
+        return 0.0 if granted else wait_ms / 1000.0
+
+    def pause(self, seconds: float):
+        self._pause(keys=[PAUSE_KEY], args=[max(int(seconds * 1000), 1)])
+
+    async def apause(self, seconds: float):
+        await self._apause(keys=[PAUSE_KEY], args=[max(int(seconds * 1000), 1)])
+
+
+class AdaptiveConcurrency:
+    """Per-process AIMD limit on concurrent upstream calls.
+
+    Each call completing under ``latency_target`` raises the limit by
+    ``1 / limit`` (about one per round of calls); a 429 halves it and a slow
+    call trims it by ``backoff``.
+    """
+
+    def __init__(self, max_limit: int, latency_target: float, backoff: float = 0.9):
+        self.max_limit = max(1, max_limit)
+        self.latency_target = latency_target
+        self.backoff = backoff
+        self.limit = float(self.max_limit)
+        self.in_flight = 0
+        self._condition = threading.Condition()
+        upstream_concurrency_limit.set(self.limit)
+
+    def acquire(self, timeout: float) -> bool:
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while self.in_flight >= math.floor(self.limit):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+            self.in_flight += 1
+            return True
+
+    def release(self, latency: Optional[float], throttled: bool = False):
+        with self._condition:
+            self.in_flight -= 1
+            if throttled:
+                self.limit = max(1.0, self.limit / 2)
+            elif latency is not None and latency > self.latency_target:
+                self.limit = max(1.0, self.limit * self.backoff)
+            elif latency is not None:
+                self.limit = min(float(self.max_limit), self.limit + 1 / self.limit)
+            upstream_concurrency_limit.set(self.limit)
+            self._condition.notify_all()
+
+
+class UpstreamLimiter:
+    """Gate in front of every upstream moderation call.
+
+    Callers first take a slot under the adaptive concurrency limit and then
+    tokens from the shared bucket, each waiting in-process for at most
+    ``max_wait`` seconds, so tokens are only spent on calls that go out.
+    Anything that would wait longer raises ``RateLimited`` so the task can be
+    requeued instead of holding a worker.
+    """
+
+    def __init__(self, bucket: TokenBucket, concurrency: AdaptiveConcurrency, max_wait: float, default_retry_after: float):
+        self.bucket = bucket
+        self.concurrency = concurrency
+        self.max_wait = max_wait
+        self.default_retry_after = default_retry_after
+
+    def _take_tokens(self, tokens: int):
+        deadline = time.monotonic() + self.max_wait
+        started = time.monotonic()
+        while True:
+            wait = self.bucket.try_acquire(tokens)
+            if wait == 0:
+                upstream_throttle_wait.observe(time.monotonic() - started)
+                return
+            if time.monotonic() + wait > deadline:
+                upstream_throttle_events.labels("bucket").inc()
+                raise RateLimited(wait, "token bucket")
+            time.sleep(wait)
+
+    @contextmanager
+    def limit(self, content: Union[str, List[Dict]]):
+        if not self.concurrency.acquire(self.max_wait):
+            upstream_throttle_events.labels("concurrency").inc()
+            raise RateLimited(self.max_wait, "concurrency limit")
+        try:
+            self._take_tokens(estimate_tokens(content))
+        except BaseException:
+            # No call was made, so the slot is returned without feedback
+            self.concurrency.release(None)
+            raise
+
+        started = time.monotonic()
+        latency: Optional[float] = None
+        throttled = False
+        try:
+            yield
+            latency = time.monotonic() - started
+        except RateLimited:
+            throttled = True
+            raise
+        finally:
+            self.concurrency.release(latency, throttled)
+
+    def throttled(self, headers: Optional[Mapping[str, str]]) -> RateLimited:
+        """Record an upstream 429: pause the whole cluster for its Retry-After."""
+        retry_after = parse_retry_after(headers, self.default_retry_after)
+        upstream_throttle_events.labels("upstream_429").inc()
+        self.bucket.pause(retry_after)
+        return RateLimited(retry_after, "upstream 429")
+
+    @asynccontextmanager
+    async def alimit(self, content: Union[str, List[Dict]]):
+        """Non-waiting ``limit`` for the API's inline path; it falls back to the queue when throttled.
+
+        The call still counts against, and feeds latency and 429s back into,
+        this process's adaptive concurrency limit.
+        """
+        if not self.concurrency.acquire(0):
+            upstream_throttle_events.labels("concurrency").inc()
+            raise RateLimited(self.default_retry_after, "concurrency limit")
+        try:
+            wait = await self.bucket.atry_acquire(estimate_tokens(content))
+            if wait:
+                upstream_throttle_events.labels("bucket").inc()
+                raise RateLimited(wait, "token bucket")
+        except BaseException:
+            self.concurrency.release(None)
+            raise
+
+        started = time.monotonic()
+        latency: Optional[float] = None
+        throttled = False
+        try:
+            yield
+            latency = time.monotonic() - started
+        except RateLimited:
+            throttled = True
+            raise
+        finally:
+            self.concurrency.release(latency, throttled)
+
+    async def athrottled(self, headers: Optional[Mapping[str, str]]) -> RateLimited:
+        retry_after = parse_retry_after(headers, self.default_retry_after)
+        upstream_throttle_events.labels("upstream_429").inc()
+        await self.bucket.apause(retry_after)
+        return RateLimited(retry_after, "upstream 429")
+
+
+upstream_limiter = UpstreamLimiter(
+    TokenBucket(
+        redis_client,
+        async_redis_client,
+        requests_per_minute=settings.OPENAI_RATE_LIMIT_RPM,
+        tokens_per_minute=settings.OPENAI_RATE_LIMIT_TPM,
+        burst_seconds=settings.OPENAI_RATE_LIMIT_BURST_SECONDS
+    ),
+    AdaptiveConcurrency(settings.OPENAI_MAX_CONCURRENCY, settings.OPENAI_LATENCY_TARGET),
+    max_wait=settings.OPENAI_THROTTLE_MAX_WAIT,
+    default_retry_after=settings.OPENAI_RETRY_AFTER_DEFAULT
+)
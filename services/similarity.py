@@ -0,0 +1,233 @@
+import hashlib
+import json
+import re
+import unicodedata
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from redis import Redis
+from redis.asyncio import Redis as AsyncRedis
+
+from db.redis import redis_client, async_redis_client
+from services.cache import cache_key_for_digest, content_digest
+from services.metrics import near_duplicate_distance, near_duplicate_lookups
+from utils.config import get_settings
+from utils.text import WHITESPACE_PATTERN, fold_text
+
+settings = get_settings()
+
+INDEX_KEY_VERSION = "v1"
+FINGERPRINT_BITS = 64
+BANDS = 4
+BAND_BITS = FINGERPRINT_BITS // BANDS
+SHINGLE_SIZE = 4
+
+URL_PATTERN = re.compile(r"(?:https?://|www\.)\S+", re.IGNORECASE)
+EMOJI_RUN_PATTERN = re.compile(r"(?:<emoji>\s*)+")
+URL_TOKEN = " <url> "
+EMOJI_TOKEN = " <emoji> "
+
+
+def canonicalize(text: str) -> str:
+    """Fold the trivial variations spam campaigns use to dodge exact matching.
+
+    Applies NFKC, strips invisible characters, replaces every URL with
+    ``<url>`` and every run of emoji/pictographs with ``<emoji>``, and folds
+    case and whitespace.
+    """
+    text = URL_PATTERN.sub(URL_TOKEN, fold_text(text))
+    text = "".join(EMOJI_TOKEN if unicodedata.category(char) in ("So", "Sk") else char for char in text)
+    text = WHITESPACE_PATTERN.sub(" ", text).strip()
+    return EMOJI_RUN_PATTERN.sub("<emoji> ", text).strip()
+
+
+def _feature_hash(feature: str) -> int:
+    return int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+# Bit-sliced accumulation: each hash is spread into 64 lanes of LANE_BITS so a
+# single big-int addition updates every bit's vote at once. SPREAD_TABLES[k]
+# spreads byte k of a hash into its 8 lanes.
+LANE_BITS = 32
+LANE_MASK = (1 << LANE_BITS) - 1
+SPREAD_TABLES = [
+    [sum(1 << (LANE_BITS * (8 * k + i)) for i in range(8) if byte >> i & 1) for byte in range(256)]
+    for k in range(8)
+]
+
+
+def _spread(value: int) -> int:
+    t0, t1, t2, t3, t4, t5, t6, t7 = SPREAD_TABLES
+    return (
+        t0[value & 0xFF] + t1[value >> 8 & 0xFF] + t2[value >> 16 & 0xFF] + t3[value >> 24 & 0xFF]
+        + t4[value >> 32 & 0xFF] + t5[value >> 40 & 0xFF] + t6[value >> 48 & 0xFF] + t7[value >> 56]
+    )
+
+
+def simhash(canonical: str) -> int:
+    """64-bit SimHash over character shingles of ``canonical``."""
+    if len(canonical) <= SHINGLE_SIZE:
+        shingles = Counter([canonical])
+    else:
+        shingles = Counter(canonical[i:i + SHINGLE_SIZE] for i in range(len(canonical) - SHINGLE_SIZE + 1))
+    votes = sum(count * _spread(_feature_hash(shingle)) for shingle, count in shingles.items())
+    total = sum(shingles.values())
+    # A bit is set when more than half of the shingle weight has it set
+    return sum(
+        1 << bit for bit in range(FINGERPRINT_BITS)
+        if 2 * (votes >> (LANE_BITS * bit) & LANE_MASK) > total
+    )
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def bands(fingerprint: int) -> List[int]:
+    return [(fingerprint >> (band * BAND_BITS)) & ((1 << BAND_BITS) - 1) for band in range(BANDS)]
+
+
+class NearDuplicateIndex:
+    """Locality-sensitive index from SimHash fingerprints to cached verdicts.
+
+    A fingerprint is split into ``BANDS`` bands of 16 bits, and each band value
+    keys a short capped Redis list of ``"<fingerprint>:<content digest>"``
+    entries. By the pigeonhole principle, any two fingerprints within 3 bits of
+    each other share at least one band, so every such neighbour is a candidate.
+    Candidates within ``max_distance`` bits reuse the verdict cached under
+    their digest. Larger distances would silently miss neighbours, so they
+    are rejected.
+    """
+
+    def __init__(
+        self,
+        redis: Redis,
+        async_redis: AsyncRedis,
+        model: str,
+        max_distance: int,
+        min_length: int,
+        max_length: int,
+        bucket_size: int,
+        ttl: int
+    ):
+        if not 0 <= max_distance < BANDS:
+            raise ValueError(
+                f"NEAR_DUPLICATE_MAX_DISTANCE must be between 0 and {BANDS - 1}: "
+                f"the {BANDS}-band index cannot find neighbours {max_distance} bits away"
+            )
+        self.redis = redis
+        self.async_redis = async_redis
+        self.model = model
+        self.max_distance = max_distance
+        self.min_length = min_length
+        self.max_length = max_length
+        self.bucket_size = bucket_size
+        self.ttl = ttl
+
+    def _band_key(self, band: int, value: int) -> str:
+        return f"moderation:simhash:{INDEX_KEY_VERSION}:{self.model}:{band}:{value:04x}"
+
+    def _fingerprint(self, text: str) -> Optional[int]:
+        canonical = canonicalize(text)
+        # Short texts change meaning with a single word, only exact matches are safe;
+        # long documents are rarely campaign variants and cost the most to fingerprint
+        if not self.min_length <= len(canonical) <= self.max_length:
+            return None
+        return simhash(canonical)
+
+    def _candidates(self, fingerprint: int, buckets: Iterable[List[str]]) -> List[Tuple[int, str]]:
+        best: Dict[str, int] = {}
+        for bucket in buckets:
+            for entry in bucket:
+                candidate, digest = entry.split(":", 1)
+                distance = hamming_distance(fingerprint, int(candidate, 16))
+                if distance <= self.max_distance and distance < best.get(digest, FINGERPRINT_BITS + 1):
+                    best[digest] = distance
+        return sorted((distance, digest) for digest, distance in best.items())
+
+    def _approximate(self, candidates: List[Tuple[int, str]], stored: List[Optional[str]]) -> Optional[Dict]:
+        for (distance, digest), value in zip(candidates, stored):
+            if value:
+                near_duplicate_lookups.labels("hit").inc()
+                near_duplicate_distance.observe(distance)
+                return {**json.loads(value), "approximate": True, "matched_hash": digest, "distance": distance}
+        near_duplicate_lookups.labels("miss").inc()
+        return None
+
+    def lookup(self, text: str) -> Optional[Dict]:
+        """Verdict of the closest already-moderated near duplicate, marked ``approximate``."""
+        fingerprint = self._fingerprint(text)
+        if fingerprint is None:
+            near_duplicate_lookups.labels("skipped").inc()
+            return None
+        pipe = self.redis.pipeline(transaction=False)
+        for band, value in enumerate(bands(fingerprint)):
+            pipe.lrange(self._band_key(band, value), 0, -1)
+        candidates = self._candidates(fingerprint, pipe.execute())
+        if not candidates:
+            near_duplicate_lookups.labels("miss").inc()
+            return None
+        stored = self.redis.mget([cache_key_for_digest(digest, self.model) for _, digest in candidates])
+        return self._approximate(candidates, stored)
+
+    async def alookup(self, text: str) -> Optional[Dict]:
+        fingerprint = self._fingerprint(text)
+        if fingerprint is None:
+            near_duplicate_lookups.labels("skipped").inc()
+            return None
+        pipe = self.async_redis.pipeline(transaction=False)
+        for band, value in enumerate(bands(fingerprint)):
+            pipe.lrange(self._band_key(band, value), 0, -1)
+        candidates = self._candidates(fingerprint, await pipe.execute())
+        if not candidates:
+            near_duplicate_lookups.labels("miss").inc()
+            return None
+        stored = await self.async_redis.mget([cache_key_for_digest(digest, self.model) for _, digest in candidates])
+        return self._approximate(candidates, stored)
+
+    def add_many(self, texts: Iterable[str]):
+        """Index texts whose exact verdicts have just been cached."""
+        pipe = self.redis.pipeline(transaction=False)
+        queued = False
+        for text in texts:
+            fingerprint = self._fingerprint(text)
+            if fingerprint is None:
+                continue
+            entry = f"{fingerprint:016x}:{content_digest(text)}"
+            for band, value in enumerate(bands(fingerprint)):
+                key = self._band_key(band, value)
+                pipe.lpush(key, entry)
+                pipe.ltrim(key, 0, self.bucket_size - 1)
+                pipe.expire(key, self.ttl)
+            queued = True
+        if queued:
+            pipe.execute()
+
+
+near_duplicate_index = NearDuplicateIndex(
+    redis_client,
+    async_redis_client,
+    model=settings.OPENAI_MODERATION_MODEL,
+    max_distance=settings.NEAR_DUPLICATE_MAX_DISTANCE,
+    min_length=settings.NEAR_DUPLICATE_MIN_LENGTH,
+    max_length=settings.NEAR_DUPLICATE_MAX_LENGTH,
+    bucket_size=settings.NEAR_DUPLICATE_BUCKET_SIZE,
+    ttl=settings.CACHE_TTL
+)
+
+
+def find_near_duplicate(text: str) -> Optional[Dict]:
+    if not settings.NEAR_DUPLICATE_ENABLED:
+        return None
+    return near_duplicate_index.lookup(text)
+
+
+async def afind_near_duplicate(text: str) -> Optional[Dict]:
+    if not settings.NEAR_DUPLICATE_ENABLED:
+        return None
+    return await near_duplicate_index.alookup(text)
+
+
+def index_texts(texts: Iterable[str]):
+    if settings.NEAR_DUPLICATE_ENABLED:
+        near_duplicate_index.add_many(texts)
@@ -0,0 +1,113 @@
+import json
+import time
+import uuid
+from typing import Callable, Dict, Optional, Tuple
+
+from redis import Redis
+
+from services.metrics import singleflight_events
+from utils.logging import logger
+
+# Delete the lease only if we still hold it, so a leader whose lease expired
+# never releases the lease of the worker that took over.
+RELEASE_LEASE_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+class SingleFlight:
+    """Cluster-wide single-flight over Redis.
+
+    The first caller for a key takes a short-lived lease and computes the
+    result; concurrent callers subscribe to the key's channel and receive the
+    leader's result instead of computing it again. If the leader dies, its
+    lease expires and one of the waiters takes over.
+    """
+
+    def __init__(self, redis: Redis, lease_ttl: float, wait_timeout: float, poll_interval: float = 0.25):
+        self.redis = redis
+        self.lease_ttl = lease_ttl
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+        self._release = redis.register_script(RELEASE_LEASE_SCRIPT)
+
+    def run(
+        self,
+        key: str,
+        compute: Callable[[], Dict],
+        lookup: Callable[[], Optional[Dict]]
+    ) -> Tuple[Dict, bool]:
+        """Return ``(result, is_leader)``.
+
+        ``compute`` must store its result where ``lookup`` can find it, so
+        waiters that subscribe after the leader published still see it.
+        """
+        lease_key = f"{key}:lease"
+        channel = f"{key}:done"
+        deadline = time.monotonic() + self.wait_timeout
+
+        while True:
+            token = uuid.uuid4().hex
+            if self.redis.set(lease_key, token, nx=True, px=int(self.lease_ttl * 1000)):
+                # A previous leader may have finished just before we took the lease
+                result = lookup()
+                if result is not None:
+                    self._release(keys=[lease_key], args=[token])
+                    return result, False
+                singleflight_events.labels("leader").inc()
+                return self._lead(lease_key, channel, token, compute), True
+
+            singleflight_events.labels("follower").inc()
+            result = self._wait(lease_key, channel, lookup, deadline)
+            if result is not None:
+                return result, False
+
+            if time.monotonic() >= deadline:
+                # Give up on the leader rather than failing the task
+                logger.warning(f"Single-flight wait timed out for {key}")
+                singleflight_events.labels("timeout").inc()
+                return compute(), True
+            singleflight_events.labels("takeover").inc()
+
+    def _lead(self, lease_key: str, channel: str, token: str, compute: Callable[[], Dict]) -> Dict:
+        payload = ""
+        try:
+            result = compute()
+            payload = json.dumps(result)
+            return result
+        finally:
+            try:
+                self._release(keys=[lease_key], args=[token])
+                # An empty payload tells waiters the leader failed and they should retry
+                self.redis.publish(channel, payload)
+            except Exception as e:
+                logger.error(f"Failed to release single-flight lease {lease_key}: {e}")
+
+    def _wait(
+        self,
+        lease_key: str,
+        channel: str,
+        lookup: Callable[[], Optional[Dict]],
+        deadline: float
+    ) -> Optional[Dict]:
+        pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        try:
+            pubsub.subscribe(channel)
+            # Checked after subscribing so a result published in between is not missed
+            result = lookup()
+            if result is not None:
+                return result
+
+            while time.monotonic() < deadline:
+                message = pubsub.get_message(timeout=self.poll_interval)
+                if message is not None and message["type"] == "message":
+                    return json.loads(message["data"]) if message["data"] else None
+                if not self.redis.exists(lease_key):
+                    # Leader finished or died; the result may already be cached
+                    return lookup()
+            return None
+        finally:
+            pubsub.close()
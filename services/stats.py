@@ -0,0 +1,144 @@
+import math
+import time
+from typing import Dict, Iterable, Optional
+
+from db.redis import redis_client, async_redis_client
+
+STATS_KEY = "moderation:stats"
+LATENCY_KEY_PREFIX = "moderation:latency"
+
+# Log-bucketed latency sketch: a sample lands in bucket ceil(log_gamma(ms)),
+# so every reported quantile is within (gamma - 1) / 2 relative error. Bucket
+# counts from different workers and minutes merge by simple addition.
+SKETCH_GAMMA = 1.02
+SKETCH_MIN_MS = 0.01
+# Sketches are kept per time slice: 10s slices for the short windows and
+# whole minutes for the hour, so a window sums the slices covering the last
+# N seconds (including the current, partial one) and overshoots by less than
+# one slice. Window -> (seconds, slice seconds).
+WINDOWS = {"1m": (60, 10), "5m": (300, 10), "60m": (3600, 60)}
+SLICE_SECONDS = sorted({slice_seconds for _, slice_seconds in WINDOWS.values()})
+QUANTILES = {"p50": 0.50, "p95": 0.95, "p99": 0.99}
+
+# One round trip, applied atomically: lifetime aggregates plus the sample's
+# bucket in the current slice's sketch of every slice size.
+RECORD_LATENCY_SCRIPT = """
+redis.call("HINCRBY", KEYS[1], "latency_count", 1)
+redis.call("HINCRBYFLOAT", KEYS[1], "latency_sum", ARGV[1])
+for i = 2, #KEYS do
+    redis.call("HINCRBY", KEYS[i], ARGV[2], 1)
+    redis.call("EXPIRE", KEYS[i], ARGV[i + 1])
+end
+return 1
+"""
+
+_record_latency = redis_client.register_script(RECORD_LATENCY_SCRIPT)
+_arecord_latency = async_redis_client.register_script(RECORD_LATENCY_SCRIPT)
+
+
+def sketch_bucket(seconds: float) -> int:
+    return math.ceil(math.log(max(seconds * 1000.0, SKETCH_MIN_MS)) / math.log(SKETCH_GAMMA))
+
+
+def bucket_value(bucket: int) -> float:
+    """Representative latency in seconds for a bucket (midpoint of its range)."""
+    return 2 * SKETCH_GAMMA ** bucket / (SKETCH_GAMMA + 1) / 1000.0
+
+
+def _slice(timestamp: float, slice_seconds: int) -> int:
+    return int(timestamp // slice_seconds)
+
+
+def _latency_key(slice_seconds: int, index: int) -> str:
+    return f"{LATENCY_KEY_PREFIX}:{slice_seconds}s:{index}"
+
+
+def _retention(slice_seconds: int) -> int:
+    # Long enough for the widest window read at this slice size, plus the partial slice
+    return max(seconds for seconds, size in WINDOWS.values() if size == slice_seconds) + 2 * slice_seconds
+
+
+def _window_keys(now: float, seconds: int, slice_seconds: int):
+    first, last = _slice(now - seconds, slice_seconds), _slice(now, slice_seconds)
+    return [_latency_key(slice_seconds, index) for index in range(last, first - 1, -1)]
+
+
+def _latency_script_params(seconds: float):
+    now = time.time()
+    return {
+        "keys": [STATS_KEY] + [_latency_key(size, _slice(now, size)) for size in SLICE_SECONDS],
+        "args": [seconds, sketch_bucket(seconds)] + [_retention(size) for size in SLICE_SECONDS]
+    }
+
+
+def record_latency(seconds: float):
+    _record_latency(**_latency_script_params(seconds))
+
+
+async def arecord_latency(seconds: float):
+    await _arecord_latency(**_latency_script_params(seconds))
+
+
+def record_cache_hits(count: int = 1):
+    redis_client.hincrby(STATS_KEY, "cached", count)
+
+
+async def arecord_requests(count: int = 1, cached: int = 0):
+    pipe = async_redis_client.pipeline(transaction=False)
+    pipe.hincrby(STATS_KEY, "requests", count)
+    if cached:
+        pipe.hincrby(STATS_KEY, "cached", cached)
+    await pipe.execute()
+
+
+def merge_sketches(sketches: Iterable[Dict[str, str]]) -> Dict[int, int]:
+    merged: Dict[int, int] = {}
+    for sketch in sketches:
+        for bucket, count in sketch.items():
+            merged[int(bucket)] = merged.get(int(bucket), 0) + int(count)
+    return merged
+
+
+def sketch_quantiles(sketch: Dict[int, int]) -> Dict[str, Optional[float]]:
+    total = sum(sketch.values())
+    summary: Dict[str, Optional[float]] = {"count": total}
+    if not total:
+        summary.update({name: None for name in QUANTILES})
+        return summary
+
+    buckets = sorted(sketch.items())
+    for name, q in QUANTILES.items():
+        rank = q * (total - 1)
+        seen = 0
+        for bucket, count in buckets:
+            seen += count
+            if seen > rank:
+                summary[name] = bucket_value(bucket)
+                break
+    return summary
+
+
+async def get_stats() -> Dict:
+    now = time.time()
+    window_keys = {window: _window_keys(now, seconds, size) for window, (seconds, size) in WINDOWS.items()}
+    # The 1m slices are a subset of the 5m ones; fetch each sketch once
+    keys = list(dict.fromkeys(key for window in window_keys.values() for key in window))
+
+    pipe = async_redis_client.pipeline(transaction=False)
+    pipe.hgetall(STATS_KEY)
+    for key in keys:
+        pipe.hgetall(key)
+    totals, *sketches = await pipe.execute()
+    sketch_by_key = dict(zip(keys, sketches))
+
+    latency_count = int(totals.get("latency_count", 0))
+    latency_sum = float(totals.get("latency_sum", 0.0))
+    return {
+        "total_requests": int(totals.get("requests", 0)),
+        "cached_requests": int(totals.get("cached", 0)),
+        "average_response_time": latency_sum / latency_count if latency_count else 0.0,
+        "latency_percentiles": {
+            window: sketch_quantiles(merge_sketches(sketch_by_key[key] for key in window_keys[window]))
+            for window in WINDOWS
+        }
+    }
@@ -1,82 +1,264 @@
 from services.celery import celery
 from services.moderation import ModerationService
-from services.metrics import moderation_latency, cached_requests, redis_client
-from db.session import SessionLocal
+from services.batching import ModerationBatcher
+from services.documents import DocumentModerator
+from services.metrics import moderation_latency, moderation_failures, cached_requests
+from db.redis import redis_client
+from services.cache import get_cached_result, get_cached_results, set_cached_result, set_cached_results, content_digest, cache_key
+from services.singleflight import SingleFlight
+from services.similarity import find_near_duplicate, index_texts
+from services.prefilter import check_text
+from services.image_cache import lookup_image, store_image_result
+from services.jobs import record_job_results
+import services.notifications  # noqa: F401 - publishes finished task results
+import services.webhooks  # noqa: F401 - delivers results to callback_url, registers its task
+from services.persistence import result_writer
+from services.stats import record_latency, record_cache_hits
+from services.tracing import Trace
+from services.ratelimit import RateLimited
+from celery.signals import worker_init, worker_process_shutdown, worker_shutdown
+from db.migrate import check_schema
+from db.session import engine
 from utils.logging import logger
-from db.models import ModerationResult
-import json
+from utils.config import get_settings
 import time
 
+settings = get_settings()
+
 moderation_service = ModerationService()
+moderation_batcher = ModerationBatcher(
+    moderation_service,
+    window=settings.MODERATION_BATCH_WINDOW_MS / 1000.0,
+    max_batch_size=settings.MODERATION_BATCH_MAX_SIZE,
+    max_in_flight=settings.MODERATION_BATCH_MAX_IN_FLIGHT
+)
+document_moderator = DocumentModerator(
+    moderation_batcher,
+    min_chars=settings.DOCUMENT_MIN_CHARS,
+    target_chars=settings.DOCUMENT_CHUNK_CHARS,
+    max_chars=settings.DOCUMENT_CHUNK_MAX_CHARS,
+    overlap_chars=settings.DOCUMENT_CHUNK_OVERLAP_CHARS
+)
+single_flight = SingleFlight(
+    redis_client,
+    lease_ttl=settings.SINGLEFLIGHT_LEASE_SECONDS,
+    wait_timeout=settings.SINGLEFLIGHT_WAIT_SECONDS
+)
+
+@worker_init.connect
+def check_database_schema(**kwargs):
+    # Fail at startup rather than on every result flush; Celery only logs exceptions from signal handlers
+    try:
+        check_schema(engine)
+    except RuntimeError as e:
+        raise SystemExit(str(e))
+
+@worker_process_shutdown.connect
+@worker_shutdown.connect
+def flush_results_on_shutdown(**kwargs):
+    result_writer.close()
 
-@celery.task
-def moderate_text_task(text: str):
-    db = SessionLocal()
+def requeue_throttled(task, error: RateLimited):
+    """Put a throttled task back on the queue until upstream capacity frees up.
+
+    Only returns (with an error result) once the task has been requeued
+    ``OPENAI_THROTTLE_MAX_REQUEUES`` times.
+    """
+    if task.request.retries < settings.OPENAI_THROTTLE_MAX_REQUEUES:
+        logger.info(f"Upstream throttled, requeueing {task.name} in {error.retry_after:.2f}s")
+        raise task.retry(countdown=error.retry_after, max_retries=settings.OPENAI_THROTTLE_MAX_REQUEUES)
+    logger.error(f"Giving up on {task.name} after {task.request.retries} requeues: {error}")
+    moderation_failures.inc()
+    return {"error": str(error)}
+
+def moderate_items(items):
+    """``ModerationService.moderate_items``, with long texts moderated in document mode."""
+    documents = {
+        i: item["text"] for i, item in enumerate(items)
+        if item.get("type") == "text" and document_moderator.applies(item["text"])
+    }
+    if not documents:
+        return moderation_service.moderate_items(items)
+    others = [item for i, item in enumerate(items) if i not in documents]
+    results = iter(moderation_service.moderate_items(others) if others else [])
+    document_results = {i: document_moderator.moderate(text) for i, text in documents.items()}
+    return [document_results[i] if i in documents else next(results) for i in range(len(items))]
+
+@celery.task(bind=True)
+def moderate_text_task(self, text: str, trace=None, callback_url=None):
+    # callback_url is read by services.webhooks once the task has finished
+    trace = Trace(trace)
     start_time = time.time()
     
     try:
+        # Blocklisted and allowlisted texts are decided locally, never cached
+        with trace.span("prefilter"):
+            local_result = check_text(text)
+        if local_result is not None:
+            return trace.attach(local_result)
+
         # Check cache
-        cache_key = f"moderation:{text}"
-        cached_result = redis_client.get(cache_key)
+        with trace.span("cache_lookup"):
+            cached_result = get_cached_result(text) or find_near_duplicate(text)
         
         if cached_result:
-            logger.info(f"Cache hit for text: {text}")
+            logger.info(f"Cache hit for text {content_digest(text)[:12]}")
             cached_requests.inc()
-            return json.loads(cached_result)
+            record_cache_hits()
+            return trace.attach(cached_result)
         
-        # Process moderation
-        result = moderation_service.moderate_content(text)
+        # Process moderation; concurrent texts share one upstream call and
+        # identical texts in flight anywhere in the cluster are moderated once.
+        # Long documents are moderated chunk by chunk and merged.
+        def compute():
+            if document_moderator.applies(text):
+                result = document_moderator.moderate(text)
+            else:
+                result = moderation_batcher.moderate(text)
+            set_cached_result(text, result)
+            index_texts([text])
+            return result
+
+        # A leader stores its result in Redis, and the lookup above already
+        # missed the database, so the single-flight re-checks skip Postgres
+        with trace.span("upstream"):
+            result, is_leader = single_flight.run(
+                cache_key(text), compute, lookup=lambda: get_cached_result(text, use_database=False)
+            )
+        if not is_leader:
+            cached_requests.inc()
+            record_cache_hits()
+            return trace.attach(result)
         
         # Update metrics
         processing_time = time.time() - start_time
         moderation_latency.observe(processing_time)
+        record_latency(processing_time)
         
-        # Update average response time
-        current_avg = float(redis_client.get("average_response_time") or 0.0)
-        total_requests = int(redis_client.get("total_requests") or 0)
-        new_avg = ((current_avg * total_requests) + processing_time) / (total_requests + 1)
-        redis_client.set("average_response_time", new_avg)
-        redis_client.incr("total_requests")
-        
-        # Cache result
-        redis_client.setex(cache_key, 3600, json.dumps(result))
-        
-        # Store in database
-        moderation_entry = ModerationResult(
-            text=text,
-            result=json.dumps(result)
-        )
-        db.add(moderation_entry)
-        db.commit()
+        # Store in database (buffered, flushed in bulk)
+        with trace.span("persist"):
+            result_writer.add(text, result)
         
-        return result
+        return trace.attach(result)
+    except RateLimited as e:
+        return requeue_throttled(self, e)
     except Exception as e:
         logger.error(f"Error moderating text: {str(e)}")
         return {"error": str(e)}
-    finally:
-        db.close()
 
-@celery.task
-def moderate_content_task(content_items):
-    db = SessionLocal()
-    
+def store_text_result(text: str, result):
+    """Cache and persist a text verdict produced outside the worker (sync API mode)."""
+    set_cached_result(text, result)
+    index_texts([text])
+    result_writer.add(text, result)
+
+@celery.task(bind=True)
+def moderate_content_task(self, content_items, trace=None, callback_url=None):
+    trace = Trace(trace)
     try:
-        result = moderation_service.moderate_content(content_items)
+        # A lone image (the /image route) is looked up by URL, bytes and perceptual hash
+        fingerprints = {}
+        if len(content_items) == 1 and content_items[0].get("type") == "image_url":
+            with trace.span("cache_lookup"):
+                cached_result, fingerprints = lookup_image(content_items[0]["image_url"])
+            if cached_result is not None:
+                cached_requests.inc()
+                record_cache_hits()
+                return trace.attach(cached_result)
+
+        with trace.span("upstream"):
+            result = moderation_service.moderate_content(content_items)
+        store_image_result(fingerprints, result)
         
-        # Store in database
-        for item in content_items:
-            content_text = item.get('text') or item.get('image_url')
-            if content_text:
-                moderation_entry = ModerationResult(
-                    text=content_text,
-                    result=json.dumps(result)
-                )
-                db.add(moderation_entry)
+        # Store in database (buffered, flushed in bulk)
+        with trace.span("persist"):
+            for item in content_items:
+                content_text = item.get('text') or item.get('image_url')
+                if content_text:
+                    result_writer.add(content_text, result)
         
-        db.commit()
-        return result
+        return trace.attach(result)
+    except RateLimited as e:
+        return requeue_throttled(self, e)
     except Exception as e:
         logger.error(f"Error moderating content: {str(e)}")
         return {"error": str(e)}
-    finally:
-        db.close()
\ No newline at end of file
+
+@celery.task(bind=True)
+def moderate_batch_task(self, job_id: str, entries, trace=None):
+    """Moderate one chunk of a bulk job; ``entries`` is a list of [slot, item]."""
+    trace = Trace(trace)
+    start_time = time.time()
+
+    local = {}
+    for slot, item in entries:
+        if item.get("type") == "text":
+            local_result = check_text(item["text"])
+            if local_result is not None:
+                local[slot] = local_result
+    if local:
+        record_job_results(job_id, local)
+        entries = [[slot, item] for slot, item in entries if slot not in local]
+        if not entries:
+            return {"job_id": job_id, "count": 0}
+
+    # Texts may have been moderated before and persisted after their Redis entry expired
+    text_entries = [(slot, item) for slot, item in entries if item.get("type") == "text"]
+    with trace.span("cache_lookup"):
+        stored = get_cached_results([item["text"] for _, item in text_entries])
+    hits = {}
+    for (slot, item), result in zip(text_entries, stored):
+        result = result or find_near_duplicate(item["text"])
+        if result is not None:
+            hits[slot] = result
+    image_fingerprints = {}
+    for slot, item in entries:
+        if item.get("type") == "image_url":
+            result, image_fingerprints[slot] = lookup_image(item["image_url"])
+            if result is not None:
+                hits[slot] = result
+    if hits:
+        cached_requests.inc(len(hits))
+        record_cache_hits(len(hits))
+        record_job_results(job_id, hits)
+        entries = [[slot, item] for slot, item in entries if slot not in hits]
+        if not entries:
+            return {"job_id": job_id, "count": 0}
+    items = [item for _, item in entries]
+
+    try:
+        with trace.span("upstream"):
+            results = moderate_items(items)
+    except RateLimited as e:
+        error = requeue_throttled(self, e)
+        record_job_results(job_id, {slot: error for slot, _ in entries})
+        return error
+    except Exception as e:
+        logger.error(f"Error moderating batch for job {job_id}: {str(e)}")
+        moderation_failures.inc()
+        record_job_results(job_id, {slot: {"error": str(e)} for slot, _ in entries})
+        return {"error": str(e)}
+
+    processing_time = time.time() - start_time
+    moderation_latency.observe(processing_time)
+    record_latency(processing_time)
+    record_job_results(job_id, {slot: result for (slot, _), result in zip(entries, results)})
+    moderated_texts = {
+        item["text"]: result
+        for item, result in zip(items, results)
+        if item.get("type") == "text"
+    }
+    set_cached_results(moderated_texts)
+    index_texts(moderated_texts)
+    for (slot, _), result in zip(entries, results):
+        if slot in image_fingerprints:
+            store_image_result(image_fingerprints[slot], result)
+
+    # Store in database (buffered, flushed in bulk)
+    with trace.span("persist"):
+        for item, result in zip(items, results):
+            content_text = item.get('text') or item.get('image_url')
+            if content_text:
+                result_writer.add(content_text, result)
+
+    return trace.attach({"job_id": job_id, "count": len(results)})
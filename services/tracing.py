@@ -0,0 +1,83 @@
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from celery.signals import task_postrun, task_prerun
+
+from db.redis import async_broker_client
+from services.metrics import celery_queue_depth, celery_tasks_in_flight, stage_latency
+from utils.logging import logger
+
+# Requests carrying this header get per-stage timings attached to their result
+TRACE_HEADER = "X-Debug-Trace"
+
+
+def trace_context(debug: bool = False) -> Dict:
+    """Context stamped by the API at enqueue time and carried in the task arguments."""
+    return {"enqueued_at": time.time(), "debug": debug}
+
+
+class Trace:
+    """Per-request span recorder.
+
+    Each stage is observed in the ``moderation_stage_seconds`` histogram and,
+    for debug requests, collected so it can be returned with the result.
+    """
+
+    def __init__(self, context: Optional[Dict] = None):
+        context = context or {}
+        self.debug = bool(context.get("debug"))
+        self.spans: Dict[str, float] = {}
+        enqueued_at = context.get("enqueued_at")
+        if enqueued_at is not None:
+            # Wall clocks of API and worker hosts are assumed to be in sync
+            self.record("queue_wait", max(time.time() - enqueued_at, 0.0))
+
+    def record(self, stage: str, seconds: float):
+        stage_latency.labels(stage).observe(seconds)
+        self.spans[stage] = self.spans.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def span(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def attach(self, result):
+        """Return ``result`` with this trace's spans (in ms) merged into its ``_trace`` field."""
+        if not self.debug or not isinstance(result, dict):
+            return result
+        spans = dict(result.get("_trace") or {})
+        spans.update({stage: round(seconds * 1000, 3) for stage, seconds in self.spans.items()})
+        return {**result, "_trace": spans}
+
+
+def _task_queue(task) -> str:
+    delivery_info = getattr(task.request, "delivery_info", None) or {}
+    return delivery_info.get("routing_key") or "unknown"
+
+
+@task_prerun.connect
+def _task_started(task=None, **kwargs):
+    celery_tasks_in_flight.labels(_task_queue(task)).inc()
+
+
+@task_postrun.connect
+def _task_finished(task=None, **kwargs):
+    celery_tasks_in_flight.labels(_task_queue(task)).dec()
+
+
+async def sample_queue_depths(queues: List[str]):
+    """Read broker queue lengths (Redis lists named after the queue) into gauges."""
+    if async_broker_client is None:
+        return
+    try:
+        pipe = async_broker_client.pipeline(transaction=False)
+        for queue in queues:
+            pipe.llen(queue)
+        for queue, depth in zip(queues, await pipe.execute()):
+            celery_queue_depth.labels(queue).set(depth)
+    except Exception as e:
+        logger.error(f"Failed to sample Celery queue depths: {e}")
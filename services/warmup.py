@@ -0,0 +1,59 @@
+"""Preload recently stored moderation verdicts into Redis.
+
+Run after a Redis flush or failover so the first wave of repeat texts is
+served from cache instead of going upstream again::
+
+    python -m services.warmup --limit 100000 --since-hours 24
+"""
+import argparse
+import datetime
+import time
+
+from sqlalchemy import select
+
+from db.models import ModerationResult
+from db.redis import redis_client
+from db.session import engine
+from services.cache import cache_key_for_digest
+from utils.config import get_settings
+from utils.logging import logger
+
+settings = get_settings()
+
+def warm_cache(limit: int, since_hours: float, chunk_size: int = 1000) -> int:
+    """Copy the most recently updated verdicts for the current model into Redis."""
+    cutoff = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(hours=since_hours)
+    statement = (
+        select(ModerationResult.content_hash, ModerationResult.result)
+        .where(
+            ModerationResult.model == settings.OPENAI_MODERATION_MODEL,
+            ModerationResult.updated_at >= cutoff
+        )
+        .order_by(ModerationResult.updated_at.desc())
+        .limit(limit)
+        .execution_options(yield_per=chunk_size)
+    )
+
+    loaded = 0
+    with engine.connect() as conn:
+        for partition in conn.execute(statement).partitions(chunk_size):
+            pipe = redis_client.pipeline(transaction=False)
+            for digest, result in partition:
+                pipe.setex(cache_key_for_digest(digest), settings.CACHE_TTL, result)
+            pipe.execute()
+            loaded += len(partition)
+            logger.info(f"Warmed {loaded} cache entries")
+    return loaded
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--limit", type=int, default=100000, help="maximum number of verdicts to load")
+    parser.add_argument("--since-hours", type=float, default=24, help="only load verdicts updated this recently")
+    args = parser.parse_args()
+
+    start = time.time()
+    loaded = warm_cache(args.limit, args.since_hours)
+    logger.info(f"Loaded {loaded} verdicts into Redis in {time.time() - start:.1f}s")
+
+if __name__ == "__main__":
+    main()
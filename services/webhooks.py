@@ -0,0 +1,141 @@
+import hashlib
+import json
+import random
+from typing import Dict, List, Optional
+
+import httpx
+from celery.signals import task_postrun
+
+from db.redis import redis_client
+from services.celery import celery
+from services.metrics import webhook_batch_size, webhook_deliveries
+from utils.config import get_settings
+from utils.http import ForkSafeClient, UnsafeURL, check_public_url
+from utils.logging import logger
+
+settings = get_settings()
+
+QUEUE_KEY_PREFIX = "webhook:queue"
+SCHEDULED_KEY_PREFIX = "webhook:scheduled"
+
+# Receivers answering with these are asked again later; any other 4xx is final
+RETRYABLE_STATUS_CODES = {408, 425, 429}
+
+
+def endpoint_key(callback_url: str) -> str:
+    return hashlib.sha256(callback_url.encode("utf-8")).hexdigest()[:32]
+
+
+def _queue_key(callback_url: str) -> str:
+    return f"{QUEUE_KEY_PREFIX}:{endpoint_key(callback_url)}"
+
+
+def _scheduled_key(callback_url: str) -> str:
+    return f"{SCHEDULED_KEY_PREFIX}:{endpoint_key(callback_url)}"
+
+
+def enqueue_webhook(callback_url: str, payload: Dict):
+    """Queue one result for ``callback_url``.
+
+    Results for the same endpoint accumulate in a Redis list; the first one
+    after a flush schedules a delivery ``WEBHOOK_BATCH_WINDOW_MS`` later, which
+    sends everything queued by then as a single POST.
+    """
+    window_ms = int(settings.WEBHOOK_BATCH_WINDOW_MS)
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.rpush(_queue_key(callback_url), json.dumps(payload))
+    pipe.expire(_queue_key(callback_url), settings.MODERATION_JOB_TTL)
+    # Lapses on its own if the scheduled delivery is lost
+    pipe.set(_scheduled_key(callback_url), 1, nx=True, px=window_ms + int(settings.WEBHOOK_TIMEOUT * 1000))
+    _, _, schedule = pipe.execute()
+    if schedule:
+        deliver_webhooks_task.apply_async(args=[callback_url], countdown=window_ms / 1000.0)
+
+
+def _take_batch(callback_url: str) -> List[Dict]:
+    pipe = redis_client.pipeline(transaction=False)
+    # Cleared first so results arriving from now on schedule a follow-up delivery
+    pipe.delete(_scheduled_key(callback_url))
+    pipe.lpop(_queue_key(callback_url), settings.WEBHOOK_BATCH_MAX_SIZE)
+    pipe.llen(_queue_key(callback_url))
+    _, entries, remaining = pipe.execute()
+    if remaining:
+        deliver_webhooks_task.apply_async(args=[callback_url])
+    return [json.loads(entry) for entry in entries or []]
+
+
+# Pooled client shared by every delivery in this process
+http_client = ForkSafeClient(lambda: httpx.Client(
+    timeout=settings.WEBHOOK_TIMEOUT,
+    limits=httpx.Limits(
+        max_connections=settings.WEBHOOK_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.WEBHOOK_MAX_CONNECTIONS
+    )
+))
+
+
+def retry_countdown(retries: int) -> float:
+    """Exponential backoff, jittered over the upper half of each step."""
+    ceiling = min(settings.WEBHOOK_RETRY_BACKOFF * 2 ** retries, settings.WEBHOOK_RETRY_BACKOFF_MAX)
+    return random.uniform(ceiling / 2, ceiling)
+
+
+@celery.task(bind=True, max_retries=None)
+def deliver_webhooks_task(self, callback_url: str, batch: Optional[List[Dict]] = None):
+    """POST queued results for one endpoint as ``{"results": [...]}``.
+
+    A failed batch is retried as-is with backoff, so a slow or down receiver
+    only holds up its own deliveries.
+    """
+    if batch is None:
+        batch = _take_batch(callback_url)
+        if not batch:
+            return {"delivered": 0}
+
+    try:
+        check_public_url(callback_url)
+    except UnsafeURL as e:
+        logger.error(f"Refusing to deliver {len(batch)} results to {callback_url}: {e}")
+        webhook_deliveries.labels("rejected").inc()
+        return {"delivered": 0}
+
+    try:
+        response = http_client().post(callback_url, json={"results": batch})
+        if response.status_code < 400:
+            webhook_deliveries.labels("delivered").inc()
+            webhook_batch_size.observe(len(batch))
+            return {"delivered": len(batch)}
+        if response.status_code < 500 and response.status_code not in RETRYABLE_STATUS_CODES:
+            logger.error(f"Webhook receiver rejected {len(batch)} results with HTTP {response.status_code}, dropping")
+            webhook_deliveries.labels("rejected").inc()
+            return {"delivered": 0}
+        error = f"HTTP {response.status_code}"
+    except httpx.HTTPError as e:
+        error = str(e) or type(e).__name__
+
+    if self.request.retries >= settings.WEBHOOK_MAX_RETRIES:
+        logger.error(f"Giving up on webhook delivery of {len(batch)} results after {self.request.retries} retries: {error}")
+        webhook_deliveries.labels("dropped").inc()
+        return {"delivered": 0}
+
+    webhook_deliveries.labels("retried").inc()
+    countdown = retry_countdown(self.request.retries)
+    logger.info(f"Webhook delivery failed ({error}), retrying in {countdown:.1f}s")
+    raise self.retry(args=[callback_url, batch], countdown=countdown)
+
+
+def result_status(result) -> str:
+    """``failed`` for error results (tasks that gave up still finish as SUCCESS), else ``completed``."""
+    return "failed" if isinstance(result, dict) and "error" in result else "completed"
+
+
+@task_postrun.connect
+def _deliver_on_completion(task_id=None, kwargs=None, retval=None, state=None, **extra):
+    callback_url = (kwargs or {}).get("callback_url")
+    if not callback_url or state not in ("SUCCESS", "FAILURE"):
+        return
+    result = retval if state == "SUCCESS" else {"error": str(retval)}
+    try:
+        enqueue_webhook(callback_url, {"id": task_id, "status": result_status(result), "result": result})
+    except Exception as e:
+        logger.error(f"Failed to queue webhook for task {task_id}: {e}")
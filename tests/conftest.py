@@ -1,8 +1,14 @@
 import pytest
 import asyncio
+import os
+import tempfile
 import aiohttp
 from typing import Generator, AsyncGenerator
 
+# Settings the services package needs at import time, for tests that run without a deployment
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.gettempdir(), 'moderation-tests.db')}")
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
 @pytest.fixture(scope="session")
 def event_loop() -> Generator:
     """Create an instance of the default event loop for each test case."""
@@ -0,0 +1,153 @@
+"""Local stand-in for OpenAI's moderations endpoint, for benchmarks.
+
+Answers ``POST /v1/moderations`` after a configurable delay, and fails a
+configurable share of calls with 500s or 429s (with ``retry-after-ms``), so
+throughput and tail latency can be measured without touching the real API::
+
+    python tests/fake_moderation_server.py --port 8100 --latency 0.05 --rate-limit-rate 0.02
+
+Point the API and workers at it with ``OPENAI_BASE_URL=http://127.0.0.1:8100/v1``.
+Inputs containing ``FLAG_MARKER`` come back flagged.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict
+
+FLAG_MARKER = "[flag]"
+
+
+class FakeModerationHandler(BaseHTTPRequestHandler):
+    server: "FakeModerationServer"
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        outcome = self.server.next_outcome(len(inputs))
+        time.sleep(self.server.delay())
+
+        if outcome == "rate_limited":
+            self._send(429, {"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}},
+                       {"retry-after-ms": str(int(self.server.retry_after * 1000))})
+        elif outcome == "error":
+            self._send(500, {"error": {"message": "The server had an error", "type": "server_error"}})
+        else:
+            self._send(200, {
+                "id": "modr-benchmark",
+                "model": body.get("model", "text-moderation-latest"),
+                "results": [
+                    {"flagged": FLAG_MARKER in str(item), "categories": {}, "category_scores": {}}
+                    for item in inputs
+                ]
+            })
+
+    def _send(self, status: int, payload: Dict, headers: Dict[str, str] = None):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeModerationServer(ThreadingHTTPServer):
+    """Threaded fake of the moderations API; one thread per in-flight call.
+
+    Each call sleeps ``latency`` ± ``jitter`` seconds, then answers 429 with
+    probability ``rate_limit_rate``, 500 with probability ``error_rate`` and
+    200 otherwise. ``stats()`` counts calls by outcome.
+    """
+
+    daemon_threads = True
+    request_queue_size = 256
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.05,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        retry_after: float = 0.1,
+        seed: int = 0
+    ):
+        super().__init__((host, port), FakeModerationHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._counts = {"calls": 0, "inputs": 0, "ok": 0, "error": 0, "rate_limited": 0}
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.server_address[0]}:{self.server_port}/v1"
+
+    def delay(self) -> float:
+        with self._lock:
+            return max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+
+    def next_outcome(self, inputs: int) -> str:
+        with self._lock:
+            roll = self._random.random()
+            if roll < self.rate_limit_rate:
+                outcome = "rate_limited"
+            elif roll < self.rate_limit_rate + self.error_rate:
+                outcome = "error"
+            else:
+                outcome = "ok"
+            self._counts["calls"] += 1
+            self._counts["inputs"] += inputs
+            self._counts[outcome] += 1
+            return outcome
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counts)
+
+    def start(self) -> "FakeModerationServer":
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per call")
+    parser.add_argument("--jitter", type=float, default=0.0, help="uniform +/- seconds added to the latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of calls answered with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="share of calls answered with 429")
+    parser.add_argument("--retry-after", type=float, default=0.1, help="seconds advertised on 429s")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    server = FakeModerationServer(
+        args.host, args.port, args.latency, args.jitter, args.error_rate, args.rate_limit_rate, args.retry_after, args.seed
+    )
+    print(f"Fake moderations API listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
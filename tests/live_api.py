@@ -0,0 +1,55 @@
+"""Start the API (and helpers) as subprocesses for the live-server tests."""
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from typing import Callable, Dict
+
+import pytest
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+START_TIMEOUT = 30
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def get_status(url: str) -> int:
+    with urllib.request.urlopen(url, timeout=1) as response:
+        return response.status
+
+def wait_until_up(process: subprocess.Popen, check: Callable[[], bool], what: str):
+    deadline = time.monotonic() + START_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            break
+        try:
+            if check():
+                return
+        except Exception:
+            pass
+        time.sleep(0.5)
+    pytest.fail(f"{what} did not start")
+
+def start_api(env: Dict[str, str], port: int) -> subprocess.Popen:
+    """Run uvicorn on ``port`` and wait until /health answers."""
+    api = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=PROJECT_ROOT,
+        env=env
+    )
+    try:
+        wait_until_up(api, lambda: get_status(f"http://127.0.0.1:{port}/health") == 200, "API")
+    except BaseException:
+        api.kill()
+        raise
+    return api
+
+def stop_processes(*processes: subprocess.Popen):
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        process.wait(timeout=30)
@@ -0,0 +1,241 @@
+import pytest
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from statistics import mean, quantiles
+from typing import Dict, List, Optional
+
+import aiohttp
+import redis
+from celery import Celery
+
+from fake_moderation_server import FakeModerationServer
+from live_api import PROJECT_ROOT, free_port, start_api, stop_processes, wait_until_up
+
+# Test configurations; the upstream profile can be changed from the environment
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+WORKLOADS = ["text", "image", "cache_hit"]
+CONCURRENCY = [1, 8, 32]  # clients, each waiting for its result before sending the next request
+REQUESTS_PER_LEVEL = int(os.getenv("BENCHMARK_REQUESTS", "200"))
+UPSTREAM_LATENCY = float(os.getenv("BENCHMARK_UPSTREAM_LATENCY", "0.05"))
+UPSTREAM_JITTER = float(os.getenv("BENCHMARK_UPSTREAM_JITTER", "0.01"))
+UPSTREAM_ERROR_RATE = float(os.getenv("BENCHMARK_UPSTREAM_ERROR_RATE", "0"))
+UPSTREAM_RATE_LIMIT_RATE = float(os.getenv("BENCHMARK_UPSTREAM_RATE_LIMIT_RATE", "0.02"))
+WORKER_CONCURRENCY = 32
+# JSON report written after the run, and an optional earlier report to compare against
+OUTPUT_PATH = os.getenv("BENCHMARK_OUTPUT", "benchmark-results.json")
+BASELINE_PATH = os.getenv("BENCHMARK_BASELINE")
+MAX_REGRESSION = float(os.getenv("BENCHMARK_MAX_REGRESSION", "0.2"))  # allowed p95 growth / throughput drop
+MAX_FAILURE_RATE = UPSTREAM_ERROR_RATE + 0.01
+POLL_WAIT = 5  # seconds per long-poll of a queued result
+
+RESULTS: List[Dict] = []
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=PROJECT_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+@pytest.fixture(scope="module")
+def upstream():
+    server = FakeModerationServer(
+        latency=UPSTREAM_LATENCY,
+        jitter=UPSTREAM_JITTER,
+        error_rate=UPSTREAM_ERROR_RATE,
+        rate_limit_rate=UPSTREAM_RATE_LIMIT_RATE
+    ).start()
+    yield server
+    server.stop()
+
+@pytest.fixture(scope="module")
+def api_url(upstream):
+    """API and a threaded worker on private queues, wired to the fake upstream"""
+    try:
+        redis.Redis.from_url(REDIS_URL).ping()
+    except redis.RedisError:
+        pytest.skip(f"Redis is not reachable at {REDIS_URL}")
+
+    run_id = uuid.uuid4().hex[:8]
+    queues = {
+        name: f"benchmark.{run_id}.{name.lower()}"
+        for name in ["QUEUE_INTERACTIVE", "QUEUE_BULK", "QUEUE_IMAGES", "WEBHOOK_QUEUE"]
+    }
+    port = free_port()
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(
+            os.environ,
+            **queues,
+            OPENAI_BASE_URL=upstream.url,
+            OPENAI_API_KEY="benchmark",
+            DATABASE_URL=f"sqlite:///{tmp}/benchmark.db",
+            REDIS_URL=REDIS_URL,
+            CELERY_BROKER_URL=REDIS_URL,
+            CELERY_RESULT_BACKEND=REDIS_URL,
+            OPENAI_RATE_LIMIT_RPM="0",
+            OPENAI_RATE_LIMIT_TPM="0",
+        )
+        env.pop("PROMETHEUS_MULTIPROC_DIR", None)
+        worker = subprocess.Popen(
+            [
+                sys.executable, "-m", "celery", "-A", "services.celery", "worker",
+                "-Q", ",".join(queues.values()), "-n", f"benchmark-{run_id}@localhost",
+                "--pool", "threads", "--concurrency", str(WORKER_CONCURRENCY),
+                "--without-gossip", "--without-mingle", "--loglevel=warning"
+            ],
+            cwd=PROJECT_ROOT,
+            env=env
+        )
+        try:
+            # The schema is created when main is imported, so the API comes up before the worker
+            api = start_api(env, port)
+        except BaseException:
+            stop_processes(worker)
+            raise
+        try:
+            wait_until_up(worker, lambda: _worker_answers(run_id), "Celery worker")
+            yield f"http://127.0.0.1:{port}"
+        finally:
+            stop_processes(api, worker)
+
+def _worker_answers(run_id: str) -> bool:
+    app = Celery("benchmark", broker=REDIS_URL, backend=REDIS_URL)
+    return bool(app.control.ping(destination=[f"benchmark-{run_id}@localhost"], timeout=0.5))
+
+@pytest.fixture(scope="module", autouse=True)
+def report(upstream):
+    """Write every measurement to OUTPUT_PATH once the module has run"""
+    yield
+    if not RESULTS:
+        return
+    output = {
+        "timestamp": time.time(),
+        "git_commit": git_commit(),
+        "config": {
+            "requests_per_level": REQUESTS_PER_LEVEL,
+            "worker_concurrency": WORKER_CONCURRENCY,
+            "upstream_latency": UPSTREAM_LATENCY,
+            "upstream_jitter": UPSTREAM_JITTER,
+            "upstream_error_rate": UPSTREAM_ERROR_RATE,
+            "upstream_rate_limit_rate": UPSTREAM_RATE_LIMIT_RATE
+        },
+        "upstream": upstream.stats(),
+        "results": RESULTS
+    }
+    with open(OUTPUT_PATH, "w") as f:
+        json.dump(output, f, indent=2)
+    print(f"\nBenchmark results written to {OUTPUT_PATH}")
+
+async def submit_and_wait(session: aiohttp.ClientSession, api_url: str, endpoint: str, payload: dict) -> Dict:
+    """Send one request and follow it to its verdict; the latency covers the whole round trip"""
+    start_time = time.monotonic()
+    throttled = 0
+    while True:
+        async with session.post(f"{api_url}/api/v1/moderate/{endpoint}", json=payload) as response:
+            body = await response.json()
+            if response.status == 429:
+                throttled += 1
+                await asyncio.sleep(float(response.headers.get("Retry-After", "1")))
+                continue
+            response.raise_for_status()
+        break
+    while body["status"] == "processing":
+        async with session.get(f"{api_url}/api/v1/moderate/{body['id']}", params={"wait": POLL_WAIT}) as response:
+            response.raise_for_status()
+            polled = await response.json()
+        if polled["status"] != "processing":
+            body = polled
+    return {
+        "latency": time.monotonic() - start_time,
+        "failed": "error" in body["result"],
+        "throttled": throttled
+    }
+
+async def run_clients(api_url: str, endpoint: str, payloads: List[dict], concurrency: int) -> Dict:
+    pending = iter(payloads)
+    outcomes = []
+
+    async def client(session: aiohttp.ClientSession):
+        for payload in pending:
+            try:
+                outcomes.append(await submit_and_wait(session, api_url, endpoint, payload))
+            except Exception as e:
+                print(f"Request failed: {e}")
+                outcomes.append({"latency": None, "failed": True, "throttled": 0})
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        start_time = time.monotonic()
+        await asyncio.gather(*(client(session) for _ in range(concurrency)))
+        elapsed = time.monotonic() - start_time
+    return {"outcomes": outcomes, "elapsed": elapsed}
+
+def calculate_metrics(outcomes: List[Dict], elapsed: float) -> Dict:
+    """Latency percentiles over completed requests; throughput over the wall-clock time of the run"""
+    latencies = sorted(o["latency"] for o in outcomes if not o["failed"])
+    cuts = quantiles(latencies, n=100, method="inclusive") if len(latencies) > 1 else latencies * 99
+    failures = sum(o["failed"] for o in outcomes)
+    return {
+        "requests": len(outcomes),
+        "failures": failures,
+        "failure_rate": failures / len(outcomes) if outcomes else 0.0,
+        "throttled": sum(o["throttled"] for o in outcomes),
+        "elapsed": elapsed,
+        "throughput": len(latencies) / elapsed if elapsed > 0 else 0.0,
+        "mean": mean(latencies) if latencies else None,
+        "p50": cuts[49] if cuts else None,
+        "p95": cuts[94] if cuts else None,
+        "p99": cuts[98] if cuts else None,
+        "max": latencies[-1] if latencies else None
+    }
+
+def make_payloads(workload: str) -> List[dict]:
+    # Random tokens, so no request is a cache hit or near duplicate of another and all reach the upstream
+    if workload == "image":
+        return [{"image_url": f"https://images.example.com/benchmark/{uuid.uuid4().hex}.png"} for _ in range(REQUESTS_PER_LEVEL)]
+    return [{"text": " ".join(uuid.uuid4().hex for _ in range(4))} for _ in range(REQUESTS_PER_LEVEL)]
+
+def baseline_for(workload: str, concurrency: int) -> Optional[Dict]:
+    if not BASELINE_PATH:
+        return None
+    with open(BASELINE_PATH) as f:
+        baseline = json.load(f)
+    for result in baseline.get("results", []):
+        if result["workload"] == workload and result["concurrency"] == concurrency:
+            return result
+    return None
+
+@pytest.mark.parametrize("concurrency", CONCURRENCY)
+@pytest.mark.parametrize("workload", WORKLOADS)
+def test_end_to_end_latency(api_url, workload, concurrency):
+    """Submission-to-verdict throughput and latency percentiles per workload and concurrency"""
+    endpoint = "image" if workload == "image" else "text"
+    payloads = make_payloads(workload)
+    if workload == "cache_hit":
+        # Moderate the texts once, then measure the repeat requests answered from the cache
+        asyncio.run(run_clients(api_url, endpoint, payloads, max(CONCURRENCY)))
+
+    run = asyncio.run(run_clients(api_url, endpoint, payloads, concurrency))
+    metrics = {"workload": workload, "concurrency": concurrency, **calculate_metrics(run["outcomes"], run["elapsed"])}
+    RESULTS.append(metrics)
+
+    print(f"\n{workload} (concurrency={concurrency}, {metrics['requests']} requests):")
+    if metrics["p50"] is not None:
+        print(f"p50/p95/p99: {metrics['p50'] * 1000:.1f}/{metrics['p95'] * 1000:.1f}/{metrics['p99'] * 1000:.1f}ms")
+    print(f"Throughput: {metrics['throughput']:.1f} requests/s")
+    print(f"Failures: {metrics['failures']}, client retries after 429: {metrics['throttled']}")
+
+    assert metrics["failure_rate"] <= MAX_FAILURE_RATE, f"{metrics['failures']} of {metrics['requests']} requests failed"
+    baseline = baseline_for(workload, concurrency)
+    if baseline is not None:
+        assert metrics["p95"] <= baseline["p95"] * (1 + MAX_REGRESSION), \
+            f"p95 regressed from {baseline['p95'] * 1000:.1f}ms to {metrics['p95'] * 1000:.1f}ms"
+        assert metrics["throughput"] >= baseline["throughput"] * (1 - MAX_REGRESSION), \
+            f"Throughput regressed from {baseline['throughput']:.1f} to {metrics['throughput']:.1f} requests/s"
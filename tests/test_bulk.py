@@ -0,0 +1,119 @@
+import pytest
+import csv
+import json
+import sys
+import threading
+from typing import Dict, List
+
+from services import bulk
+from services.bulk import Checkpoint, read_records
+
+# Test configurations
+RECORDS = 103
+BATCH_SIZE = 4
+CRASH_AFTER_CALLS = 9
+
+class Crash(BaseException):
+    """Stands in for the process dying mid-run (not an error the job would retry)"""
+
+class StubUpstream:
+    """``moderate_items`` replacement that flags texts containing "bad" and can crash after some calls"""
+
+    def __init__(self, crash_after: int = None):
+        self.crash_after = crash_after
+        self.calls = 0
+        self.texts: List[str] = []
+        self.lock = threading.Lock()
+
+    def __call__(self, items: List[Dict]) -> List[Dict]:
+        with self.lock:
+            self.calls += 1
+            if self.crash_after is not None and self.calls > self.crash_after:
+                raise Crash()
+            self.texts.extend(item["text"] for item in items)
+        return [{"id": "modr-test", "model": "test", "results": [{"flagged": "bad" in item["text"]}]} for item in items]
+
+def write_jsonl(path, count: int):
+    with open(path, "w", encoding="utf-8") as f:
+        for index in range(count):
+            f.write(json.dumps({"id": f"r{index}", "text": f"record {index} é" + (" bad" if index % 5 == 0 else "")}) + "\n")
+            if index % 17 == 0:
+                f.write("\n")
+
+def run_bulk(monkeypatch, upstream: StubUpstream, *args: str):
+    monkeypatch.setattr(bulk, "moderate_items", upstream)
+    monkeypatch.setattr(sys, "argv", [
+        "bulk", *args, "--id-field", "id", "--batch-size", str(BATCH_SIZE), "--concurrency", "2",
+        "--no-cache", "--max-retries", "0", "--checkpoint-interval", "0"
+    ])
+    bulk.main()
+
+def read_output(path) -> List[Dict]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+def test_resume_after_crash_writes_every_record_once(tmp_path, monkeypatch):
+    """A run killed mid-way, with a torn line after its checkpoint, resumes without duplicates or gaps"""
+    input_path, output_path = tmp_path / "records.jsonl", tmp_path / "verdicts.jsonl"
+    write_jsonl(input_path, RECORDS)
+
+    with pytest.raises(Crash):
+        run_bulk(monkeypatch, StubUpstream(crash_after=CRASH_AFTER_CALLS), str(input_path), "--output", str(output_path))
+    state = json.loads((tmp_path / "verdicts.jsonl.checkpoint").read_text())
+    assert 0 < state["records"] < RECORDS
+    with open(output_path, "ab") as f:
+        f.write(b'{"id": "torn')  # a write the crash interrupted
+
+    resumed = StubUpstream()
+    run_bulk(monkeypatch, resumed, str(input_path), "--output", str(output_path))
+
+    lines = read_output(output_path)
+    assert [line["index"] for line in lines] == list(range(RECORDS))
+    assert [line["id"] for line in lines] == [f"r{index}" for index in range(RECORDS)]
+    assert all(line["result"]["results"][0]["flagged"] == (line["index"] % 5 == 0) for line in lines)
+    # Only records after the checkpoint were moderated again
+    assert len(resumed.texts) == RECORDS - state["records"]
+    assert resumed.texts[0] == f"record {state['records']} é" + (" bad" if state["records"] % 5 == 0 else "")
+
+def test_finished_run_is_not_repeated(tmp_path, monkeypatch):
+    """Rerunning a completed job finds its checkpoint at the end of the input and does nothing"""
+    input_path, output_path = tmp_path / "records.jsonl", tmp_path / "verdicts.jsonl"
+    write_jsonl(input_path, 10)
+    run_bulk(monkeypatch, StubUpstream(), str(input_path), "--output", str(output_path))
+
+    again = StubUpstream()
+    run_bulk(monkeypatch, again, str(input_path), "--output", str(output_path))
+
+    assert again.calls == 0
+    assert len(read_output(output_path)) == 10
+
+def test_seek_matches_a_full_read(tmp_path):
+    """Starting at any record's offset yields exactly the records a full read yields after it"""
+    jsonl_path = tmp_path / "records.jsonl"
+    write_jsonl(jsonl_path, 40)
+    csv_path = tmp_path / "records.csv"
+    with open(csv_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "body"])
+        for index in range(40):
+            writer.writerow([index, f"line one of {index}\nline two, quoted é" if index % 3 == 0 else f"plain {index}"])
+
+    for path, input_format, text_field in [(jsonl_path, "jsonl", "text"), (csv_path, "csv", "body")]:
+        full = [(r.index, r.record_id, r.item, r.offset) for r in read_records(str(path), input_format, text_field, "id", None)]
+        assert len(full) == 40
+        for position, (index, _, _, offset) in enumerate(full):
+            rest = read_records(str(path), input_format, text_field, "id", None, start_index=index + 1, start_offset=offset)
+            assert [(r.index, r.record_id, r.item, r.offset) for r in rest] == full[position + 1:]
+
+def test_checkpoint_belongs_to_its_input(tmp_path):
+    checkpoint = Checkpoint(str(tmp_path / "run.checkpoint"), str(tmp_path / "a.jsonl"))
+    checkpoint.save(records=5, input_bytes=120, output_bytes=300)
+    assert checkpoint.load()["input_bytes"] == 120
+
+    with pytest.raises(SystemExit, match="belongs to"):
+        Checkpoint(str(tmp_path / "run.checkpoint"), str(tmp_path / "b.jsonl")).load()
+
+    state = json.loads((tmp_path / "run.checkpoint").read_text())
+    (tmp_path / "run.checkpoint").write_text(json.dumps({**state, "version": 1}))
+    with pytest.raises(SystemExit, match="--restart"):
+        checkpoint.load()
@@ -0,0 +1,122 @@
+import pytest
+import random
+from concurrent.futures import Future
+from typing import Dict, List
+
+from services import documents
+from services.documents import DocumentModerator, chunk_document, merge_chunk_results
+
+# Test configurations, matching the default document settings
+SEED = 23
+MIN_CHARS = 8000
+TARGET_CHARS = 2000
+MAX_CHARS = 4000
+OVERLAP_CHARS = 200
+
+class StubBatcher:
+    """Answers every submitted text with a clean verdict and records what was sent"""
+
+    def __init__(self):
+        self.submitted: List[str] = []
+
+    def submit(self, text: str) -> Future:
+        self.submitted.append(text)
+        future = Future()
+        future.set_result(verdict())
+        return future
+
+    def moderate(self, text: str, timeout=None) -> Dict:
+        return self.submit(text).result(timeout=timeout)
+
+def verdict(flagged: bool = False) -> Dict:
+    return {"id": "modr-test", "model": "text-moderation-test", "results": [{"flagged": flagged, "categories": {}, "category_scores": {}}]}
+
+def test_blank_document_is_moderated_as_one_input():
+    """A long text with no sentences yields no chunks and falls back to a single upstream input"""
+    text = "\n" * (MIN_CHARS + 1)
+    assert chunk_document(text, TARGET_CHARS, MAX_CHARS, OVERLAP_CHARS) == []
+
+    batcher = StubBatcher()
+    moderator = DocumentModerator(batcher, MIN_CHARS, TARGET_CHARS, MAX_CHARS, OVERLAP_CHARS)
+    assert moderator.applies(text)
+    result = moderator.moderate(text)
+
+    assert batcher.submitted == [text]
+    assert result["results"][0]["flagged"] is False
+
+def random_document(rng: random.Random, sentences: int) -> List[str]:
+    words = ["alpha", "bravo", "charlie", "delta", "echo", "foxtrot", "golf", "hotel", "india", "juliet"]
+    return [" ".join(rng.choice(words) for _ in range(rng.randint(5, 30))).capitalize() + "." for _ in range(sentences)]
+
+def chunks_of(text: str) -> List[str]:
+    return [text[start:end] for start, end in chunk_document(text, TARGET_CHARS, MAX_CHARS, OVERLAP_CHARS)]
+
+def test_chunks_cover_the_text_within_limits():
+    """Every non-blank character lands in a chunk, chunks are sentence-aligned and none exceeds max_chars"""
+    text = " ".join(random_document(random.Random(SEED), 600))
+    spans = chunk_document(text, TARGET_CHARS, MAX_CHARS, OVERLAP_CHARS)
+
+    assert spans[0][0] == 0 and spans[-1][1] == len(text)
+    for (_, previous_end), (start, _) in zip(spans, spans[1:]):
+        assert not text[previous_end:start].strip()  # overlapping, or separated by whitespace only
+    for start, end in spans:
+        assert end - start <= MAX_CHARS
+        assert text[end - 1] == "."
+        assert start == 0 or text[start - 1] == " "
+
+def test_local_edit_only_changes_nearby_chunks():
+    """Cut points are content-defined, so an edit in the middle keeps the other chunks byte-identical"""
+    sentences = random_document(random.Random(SEED), 600)
+    original = chunks_of(" ".join(sentences))
+    edited_sentences = list(sentences)
+    edited_sentences[len(sentences) // 2] = "A freshly inserted sentence that was not there before, with several extra words."
+    edited = chunks_of(" ".join(edited_sentences))
+
+    changed = set(edited) - set(original)
+    assert len(original) >= 10
+    assert 1 <= len(changed) <= 2
+    assert len(set(original) & set(edited)) >= len(original) - 2
+
+def test_prepended_text_keeps_later_chunks():
+    """Unlike fixed-size chunking, inserting at the start does not shift every later boundary"""
+    sentences = random_document(random.Random(SEED + 1), 600)
+    original = chunks_of(" ".join(sentences))
+    edited = chunks_of(" ".join(["An unexpected preface."] + sentences))
+
+    assert len(set(original) & set(edited)) >= len(original) - 2
+
+def test_merge_takes_the_worst_chunk():
+    """Scores are the per-category maximum and the trigger names the chunk with the highest score"""
+    chunk_results = [
+        {"id": "a", "model": "m", "results": [{"flagged": False, "categories": {"violence": False}, "category_scores": {"violence": 0.1}}]},
+        {"id": "b", "model": "m", "results": [{"flagged": True, "categories": {"violence": True}, "category_scores": {"violence": 0.7}}]},
+        {"id": "c", "model": "m", "results": [{"flagged": True, "categories": {"violence": True}, "category_scores": {"violence": 0.9}}]}
+    ]
+    spans = [(0, 10), (8, 20), (18, 30)]
+
+    merged = merge_chunk_results(chunk_results, spans, cached_chunks=1)
+
+    verdict = merged["results"][0]
+    assert verdict["flagged"] is True
+    assert verdict["category_scores"] == {"violence": 0.9}
+    assert merged["document"]["flagged_chunks"] == [1, 2]
+    assert merged["document"]["triggers"]["violence"] == {"chunk": 2, "start": 18, "end": 30, "score": 0.9}
+    assert merged["document"]["chunks"] == 3 and merged["document"]["cached_chunks"] == 1
+
+def test_edited_document_only_sends_changed_chunks(monkeypatch):
+    """Unchanged chunks are answered from the cache when a document is moderated again after an edit"""
+    cache: Dict[str, Dict] = {}
+    monkeypatch.setattr(documents, "get_cached_results", lambda texts: [cache.get(text) for text in texts])
+    monkeypatch.setattr(documents, "set_cached_results", cache.update)
+    batcher = StubBatcher()
+    moderator = DocumentModerator(batcher, MIN_CHARS, TARGET_CHARS, MAX_CHARS, OVERLAP_CHARS)
+
+    sentences = random_document(random.Random(SEED), 600)
+    first = moderator.moderate(" ".join(sentences))
+    sent_first = len(batcher.submitted)
+    sentences[len(sentences) // 2] = "A freshly inserted sentence that was not there before, with several extra words."
+    second = moderator.moderate(" ".join(sentences))
+
+    assert sent_first == first["document"]["chunks"]
+    assert 1 <= len(batcher.submitted) - sent_first <= 2
+    assert second["document"]["cached_chunks"] >= second["document"]["chunks"] - 2
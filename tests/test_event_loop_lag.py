@@ -0,0 +1,114 @@
+import pytest
+import asyncio
+import aiohttp
+import os
+import tempfile
+import time
+from typing import List
+from statistics import median, quantiles
+
+import redis
+
+from live_api import free_port, start_api, stop_processes
+
+# Test configurations
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+HAMMER_ENDPOINTS = ["/api/v1/stats", "/health/ready"]
+HAMMER_CONCURRENCY = [10, 50]
+PROBE_INTERVAL = 0.05  # seconds between /health probes
+PROBE_DURATION = 10  # seconds per measurement
+MAX_LAG_INCREASE = 0.05  # allowed p95 growth of /health latency under load
+
+@pytest.fixture(scope="module")
+def base_url():
+    """The API in a subprocess of its own, so /health latency reflects only this test's load"""
+    try:
+        redis.Redis.from_url(REDIS_URL).ping()
+    except redis.RedisError:
+        pytest.skip(f"Redis is not reachable at {REDIS_URL}")
+
+    port = free_port()
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(
+            os.environ,
+            OPENAI_API_KEY=os.getenv("OPENAI_API_KEY", "event-loop-lag"),
+            DATABASE_URL=f"sqlite:///{tmp}/event_loop_lag.db",
+            REDIS_URL=REDIS_URL,
+            CELERY_BROKER_URL=REDIS_URL,
+            CELERY_RESULT_BACKEND=REDIS_URL,
+        )
+        env.pop("PROMETHEUS_MULTIPROC_DIR", None)
+        api = start_api(env, port)
+        try:
+            yield f"http://127.0.0.1:{port}"
+        finally:
+            stop_processes(api)
+
+async def probe_latency(session: aiohttp.ClientSession, base_url: str, duration: float) -> List[float]:
+    """Time a trivial endpoint at a fixed rate; it only slows down when the event loop is blocked"""
+    latencies = []
+    end = time.monotonic() + duration
+    while time.monotonic() < end:
+        start = time.monotonic()
+        async with session.get(f"{base_url}/health") as response:
+            await response.text()
+        latencies.append(time.monotonic() - start)
+        await asyncio.sleep(PROBE_INTERVAL)
+    return latencies
+
+async def hammer(session: aiohttp.ClientSession, base_url: str, endpoint: str, stop: asyncio.Event) -> int:
+    count = 0
+    while not stop.is_set():
+        try:
+            async with session.get(f"{base_url}{endpoint}") as response:
+                await response.read()
+            count += 1
+        except Exception as e:
+            print(f"Request failed: {e}")
+    return count
+
+async def fetch_loop_lag(session: aiohttp.ClientSession, base_url: str) -> float:
+    async with session.get(f"{base_url}/api/v1/metrics") as response:
+        body = await response.text()
+    for line in body.splitlines():
+        if line.startswith("event_loop_lag_seconds "):
+            return float(line.split()[1])
+    return 0.0
+
+async def measure(base_url: str, concurrency: int) -> dict:
+    async with aiohttp.ClientSession() as session:
+        baseline = await probe_latency(session, base_url, PROBE_DURATION)
+
+        stop = asyncio.Event()
+        workers = [
+            asyncio.create_task(hammer(session, base_url, HAMMER_ENDPOINTS[i % len(HAMMER_ENDPOINTS)], stop))
+            for i in range(concurrency)
+        ]
+        loaded = await probe_latency(session, base_url, PROBE_DURATION)
+        loop_lag = await fetch_loop_lag(session, base_url)
+        stop.set()
+        hammered = sum(await asyncio.gather(*workers))
+
+    return {
+        "baseline_p50": median(baseline),
+        "baseline_p95": quantiles(baseline, n=20)[-1],
+        "loaded_p50": median(loaded),
+        "loaded_p95": quantiles(loaded, n=20)[-1],
+        "loop_lag": loop_lag,
+        "hammered_requests": hammered
+    }
+
+@pytest.mark.parametrize("concurrency", HAMMER_CONCURRENCY)
+def test_event_loop_lag_under_stats_and_readiness_load(base_url, concurrency):
+    """/health latency must stay flat while /stats and /health/ready are hammered"""
+    metrics = asyncio.run(measure(base_url, concurrency))
+
+    print(f"\nEvent loop lag (hammer concurrency={concurrency}):")
+    print(f"Baseline /health p50/p95: {metrics['baseline_p50']:.4f}s / {metrics['baseline_p95']:.4f}s")
+    print(f"Loaded /health p50/p95: {metrics['loaded_p50']:.4f}s / {metrics['loaded_p95']:.4f}s")
+    print(f"event_loop_lag_seconds: {metrics['loop_lag']:.4f}s")
+    print(f"Hammered requests: {metrics['hammered_requests']}")
+
+    assert metrics["hammered_requests"] > 0, "No /stats or /health/ready requests succeeded"
+    assert metrics["loaded_p95"] - metrics["baseline_p95"] < MAX_LAG_INCREASE, \
+        f"/health p95 grew from {metrics['baseline_p95']:.4f}s to {metrics['loaded_p95']:.4f}s under load"
@@ -0,0 +1,108 @@
+import pytest
+import os
+import random
+import string
+import time
+
+from services import prefilter as prefilter_module
+from services.prefilter import Prefilter
+
+# Test configurations
+PATTERNS = 50000
+TEXTS = 2000
+SEED = 20
+# Mean cost of one check (folding + matching) of a chat-sized message
+MAX_MICROSECONDS_PER_TEXT = {"pyahocorasick": 100, "pure Python": 500}
+MAX_LOAD_SECONDS = 10
+
+def random_word(rng: random.Random) -> str:
+    return "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(5, 10)))
+
+def random_message(rng: random.Random, vocabulary) -> str:
+    return " ".join(rng.choice(vocabulary) for _ in range(rng.randint(8, 40)))
+
+@pytest.fixture(params=["pyahocorasick", "pure Python"])
+def implementation(request, monkeypatch):
+    if request.param == "pyahocorasick" and prefilter_module.ahocorasick is None:
+        pytest.skip("pyahocorasick is not installed")
+    if request.param == "pure Python":
+        monkeypatch.setattr(prefilter_module, "ahocorasick", None)
+    return request.param
+
+def write_lines(path: str, lines):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+
+def test_prefilter_throughput(implementation, tmp_path):
+    """Check chat messages against tens of thousands of blocklist terms"""
+    rng = random.Random(SEED)
+    terms = sorted({random_word(rng) + (f" {random_word(rng)}" if i % 4 == 0 else "") for i in range(PATTERNS)})
+    blocklist_path = str(tmp_path / "blocklist.txt")
+    write_lines(blocklist_path, [f"{term}\tharassment" for term in terms])
+    allowlist_path = str(tmp_path / "allowlist.txt")
+    write_lines(allowlist_path, ["User joined the channel", "User left the channel"])
+
+    # Everyday words that are not blocklist terms themselves
+    blocked = set(terms)
+    vocabulary = [word for word in (random_word(rng) for _ in range(5000)) if word not in blocked]
+    texts = [random_message(rng, vocabulary) for _ in range(TEXTS)]
+    planted = {}
+    for i in range(0, TEXTS, 10):
+        term = rng.choice(terms)
+        texts[i] = f"{texts[i]} {term.upper()}, {random_message(rng, vocabulary)}"
+        planted[i] = term
+
+    start_time = time.perf_counter()
+    prefilter = Prefilter(blocklist_path, allowlist_path, reload_interval=60, default_category="harassment")
+    prefilter.reload_if_changed()
+    load_seconds = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    results = [prefilter.check(text) for text in texts]
+    per_text = (time.perf_counter() - start_time) / TEXTS * 1e6
+    average_length = sum(map(len, texts)) / TEXTS
+
+    print(f"\nPre-filter ({implementation}, {len(terms)} terms):")
+    print(f"Load time: {load_seconds:.2f}s")
+    print(f"Average check: {per_text:.1f}µs per text ({average_length:.0f} characters)")
+
+    for i, result in enumerate(results):
+        if i in planted:
+            assert result is not None and result["local_decision"] == "block", f"Missed term {planted[i]!r}"
+            assert planted[i] in result["matched_terms"]
+            assert result["results"][0]["categories"]["harassment"] is True
+        else:
+            assert result is None, f"False positive {result['matched_terms']} in {texts[i]!r}"
+    assert prefilter.check("user joined  the CHANNEL")["local_decision"] == "allow"
+    assert load_seconds < MAX_LOAD_SECONDS, f"Loading {len(terms)} terms took {load_seconds:.1f}s"
+    assert per_text < MAX_MICROSECONDS_PER_TEXT[implementation], f"Average check took {per_text:.0f}µs"
+
+def wait_for(condition, timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+def test_prefilter_hot_reload(tmp_path):
+    """Edited lists take effect without restarting the process"""
+    blocklist_path = str(tmp_path / "blocklist.txt")
+    write_lines(blocklist_path, ["badword\tharassment"])
+    prefilter = Prefilter(blocklist_path, None, reload_interval=0, default_category="harassment")
+
+    # Lists load in the background; until then every text goes upstream
+    assert wait_for(lambda: prefilter.check("a BadWord here") is not None), "Lists were never loaded"
+
+    assert prefilter.check("a BadWord here")["local_decision"] == "block"
+    assert prefilter.check("class act") is None
+    assert prefilter.check("a newterm here") is None
+
+    write_lines(blocklist_path, ["newterm\tviolence"])
+    stat = os.stat(blocklist_path)
+    os.utime(blocklist_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    assert wait_for(lambda: prefilter.check("a newterm here") is not None), "Edited list was never reloaded"
+    result = prefilter.check("a newterm here")
+    assert result["results"][0]["categories"]["violence"] is True
+    assert prefilter.check("a BadWord here") is None
@@ -0,0 +1,169 @@
+import pytest
+import asyncio
+import email.utils
+import time
+
+import fakeredis
+
+from services.ratelimit import (
+    BUCKET_KEY,
+    AdaptiveConcurrency,
+    RateLimited,
+    TokenBucket,
+    UpstreamLimiter,
+    estimate_tokens,
+    parse_retry_after
+)
+
+# Test configurations: one request per second, a burst of two
+REQUESTS_PER_MINUTE = 60
+TOKENS_PER_MINUTE = 6000
+BURST_SECONDS = 2
+LATENCY_TARGET = 1.0
+
+@pytest.fixture
+def server():
+    return fakeredis.FakeServer()
+
+@pytest.fixture
+def bucket(server):
+    return TokenBucket(
+        fakeredis.FakeRedis(server=server),
+        fakeredis.FakeAsyncRedis(server=server),
+        requests_per_minute=REQUESTS_PER_MINUTE,
+        tokens_per_minute=TOKENS_PER_MINUTE,
+        burst_seconds=BURST_SECONDS
+    )
+
+def bucket_state(server: fakeredis.FakeServer):
+    state = fakeredis.FakeRedis(server=server).hgetall(BUCKET_KEY)
+    return float(state[b"requests"]), float(state[b"tokens"])
+
+def test_request_bucket_allows_burst_then_asks_to_wait(bucket):
+    """Up to the burst is granted at once; the next request is told how long until a refill"""
+    assert bucket.try_acquire(1) == 0
+    assert bucket.try_acquire(1) == 0
+    wait = bucket.try_acquire(1)
+    assert 0.5 < wait <= 1.0
+
+def test_token_bucket_takes_from_both_or_neither(bucket, server):
+    """A request denied for lack of input tokens does not spend a request either"""
+    token_burst = TOKENS_PER_MINUTE / 60 * BURST_SECONDS
+    assert bucket.try_acquire(int(token_burst) - 10) == 0
+    requests_before, _ = bucket_state(server)
+
+    wait = bucket.try_acquire(50)
+
+    assert wait > 0
+    requests_after, tokens_after = bucket_state(server)
+    assert requests_after == pytest.approx(requests_before, abs=0.1)
+    assert tokens_after < 50
+
+def test_pause_blocks_every_caller(bucket):
+    """An upstream 429 pauses the bucket for its Retry-After, whatever tokens are left"""
+    bucket.pause(0.5)
+    wait = bucket.try_acquire(1)
+    assert 0.3 < wait <= 0.5
+
+    asyncio.run(bucket.apause(0.1))  # never shortens the pause
+    assert bucket.try_acquire(1) > 0.3
+
+def test_async_acquire_shares_the_bucket(bucket):
+    assert asyncio.run(bucket.atry_acquire(1)) == 0
+    assert bucket.try_acquire(1) == 0
+    assert asyncio.run(bucket.atry_acquire(1)) > 0
+
+def test_concurrency_limit_aimd():
+    """Fast calls raise the limit additively; 429s halve it and slow calls trim it"""
+    limit = AdaptiveConcurrency(max_limit=8, latency_target=LATENCY_TARGET)
+    limit.limit = 4.0
+
+    assert limit.acquire(0)
+    limit.release(latency=0.1)
+    assert limit.limit == pytest.approx(4.25)
+
+    assert limit.acquire(0)
+    limit.release(latency=None, throttled=True)
+    assert limit.limit == pytest.approx(2.125)
+
+    assert limit.acquire(0)
+    limit.release(latency=LATENCY_TARGET * 2)
+    assert limit.limit == pytest.approx(2.125 * 0.9)
+
+    for _ in range(100):
+        limit.acquire(0)
+        limit.release(latency=0.1)
+    assert limit.limit == 8.0
+    assert limit.in_flight == 0
+
+def test_concurrency_limit_blocks_when_full():
+    limit = AdaptiveConcurrency(max_limit=2, latency_target=LATENCY_TARGET)
+    assert limit.acquire(0) and limit.acquire(0)
+    started = time.monotonic()
+    assert not limit.acquire(0.1)
+    assert time.monotonic() - started >= 0.1
+
+def test_full_concurrency_limit_spends_no_tokens(bucket, server):
+    """A call that cannot get a slot never reaches the bucket"""
+    limiter = UpstreamLimiter(bucket, AdaptiveConcurrency(1, LATENCY_TARGET), max_wait=0.05, default_retry_after=1)
+    with limiter.limit("first call"):
+        before = bucket_state(server)
+        with pytest.raises(RateLimited, match="concurrency"):
+            with limiter.limit("second call"):
+                pass
+        assert bucket_state(server) == pytest.approx(before, abs=0.1)
+    assert limiter.concurrency.in_flight == 0
+
+def test_exhausted_bucket_returns_the_slot(bucket):
+    limiter = UpstreamLimiter(bucket, AdaptiveConcurrency(4, LATENCY_TARGET), max_wait=0.05, default_retry_after=1)
+    bucket.pause(5)
+    with pytest.raises(RateLimited, match="token bucket"):
+        with limiter.limit("text"):
+            pass
+    assert limiter.concurrency.in_flight == 0
+    assert limiter.concurrency.limit == 4.0
+
+def test_upstream_429_halves_the_limit(bucket):
+    limiter = UpstreamLimiter(bucket, AdaptiveConcurrency(4, LATENCY_TARGET), max_wait=0.05, default_retry_after=1)
+    with pytest.raises(RateLimited):
+        with limiter.limit("text"):
+            raise limiter.throttled({"retry-after-ms": "200"})
+    assert limiter.concurrency.limit == 2.0
+    assert bucket.try_acquire(1) > 0
+
+def test_async_limit_counts_against_concurrency(bucket):
+    """The API's inline path takes a slot, never waits for one, and feeds latency back"""
+    limiter = UpstreamLimiter(bucket, AdaptiveConcurrency(1, LATENCY_TARGET), max_wait=0.05, default_retry_after=1)
+
+    async def call():
+        async with limiter.alimit("text"):
+            assert limiter.concurrency.in_flight == 1
+            with pytest.raises(RateLimited, match="concurrency"):
+                async with limiter.alimit("text"):
+                    pass
+
+    asyncio.run(call())
+    assert limiter.concurrency.in_flight == 0
+
+    async def throttled():
+        async with limiter.alimit("text"):
+            raise await limiter.athrottled(None)
+
+    limiter.concurrency.limit = 4.0
+    limiter.concurrency.max_limit = 4
+    with pytest.raises(RateLimited, match="upstream 429"):
+        asyncio.run(throttled())
+    assert limiter.concurrency.limit == 2.0
+    assert limiter.concurrency.in_flight == 0
+
+def test_estimate_tokens():
+    assert estimate_tokens("x" * 400) == 101
+    assert estimate_tokens([{"type": "text", "text": "x" * 40}, {"type": "image_url", "image_url": "https://a/b.png"}]) == 11 + 85
+
+def test_parse_retry_after():
+    assert parse_retry_after({"retry-after-ms": "1500"}, 9) == 1.5
+    assert parse_retry_after({"retry-after": "3"}, 9) == 3
+    date = email.utils.formatdate(time.time() + 30, usegmt=True)
+    assert 25 < parse_retry_after({"retry-after": date}, 9) <= 30
+    assert parse_retry_after({"retry-after": "soon"}, 9) == 9
+    assert parse_retry_after(None, 9) == 9
@@ -0,0 +1,118 @@
+import pytest
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+import fakeredis
+
+from services.singleflight import SingleFlight
+
+# Test configurations
+KEY = "moderation:singleflight:test"
+LEASE_TTL = 0.5
+WAIT_TIMEOUT = 3
+POLL_INTERVAL = 0.02
+CALLERS = 8
+
+class Store:
+    """Where ``compute`` leaves its result for ``lookup``, counting upstream calls"""
+
+    def __init__(self, delay: float = 0.1):
+        self.delay = delay
+        self.results: Dict[str, Dict] = {}
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def compute(self) -> Dict:
+        with self.lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        result = {"flagged": False}
+        self.results[KEY] = result
+        return result
+
+    def lookup(self):
+        return self.results.get(KEY)
+
+@pytest.fixture
+def redis():
+    return fakeredis.FakeRedis()
+
+def single_flight(redis, wait_timeout: float = WAIT_TIMEOUT) -> SingleFlight:
+    return SingleFlight(redis, lease_ttl=LEASE_TTL, wait_timeout=wait_timeout, poll_interval=POLL_INTERVAL)
+
+def run_callers(flight: SingleFlight, compute, lookup, callers: int = CALLERS) -> List:
+    with ThreadPoolExecutor(callers) as executor:
+        return list(executor.map(lambda _: flight.run(KEY, compute, lookup), range(callers)))
+
+def test_concurrent_callers_share_one_computation(redis):
+    """Only the lease holder computes; everyone else receives its result"""
+    store = Store()
+    outcomes = run_callers(single_flight(redis), store.compute, store.lookup)
+
+    assert store.calls == 1
+    assert [leader for _, leader in outcomes].count(True) == 1
+    assert all(result == {"flagged": False} for result, _ in outcomes)
+    assert not redis.exists(f"{KEY}:lease")
+
+def test_stored_result_is_reused_without_computing(redis):
+    """A caller taking the lease after the previous leader finished finds its result"""
+    store = Store()
+    store.results[KEY] = {"flagged": True}
+
+    result, leader = single_flight(redis).run(KEY, store.compute, store.lookup)
+
+    assert (result, leader) == ({"flagged": True}, False)
+    assert store.calls == 0
+
+def test_waiter_takes_over_from_a_dead_leader(redis):
+    """A lease left behind by a crashed leader expires and a waiter computes instead"""
+    store = Store(delay=0)
+    redis.set(f"{KEY}:lease", "crashed-worker", px=int(LEASE_TTL * 1000))
+    started = time.monotonic()
+
+    result, leader = single_flight(redis).run(KEY, store.compute, store.lookup)
+
+    assert (result, leader) == ({"flagged": False}, True)
+    assert store.calls == 1
+    assert time.monotonic() - started >= LEASE_TTL * 0.8
+
+def test_failed_leader_hands_over_to_a_waiter(redis):
+    """When the leader's computation raises, a waiter retries instead of hanging or failing"""
+    store = Store()
+    attempts = []
+
+    def flaky_compute():
+        attempts.append(threading.get_ident())
+        if len(attempts) == 1:
+            time.sleep(0.1)
+            raise RuntimeError("upstream error")
+        return store.compute()
+
+    outcomes = []
+    def call():
+        try:
+            outcomes.append(single_flight(redis).run(KEY, flaky_compute, store.lookup))
+        except RuntimeError:
+            outcomes.append("failed")
+
+    threads = [threading.Thread(target=call) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert outcomes.count("failed") == 1
+    assert len(attempts) == 2
+    assert all(outcome[0] == {"flagged": False} for outcome in outcomes if outcome != "failed")
+
+def test_wait_timeout_computes_locally(redis):
+    """A waiter whose leader outlives wait_timeout stops waiting and computes itself"""
+    store = Store(delay=0)
+    redis.set(f"{KEY}:lease", "slow-worker", px=60000)
+
+    result, leader = single_flight(redis, wait_timeout=0.2).run(KEY, store.compute, store.lookup)
+
+    assert (result, leader) == ({"flagged": False}, True)
+    assert store.calls == 1
@@ -0,0 +1,130 @@
+import pytest
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from typing import Optional
+
+import redis
+from celery import Celery
+from sqlalchemy import create_engine
+
+from db.models import Base
+from fake_moderation_server import FakeModerationServer
+
+# Test configurations
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+UPSTREAM_LATENCY = 0.05  # seconds per fake OpenAI call
+TASKS = 200
+POOLS = [("solo", 1), ("threads", 32)]
+MIN_SPEEDUP = 3.0  # required threads/solo wall-clock throughput ratio
+WORKER_START_TIMEOUT = 30
+
+@pytest.fixture(scope="module")
+def upstream_url():
+    server = FakeModerationServer(latency=UPSTREAM_LATENCY).start()
+    yield server.url
+    server.stop()
+
+@pytest.fixture(scope="module")
+def celery_app():
+    try:
+        redis.Redis.from_url(REDIS_URL).ping()
+    except redis.RedisError:
+        pytest.skip(f"Redis is not reachable at {REDIS_URL}")
+    return Celery("benchmark", broker=REDIS_URL, backend=REDIS_URL)
+
+def process_cpu_seconds(pid: int) -> Optional[float]:
+    """User + system CPU time of a process (Linux only)"""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+    except OSError:
+        return None
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+def start_worker(app: Celery, pool: str, concurrency: int, queue: str, upstream_url: str, database_url: str):
+    name = f"benchmark-{pool}-{uuid.uuid4().hex[:8]}@localhost"
+    env = dict(
+        os.environ,
+        OPENAI_BASE_URL=upstream_url,
+        OPENAI_API_KEY="benchmark",
+        DATABASE_URL=database_url,
+        REDIS_URL=REDIS_URL,
+        CELERY_BROKER_URL=REDIS_URL,
+        CELERY_RESULT_BACKEND=REDIS_URL,
+        OPENAI_RATE_LIMIT_RPM="0",
+        OPENAI_RATE_LIMIT_TPM="0",
+    )
+    env.pop("PROMETHEUS_MULTIPROC_DIR", None)
+    worker = subprocess.Popen(
+        [
+            sys.executable, "-m", "celery", "-A", "services.celery", "worker",
+            "-Q", queue, "-n", name, "--pool", pool, "--concurrency", str(concurrency),
+            "--without-gossip", "--without-mingle", "--loglevel=warning"
+        ],
+        cwd=PROJECT_ROOT,
+        env=env
+    )
+    deadline = time.monotonic() + WORKER_START_TIMEOUT
+    while time.monotonic() < deadline:
+        if app.control.ping(destination=[name], timeout=0.5):
+            return worker
+        if worker.poll() is not None:
+            break
+        time.sleep(0.5)
+    worker.kill()
+    pytest.fail(f"Celery worker with --pool={pool} did not start")
+
+def run_benchmark(app: Celery, pool: str, concurrency: int, upstream_url: str) -> dict:
+    queue = f"benchmark.{uuid.uuid4().hex[:8]}"
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = f"sqlite:///{tmp}/benchmark.db"
+        Base.metadata.create_all(create_engine(database_url))
+        worker = start_worker(app, pool, concurrency, queue, upstream_url, database_url)
+        try:
+            cpu_before = process_cpu_seconds(worker.pid)
+            start_time = time.monotonic()
+            # Unique texts, so every task goes upstream
+            results = [
+                app.send_task("services.tasks.moderate_text_task", args=[f"benchmark {queue} {i}"], queue=queue)
+                for i in range(TASKS)
+            ]
+            outcomes = [result.get(timeout=300) for result in results]
+            elapsed = time.monotonic() - start_time
+            cpu_after = process_cpu_seconds(worker.pid)
+        finally:
+            worker.terminate()
+            worker.wait(timeout=30)
+
+    failures = [outcome for outcome in outcomes if "error" in outcome]
+    cpu_seconds = cpu_after - cpu_before if cpu_before is not None and cpu_after is not None else None
+    return {
+        "pool": pool,
+        "concurrency": concurrency,
+        "failures": len(failures),
+        "tasks_per_second": TASKS / elapsed,
+        "cpu_seconds": cpu_seconds,
+        "tasks_per_cpu_second": TASKS / cpu_seconds if cpu_seconds else None
+    }
+
+def test_threads_pool_throughput(celery_app, upstream_url):
+    """Compare a threaded worker against --pool=solo on I/O-bound moderation tasks"""
+    metrics = {pool: run_benchmark(celery_app, pool, concurrency, upstream_url) for pool, concurrency in POOLS}
+
+    print(f"\nWorker throughput ({TASKS} tasks, {UPSTREAM_LATENCY * 1000:.0f}ms upstream latency):")
+    for result in metrics.values():
+        per_core = result["tasks_per_cpu_second"]
+        print(
+            f"--pool={result['pool']} (concurrency={result['concurrency']}): "
+            f"{result['tasks_per_second']:.1f} tasks/s, "
+            f"{f'{per_core:.1f}' if per_core else 'n/a'} tasks per CPU second"
+        )
+
+    for result in metrics.values():
+        assert result["failures"] == 0, f"{result['failures']} tasks failed with --pool={result['pool']}"
+    speedup = metrics["threads"]["tasks_per_second"] / metrics["solo"]["tasks_per_second"]
+    assert speedup >= MIN_SPEEDUP, f"Threaded worker only {speedup:.1f}x faster than solo"
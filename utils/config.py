@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings
 from functools import lru_cache
+from typing import Optional
 import os
 from dotenv import load_dotenv
 
@@ -12,9 +13,143 @@ class Settings(BaseSettings):
     CELERY_BROKER_URL: str = os.getenv("CELERY_BROKER_URL", "redis://localhost:6379/0")
     CELERY_RESULT_BACKEND: str = os.getenv("CELERY_RESULT_BACKEND", "redis://localhost:6379/0")
     OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY")
+    OPENAI_MODERATION_MODEL: str = os.getenv("OPENAI_MODERATION_MODEL", "text-moderation-latest")
+    OPENAI_MAX_CONNECTIONS: int = int(os.getenv("OPENAI_MAX_CONNECTIONS", "100"))
+    # Multiplex upstream calls over HTTP/2 connections (needs the optional h2 package)
+    OPENAI_HTTP2: bool = os.getenv("OPENAI_HTTP2", "False").lower() == "true"
     LOG_LEVEL: str = os.getenv("LOG_LEVEL", "info")
     DEBUG: bool = os.getenv("DEBUG", "False").lower() == "true"
 
+    # Connection pools and the API's bounded executor for blocking calls
+    REDIS_MAX_CONNECTIONS: int = int(os.getenv("REDIS_MAX_CONNECTIONS", "100"))
+    REDIS_POOL_TIMEOUT: float = float(os.getenv("REDIS_POOL_TIMEOUT", "5"))
+    DATABASE_POOL_SIZE: int = int(os.getenv("DATABASE_POOL_SIZE", "10"))
+    DATABASE_MAX_OVERFLOW: int = int(os.getenv("DATABASE_MAX_OVERFLOW", "30"))
+    API_SYNC_WORKERS: int = int(os.getenv("API_SYNC_WORKERS", "32"))
+
+    # Shared directory for cross-process Prometheus metrics (API and Celery workers)
+    PROMETHEUS_MULTIPROC_DIR: Optional[str] = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+    # Background health prober
+    HEALTH_CHECK_INTERVAL: float = float(os.getenv("HEALTH_CHECK_INTERVAL", "5"))
+    HEALTH_CHECK_TIMEOUT: float = float(os.getenv("HEALTH_CHECK_TIMEOUT", "2"))
+
+    # Micro-batching of upstream moderation calls in the worker
+    MODERATION_BATCH_WINDOW_MS: float = float(os.getenv("MODERATION_BATCH_WINDOW_MS", "20"))
+    MODERATION_BATCH_MAX_SIZE: int = int(os.getenv("MODERATION_BATCH_MAX_SIZE", "32"))
+    MODERATION_BATCH_MAX_IN_FLIGHT: int = int(os.getenv("MODERATION_BATCH_MAX_IN_FLIGHT", "8"))
+
+    # Worker execution mode: "threads" runs many I/O-bound tasks per process
+    # over shared clients; "solo" and "prefork" remain available
+    CELERY_WORKER_POOL: str = os.getenv("CELERY_WORKER_POOL", "threads")
+    CELERY_WORKER_CONCURRENCY: int = int(os.getenv("CELERY_WORKER_CONCURRENCY", "32"))
+
+    # Result cache: in-process LRU in front of Redis
+    CACHE_TTL: int = int(os.getenv("CACHE_TTL", "3600"))
+    LOCAL_CACHE_MAX_ENTRIES: int = int(os.getenv("LOCAL_CACHE_MAX_ENTRIES", "10000"))
+    LOCAL_CACHE_TTL: int = int(os.getenv("LOCAL_CACHE_TTL", "300"))
+
+    # Blob store: data: URIs longer than BLOB_INLINE_MAX_BYTES, and streamed
+    # uploads, are kept in Redis for BLOB_TTL seconds and passed by handle
+    BLOB_TTL: int = int(os.getenv("BLOB_TTL", "3600"))
+    BLOB_MAX_BYTES: int = int(os.getenv("BLOB_MAX_BYTES", str(20 * 1024 * 1024)))
+    BLOB_INLINE_MAX_BYTES: int = int(os.getenv("BLOB_INLINE_MAX_BYTES", str(64 * 1024)))
+
+    # Image verdict cache, keyed by exact URL, by digest of the image bytes and
+    # optionally by perceptual hash (needs Pillow). Remote images are only
+    # downloaded for hashing with IMAGE_CACHE_FETCH_REMOTE.
+    IMAGE_CACHE_ENABLED: bool = os.getenv("IMAGE_CACHE_ENABLED", "True").lower() == "true"
+    IMAGE_CACHE_TTL: int = int(os.getenv("IMAGE_CACHE_TTL", "86400"))
+    IMAGE_CACHE_MAX_ENTRIES: int = int(os.getenv("IMAGE_CACHE_MAX_ENTRIES", "100000"))
+    IMAGE_CACHE_LOCAL_MAX_ENTRIES: int = int(os.getenv("IMAGE_CACHE_LOCAL_MAX_ENTRIES", "1000"))
+    IMAGE_CACHE_PERCEPTUAL: bool = os.getenv("IMAGE_CACHE_PERCEPTUAL", "False").lower() == "true"
+    IMAGE_CACHE_FETCH_REMOTE: bool = os.getenv("IMAGE_CACHE_FETCH_REMOTE", "False").lower() == "true"
+    IMAGE_CACHE_FETCH_MAX_BYTES: int = int(os.getenv("IMAGE_CACHE_FETCH_MAX_BYTES", str(10 * 1024 * 1024)))
+    IMAGE_CACHE_FETCH_TIMEOUT: float = float(os.getenv("IMAGE_CACHE_FETCH_TIMEOUT", "5"))
+    IMAGE_CACHE_FETCH_MAX_REDIRECTS: int = int(os.getenv("IMAGE_CACHE_FETCH_MAX_REDIRECTS", "3"))
+
+    # Requests to user-supplied URLs (remote image fetches, webhook callbacks)
+    # are refused for loopback, private and link-local hosts unless this is
+    # set, e.g. for local development against receivers on localhost
+    OUTBOUND_ALLOW_PRIVATE: bool = os.getenv("OUTBOUND_ALLOW_PRIVATE", "False").lower() == "true"
+
+    # Near-duplicate reuse: texts whose canonical SimHash is within this many
+    # bits of a moderated text get its verdict, marked "approximate". The
+    # 4-band index only guarantees recall up to 3 bits, so larger values are rejected.
+    NEAR_DUPLICATE_ENABLED: bool = os.getenv("NEAR_DUPLICATE_ENABLED", "True").lower() == "true"
+    NEAR_DUPLICATE_MAX_DISTANCE: int = int(os.getenv("NEAR_DUPLICATE_MAX_DISTANCE", "3"))
+    NEAR_DUPLICATE_MIN_LENGTH: int = int(os.getenv("NEAR_DUPLICATE_MIN_LENGTH", "32"))
+    NEAR_DUPLICATE_MAX_LENGTH: int = int(os.getenv("NEAR_DUPLICATE_MAX_LENGTH", "2000"))
+    NEAR_DUPLICATE_BUCKET_SIZE: int = int(os.getenv("NEAR_DUPLICATE_BUCKET_SIZE", "32"))
+
+    # Local pre-filter: blocklist terms ("term" or "term<TAB>category" per line)
+    # flag texts and allowlisted whole messages pass, without an upstream call.
+    # Files are re-read when modified, checked every PREFILTER_RELOAD_INTERVAL seconds.
+    PREFILTER_BLOCKLIST_PATH: Optional[str] = os.getenv("PREFILTER_BLOCKLIST_PATH")
+    PREFILTER_ALLOWLIST_PATH: Optional[str] = os.getenv("PREFILTER_ALLOWLIST_PATH")
+    PREFILTER_RELOAD_INTERVAL: float = float(os.getenv("PREFILTER_RELOAD_INTERVAL", "5"))
+    PREFILTER_DEFAULT_CATEGORY: str = os.getenv("PREFILTER_DEFAULT_CATEGORY", "harassment")
+
+    # Document mode: texts longer than DOCUMENT_MIN_CHARS are moderated as
+    # sentence-aligned chunks of about DOCUMENT_CHUNK_CHARS (at most
+    # DOCUMENT_CHUNK_MAX_CHARS, overlapping by DOCUMENT_CHUNK_OVERLAP_CHARS); 0 disables
+    DOCUMENT_MIN_CHARS: int = int(os.getenv("DOCUMENT_MIN_CHARS", "8000"))
+    DOCUMENT_CHUNK_CHARS: int = int(os.getenv("DOCUMENT_CHUNK_CHARS", "2000"))
+    DOCUMENT_CHUNK_MAX_CHARS: int = int(os.getenv("DOCUMENT_CHUNK_MAX_CHARS", "4000"))
+    DOCUMENT_CHUNK_OVERLAP_CHARS: int = int(os.getenv("DOCUMENT_CHUNK_OVERLAP_CHARS", "200"))
+
+    # Single-flight of identical in-flight texts across workers
+    SINGLEFLIGHT_LEASE_SECONDS: float = float(os.getenv("SINGLEFLIGHT_LEASE_SECONDS", "15"))
+    SINGLEFLIGHT_WAIT_SECONDS: float = float(os.getenv("SINGLEFLIGHT_WAIT_SECONDS", "30"))
+
+    # Synchronous (?wait=true) moderation deadline
+    SYNC_MODERATION_TIMEOUT_MS: int = int(os.getenv("SYNC_MODERATION_TIMEOUT_MS", "1000"))
+    SYNC_MODERATION_MAX_TIMEOUT_MS: int = int(os.getenv("SYNC_MODERATION_MAX_TIMEOUT_MS", "10000"))
+
+    # Write-behind persistence of moderation results
+    PERSISTENCE_BATCH_SIZE: int = int(os.getenv("PERSISTENCE_BATCH_SIZE", "500"))
+    PERSISTENCE_FLUSH_INTERVAL: float = float(os.getenv("PERSISTENCE_FLUSH_INTERVAL", "1"))
+    PERSISTENCE_MAX_BUFFER: int = int(os.getenv("PERSISTENCE_MAX_BUFFER", "50000"))
+
+    # Bulk moderation jobs
+    MODERATION_JOB_MAX_ITEMS: int = int(os.getenv("MODERATION_JOB_MAX_ITEMS", "1000"))
+    MODERATION_JOB_TTL: int = int(os.getenv("MODERATION_JOB_TTL", "3600"))
+
+    # Cluster-wide OpenAI rate limits (0 disables a bucket) and per-process adaptive concurrency
+    OPENAI_RATE_LIMIT_RPM: float = float(os.getenv("OPENAI_RATE_LIMIT_RPM", "1000"))
+    OPENAI_RATE_LIMIT_TPM: float = float(os.getenv("OPENAI_RATE_LIMIT_TPM", "150000"))
+    OPENAI_RATE_LIMIT_BURST_SECONDS: float = float(os.getenv("OPENAI_RATE_LIMIT_BURST_SECONDS", "5"))
+    OPENAI_MAX_CONCURRENCY: int = int(os.getenv("OPENAI_MAX_CONCURRENCY", "16"))
+    OPENAI_LATENCY_TARGET: float = float(os.getenv("OPENAI_LATENCY_TARGET", "2"))
+    # Longer waits requeue the task instead of blocking the worker
+    OPENAI_THROTTLE_MAX_WAIT: float = float(os.getenv("OPENAI_THROTTLE_MAX_WAIT", "1"))
+    OPENAI_THROTTLE_MAX_REQUEUES: int = int(os.getenv("OPENAI_THROTTLE_MAX_REQUEUES", "20"))
+    OPENAI_RETRY_AFTER_DEFAULT: float = float(os.getenv("OPENAI_RETRY_AFTER_DEFAULT", "1"))
+
+    # Priority lanes: one Celery queue each, with a depth limit for admission (0 disables)
+    QUEUE_INTERACTIVE: str = os.getenv("QUEUE_INTERACTIVE", "moderation.interactive")
+    QUEUE_BULK: str = os.getenv("QUEUE_BULK", "moderation.bulk")
+    QUEUE_IMAGES: str = os.getenv("QUEUE_IMAGES", "moderation.images")
+    QUEUE_INTERACTIVE_MAX_DEPTH: int = int(os.getenv("QUEUE_INTERACTIVE_MAX_DEPTH", "5000"))
+    QUEUE_BULK_MAX_DEPTH: int = int(os.getenv("QUEUE_BULK_MAX_DEPTH", "100000"))
+    QUEUE_IMAGES_MAX_DEPTH: int = int(os.getenv("QUEUE_IMAGES_MAX_DEPTH", "10000"))
+    QUEUE_FULL_RETRY_AFTER: int = int(os.getenv("QUEUE_FULL_RETRY_AFTER", "5"))
+
+    # Push delivery of results (long-poll and SSE streams)
+    LONG_POLL_MAX_SECONDS: float = float(os.getenv("LONG_POLL_MAX_SECONDS", "30"))
+    STREAM_TIMEOUT_SECONDS: float = float(os.getenv("STREAM_TIMEOUT_SECONDS", "300"))
+    STREAM_MAX_IDS: int = int(os.getenv("STREAM_MAX_IDS", "1000"))
+
+    # Webhook callbacks, delivered by workers consuming WEBHOOK_QUEUE
+    WEBHOOK_QUEUE: str = os.getenv("WEBHOOK_QUEUE", "webhooks")
+    WEBHOOK_BATCH_WINDOW_MS: float = float(os.getenv("WEBHOOK_BATCH_WINDOW_MS", "200"))
+    WEBHOOK_BATCH_MAX_SIZE: int = int(os.getenv("WEBHOOK_BATCH_MAX_SIZE", "100"))
+    WEBHOOK_TIMEOUT: float = float(os.getenv("WEBHOOK_TIMEOUT", "10"))
+    WEBHOOK_MAX_CONNECTIONS: int = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "100"))
+    WEBHOOK_MAX_RETRIES: int = int(os.getenv("WEBHOOK_MAX_RETRIES", "8"))
+    WEBHOOK_RETRY_BACKOFF: float = float(os.getenv("WEBHOOK_RETRY_BACKOFF", "2"))
+    WEBHOOK_RETRY_BACKOFF_MAX: float = float(os.getenv("WEBHOOK_RETRY_BACKOFF_MAX", "600"))
+
     class Config:
         case_sensitive = True
 
@@ -0,0 +1,77 @@
+import ipaddress
+import os
+import socket
+import threading
+from typing import Callable, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+from utils.config import get_settings
+
+settings = get_settings()
+
+
+class ForkSafeClient:
+    """Lazily built ``httpx.Client`` shared by the threads of one process.
+
+    Calling the instance returns the client, rebuilt in a forked child so
+    connection pools are never shared across processes.
+    """
+
+    def __init__(self, factory: Callable[[], httpx.Client]):
+        self.factory = factory
+        self._client: Optional[httpx.Client] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def __call__(self) -> httpx.Client:
+        with self._lock:
+            if self._client is None or self._pid != os.getpid():
+                self._client = self.factory()
+                self._pid = os.getpid()
+            return self._client
+
+
+class UnsafeURL(ValueError):
+    """A user-supplied URL points at this host or a private network."""
+
+
+def is_public_address(address: str) -> bool:
+    ip = ipaddress.ip_address(address)
+    if isinstance(ip, ipaddress.IPv6Address) and ip.ipv4_mapped is not None:
+        ip = ip.ipv4_mapped
+    return not (
+        ip.is_loopback or ip.is_private or ip.is_link_local or ip.is_multicast
+        or ip.is_reserved or ip.is_unspecified
+    )
+
+
+def check_public_url(url: str, resolve: bool = True):
+    """Raise ``UnsafeURL`` unless ``url`` is http(s) and its host is publicly routable.
+
+    With ``resolve=False`` only literal addresses and ``localhost`` are
+    rejected, which needs no DNS lookup; with ``resolve=True`` every address
+    the host resolves to must be public. ``OUTBOUND_ALLOW_PRIVATE`` turns the
+    check off for development setups.
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise UnsafeURL(f"Not an http(s) URL: {url}")
+    if settings.OUTBOUND_ALLOW_PRIVATE:
+        return
+    host = parts.hostname.rstrip(".").lower()
+    if host == "localhost" or host.endswith(".localhost"):
+        raise UnsafeURL(f"{host} is a loopback host")
+    try:
+        addresses = [str(ipaddress.ip_address(host))]
+    except ValueError:
+        if not resolve:
+            return
+        try:
+            addresses = {info[4][0] for info in socket.getaddrinfo(host, parts.port or 443, proto=socket.IPPROTO_TCP)}
+        except socket.gaierror as e:
+            raise UnsafeURL(f"Could not resolve {host}: {e}") from e
+    for address in addresses:
+        if not is_public_address(address.split("%", 1)[0]):
+            raise UnsafeURL(f"{host} ({address}) is not a public address")
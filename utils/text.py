@@ -0,0 +1,36 @@
+import re
+import unicodedata
+from typing import Optional
+
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+def is_invisible(char: str) -> bool:
+    # Zero-width and bidi controls (Cf), controls other than whitespace (Cc),
+    # private-use code points and emoji variation selectors
+    category = unicodedata.category(char)
+    if category == "Cc":
+        return not char.isspace()
+    return category in ("Cf", "Co") or "\ufe00" <= char <= "\ufe0f" or "\U000e0100" <= char <= "\U000e01ef"
+
+
+class _InvisibleCharacters(dict):
+    """``str.translate`` table deleting invisible characters.
+
+    Each code point is classified once, on first sight; after that a lookup
+    is a plain dict hit inside ``str.translate``.
+    """
+
+    def __missing__(self, codepoint: int) -> Optional[int]:
+        value = None if is_invisible(chr(codepoint)) else codepoint
+        self[codepoint] = value
+        return value
+
+
+_INVISIBLE = _InvisibleCharacters()
+
+
+def fold_text(text: str) -> str:
+    """NFKC-normalize, strip invisible characters and fold case and whitespace."""
+    text = unicodedata.normalize("NFKC", text).translate(_INVISIBLE)
+    return " ".join(text.casefold().split())